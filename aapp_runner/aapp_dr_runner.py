@@ -98,6 +98,7 @@ import posttroll.subscriber
 from posttroll.publisher import Publish
 from posttroll.message import Message
 from trollduction.helper_functions import overlapping_timeinterval
+from trollduction.transfer import transfer_many
 
 import tempfile
 from glob import glob
@@ -1265,6 +1266,7 @@ def spack_aapplvl1_files(aappfiles, base_dir, subdir, satnum):
 
     LOG.info("Number of AAPP lvl1 files: " + str(len(aappfiles)))
     # retvl = []
+    transfers = []
     for aapp_file in aappfiles:
         fname = os.path.basename(aapp_file)
         in_name, ext = fname.split('.')
@@ -1294,12 +1296,15 @@ def spack_aapplvl1_files(aappfiles, base_dir, subdir, satnum):
         newfilename = os.path.join(path, "%s_%s.%s" % (firstname,
                                                        subdir, ext))
         LOG.info("Copy aapp-file to destination: " + newfilename)
-        shutil.copy(aapp_file, newfilename)
+        transfers.append((aapp_file, newfilename))
         # retvl.append(newfilename)
         sensor_and_level[newfilename] = {
             'sensor': SENSOR_NAME_CONVERTER.get(instr, instr),
             'level': level}
 
+    for _, newfilename, _ in transfer_many(transfers):
+        del sensor_and_level[newfilename]
+
     return sensor_and_level
     # return retvl
 
@@ -1334,6 +1339,7 @@ def pack_aapplvl1_files(aappfiles, base_dir, subdir, satnum):
     # FIXME: OSError: [Errno 2] No such file or directory:
     LOG.info("Number of AAPP lvl1 files: " + str(len(aappfiles)))
 
+    transfers = []
     for aapp_file in aappfiles:
         LOG.debug("Processing aapp_file: " + aapp_file)
 #        fname = os.path.basename(aapp_file)
@@ -1378,11 +1384,14 @@ def pack_aapplvl1_files(aappfiles, base_dir, subdir, satnum):
         newfilename = os.path.join(path, filename)
 
         LOG.info("Copy aapp-file to destination: " + newfilename)
-        shutil.copy(aapp_file, newfilename)
+        transfers.append((aapp_file, newfilename))
         sensor_and_level[newfilename] = {
             'sensor': SENSOR_NAME_CONVERTER.get(instr, instr),
             'level': level}
 
+    for _, newfilename, _ in transfer_many(transfers):
+        del sensor_and_level[newfilename]
+
     return sensor_and_level
 
 # AAPP output:
@@ -1422,7 +1431,7 @@ def copy_aapplvl1_files(aappfiles, output_data_basepath, satnum, out_dir_config_
         LOG.warning("No files in input directory to copy!")
         return
 
-    errors = []
+    transfers = []
     for aapp_file in aappfiles:
         filename = os.path.basename(aapp_file)
         in_name, ext = filename.split('.')
@@ -1491,20 +1500,19 @@ def copy_aapplvl1_files(aappfiles, output_data_basepath, satnum, out_dir_config_
 
         destination_file = os.path.join(directory, filename)
         LOG.debug("Destination_file: " + destination_file)
-        try:
-            shutil.copy(aapp_file, destination_file)
-        except (IOError, os.error) as err:
-            errors.append((aapp_file, destination_file, str(err)))
-            LOG.error(in_name + "copy failed %s", err.strerror)
-            #            except Error as err:
-#                errors.extend(err.args[0])
-        if errors:
-            LOG.error("Too many errors!")
+        transfers.append((aapp_file, destination_file))
 
         sensor_and_level[destination_file] = {
             'sensor': SENSOR_NAME_CONVERTER.get(instr, instr),
             'level': level}
 
+    errors = transfer_many(transfers)
+    for _, destination_file, _ in errors:
+        del sensor_and_level[destination_file]
+    if errors:
+        LOG.error("%d of %d files could not be copied!",
+                  len(errors), len(transfers))
+
     LOG.debug("--------------------------")
     for key in sensor_and_level:
         LOG.debug("Filename: " + key)
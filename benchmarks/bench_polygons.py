@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark the computation of the data outline polygons used for the
+coverage, comparing the vectorized get_polygons_positions to the original
+line by line implementation.
+
+./bench_polygons.py --shape 6464 3200 --frequency 100
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from trollduction.producer import get_polygons_positions
+
+
+def get_polygons_positions_loop(datas, frequency=1):
+    """Original line by line implementation, kept as reference."""
+    mask = None
+    for data in datas:
+        if mask is None:
+            mask = data.mask
+        else:
+            mask = np.logical_or(mask, data.mask)
+
+    polygons = []
+    polygon_left = []
+    polygon_right = []
+    count = 0
+    last_valid_line = None
+    for line in range(mask.shape[0]):
+        if np.any(1 - mask[line, :]):
+            indices = np.nonzero(1 - mask[line, :])[0]
+
+            if last_valid_line is not None and last_valid_line != line - 1:
+                # close the polygon and start a new one.
+                last_indices = np.nonzero(1 - mask[last_valid_line, :])[0]
+                if count % frequency != 0:
+                    polygon_right.append((last_valid_line, last_indices[-1]))
+                    polygon_left.append((last_valid_line, last_indices[0]))
+                for indice in last_indices[1:-1:frequency]:
+                    polygon_left.append((last_valid_line, indice))
+                polygon_left.reverse()
+                polygons.append(polygon_left + polygon_right)
+                polygon_left = []
+                polygon_right = []
+                count = 0
+
+                for indice in indices[1::frequency]:
+                    polygon_right.append((line, indice))
+                polygon_left.append((line, indices[0]))
+
+            elif count % frequency == 0:
+                polygon_left.append((line, indices[0]))
+                polygon_right.append((line, indices[-1]))
+            count += 1
+            last_valid_line = line
+
+    if (count - 1) % frequency != 0 and last_valid_line is not None:
+        polygon_left.append((last_valid_line, indices[0]))
+        polygon_right.append((last_valid_line, indices[-1]))
+
+    polygon_left.reverse()
+    result = polygon_left + polygon_right
+    if result:
+        polygons.append(result)
+
+    return polygons
+
+
+def make_swath(shape, gaps=3, seed=0):
+    """Make a masked swath of *shape* with ragged edges and *gaps* missing
+    blocks of lines.
+    """
+    rnd = np.random.RandomState(seed)
+    lines, cols = shape
+    mask = np.zeros(shape, dtype=np.bool)
+    left = rnd.randint(0, cols // 10, size=lines)
+    right = cols - rnd.randint(0, cols // 10, size=lines)
+    col_idx = np.arange(cols)
+    mask[col_idx[np.newaxis, :] < left[:, np.newaxis]] = True
+    mask[col_idx[np.newaxis, :] >= right[:, np.newaxis]] = True
+    for start in rnd.randint(0, lines, size=gaps):
+        mask[start:start + rnd.randint(1, max(lines // 20, 2)), :] = True
+    return np.ma.array(np.zeros(shape, dtype=np.float32), mask=mask)
+
+
+def timeit(fun, repeat):
+    """Return the best time out of *repeat* runs of *fun*, and its result.
+    """
+    best = None
+    for _ in range(repeat):
+        tic = time.time()
+        res = fun()
+        elapsed = time.time() - tic
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, res
+
+
+def main():
+    """Run the benchmark.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shape", nargs=2, type=int, default=(6464, 3200),
+                        help="Swath shape, lines and columns")
+    parser.add_argument("--frequency", type=int, default=100,
+                        help="Line sampling frequency")
+    parser.add_argument("--gaps", type=int, default=3,
+                        help="Number of missing blocks of lines")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of runs, the best one is kept")
+    args = parser.parse_args()
+
+    data = make_swath(args.shape, args.gaps)
+
+    loop_time, loop_res = timeit(
+        lambda: get_polygons_positions_loop((data, ), args.frequency),
+        args.repeat)
+    vect_time, vect_res = timeit(
+        lambda: get_polygons_positions((data, ), args.frequency),
+        args.repeat)
+
+    print "Swath %dx%d, frequency %d" % (args.shape[0], args.shape[1],
+                                         args.frequency)
+    print "line by line: %.3f s" % loop_time
+    print "vectorized:   %.3f s (%.1f times faster)" % (vect_time,
+                                                        loop_time / vect_time)
+    print "identical polygons: %s" % (loop_res == vect_res)
+
+
+if __name__ == '__main__':
+    main()
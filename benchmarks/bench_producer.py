@@ -0,0 +1,494 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2026
+
+# Author(s):
+
+#   agent <agent@local>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark the data processor on synthetic data, without satellite data
+nor instrument readers: a fake scene holds random channels on a swath of
+the given size, and projects them by nearest neighbour with pyresample
+(or with a random look-up table). The composites are RGB images of the
+channels, Sun zenith corrected for the products with Sun zenith limits.
+
+The areas of the product list are defined on the fly around the swath.
+The products are made and saved by the real data processor and writer,
+the messages being not published. The throughput, peak memory and time
+spent in each stage are reported.
+
+./bench_producer.py --lines 2000 --columns 2048 --channels 5 \
+    --area-size 1024 --scenes 3 --set area_workers=2 \
+    ../examples/product_config_hrpt.xml_template
+"""
+
+import argparse
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+
+import numpy as np
+from mpop.channel import Channel
+from mpop.imageo.geo_image import GeoImage
+from posttroll.message import Message
+from pyorbital.astronomy import cos_zen
+from pyresample import kd_tree
+from pyresample.geometry import SwathDefinition
+from trollsched.boundary import Boundary
+
+# run from the source tree
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from trollduction import area_geometry, producer
+from trollduction.producer import DataProcessor, DataWriter, coverage
+from trollduction.timing import TIMINGS
+from trollduction.xml_read import ProductList
+
+EXAMPLES = os.path.join(ROOT, "examples")
+
+# center of the swath and of the areas
+CENTER = (15., 60.)
+# half extent of the swath in degrees, and of the areas in meters
+SWATH_EXTENT = (15., 10.)
+AREA_EXTENT = 8e5
+
+AREA_TEMPLATE = """REGION: %(area_id)s {
+    NAME: %(area_id)s
+    PCS_ID: %(area_id)s
+    PCS_DEF: proj=stere, lat_0=%(lat)f, lon_0=%(lon)f, ellps=WGS84
+    XSIZE: %(size)d
+    YSIZE: %(size)d
+    AREA_EXTENT: (%(extent)f, %(extent)f, %(extent2)f, %(extent2)f)
+};
+"""
+
+
+class NullPublish(object):
+
+    """Publisher dropping the messages."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def send(self, msg):
+        """Drop *msg*."""
+        pass
+
+
+class FakeOverpass(object):
+
+    """Overpass whose boundary is the outline of *swath*."""
+
+    def __init__(self, swath, frequency=100):
+        lons, lats = swath.lons, swath.lats
+        sides = [(lons[0, ::frequency], lats[0, ::frequency]),
+                 (lons[::frequency, -1], lats[::frequency, -1]),
+                 (lons[-1, ::-frequency], lats[-1, ::-frequency]),
+                 (lons[::-frequency, 0], lats[::-frequency, 0])]
+        self.boundary = Boundary(np.concatenate([side[0] for side in sides]),
+                                 np.concatenate([side[1] for side in sides]))
+
+
+class FakeProjector(object):
+
+    """Nearest neighbour projection of *swath*, with pyresample, or with a
+    random look-up table if *method* is "random". The look-up tables are
+    kept between scenes when precomputing.
+    """
+
+    def __init__(self, swath, method="nearest"):
+        self.swath = swath
+        self.method = method
+        self._tables = {}
+        lines, cols = swath.shape
+        # twice the largest pixel size, in meters
+        self.radius = 2 * 111000 * max(2. * SWATH_EXTENT[1] / lines,
+                                       2. * SWATH_EXTENT[0] / cols)
+
+    def get_table(self, area_def, precompute=False):
+        """Get the look-up table from the swath to *area_def*."""
+        if area_def.area_id in self._tables:
+            return self._tables[area_def.area_id]
+        if self.method == "random":
+            table = np.random.randint(0, self.swath.size, area_def.size)
+        else:
+            table = kd_tree.get_neighbour_info(self.swath, area_def,
+                                               self.radius, neighbours=1)
+        if precompute:
+            self._tables[area_def.area_id] = table
+        return table
+
+    def project(self, data, area_def, table):
+        """Project *data* to *area_def* with the look-up *table*."""
+        if self.method == "random":
+            return data.ravel()[table].reshape(area_def.shape)
+        return kd_tree.get_sample_from_neighbour_info(
+            'nn', area_def.shape, data, table[0], table[1], table[2],
+            fill_value=None)
+
+
+def make_composite(channels):
+    """Make a composite of *channels*."""
+    def composite(self):
+        """RGB composite of the channels."""
+        data = [self.scene[name].data for name in channels]
+        img = GeoImage(data, self.scene.area, self.scene.time_slot,
+                       mode="RGB", fill_value=None)
+        img.enhance(stretch="crude")
+        return img
+    composite.prerequisites = set(channels)
+    return composite
+
+
+def make_sun_composite(channels):
+    """Make a Sun zenith corrected composite of *channels*."""
+    def sun_composite(self):
+        """RGB composite of the channels, corrected for the Sun zenith
+        angle."""
+        lons, lats = self.scene[channels[0]].area.get_lonlats()
+        sun = np.ma.masked_less(cos_zen(self.scene.time_slot, lons, lats),
+                                0.05)
+        data = [self.scene[name].data / sun for name in channels]
+        img = GeoImage(data, self.scene.area, self.scene.time_slot,
+                       mode="RGB", fill_value=None)
+        img.enhance(stretch="crude")
+        return img
+    sun_composite.prerequisites = set(channels)
+    return sun_composite
+
+
+def make_compositer(products, channels):
+    """Make a compositer class with a composite for each of *products*,
+    given as (product id, Sun corrected) tuples, using three of
+    *channels* each.
+    """
+    def __init__(self, scene):
+        self.scene = scene
+    methods = {"__init__": __init__}
+    for num, (product, sun) in enumerate(sorted(products)):
+        used = [channels[(num + i) % len(channels)] for i in range(3)]
+        if sun:
+            methods[product] = make_sun_composite(used)
+        else:
+            methods[product] = make_composite(used)
+    return type("FakeCompositer", (object, ), methods)
+
+
+class FakeScene(object):
+
+    """Stand-in for an mpop scene of *channels* on *swath*, filled with
+    random data when loaded, and projected with *projector*.
+    """
+
+    def __init__(self, swath, channels, compositer, projector, info,
+                 area=None):
+        self.swath = swath
+        self.channels = [Channel(name=name, resolution=1000,
+                                 wavelength_range=[num + .5, num + 1.,
+                                                   num + 1.5])
+                         for num, name in enumerate(channels)]
+        self.compositer = compositer
+        self.image = compositer(self)
+        self.projector = projector
+        self.info = info.copy()
+        self.time_slot = info["start_time"]
+        self.orbit = info.get("orbit_number")
+        self.area = area
+        self.overpass = None
+
+    def __getitem__(self, key):
+        for chn in self.channels:
+            if chn.name == key:
+                return chn
+        raise KeyError(key)
+
+    def loaded_channels(self):
+        """Get the loaded channels."""
+        return set(chn for chn in self.channels if chn.is_loaded())
+
+    def load(self, channels=None, **kwargs):
+        """Fill *channels* with random data, one percent being invalid."""
+        del kwargs
+        for chn in self.channels:
+            if chn.is_loaded() or (channels is not None and
+                                   chn.name not in channels):
+                continue
+            data = np.random.uniform(0, 100, self.swath.shape)
+            chn.data = np.ma.masked_less(data.astype(np.float32), 1)
+            chn.area = self.swath
+
+    def unload(self, *channels):
+        """Unload *channels*."""
+        for name in channels:
+            self[name].data = None
+
+    def add_to_history(self, message):
+        """Ignore *message*."""
+        pass
+
+    def project(self, dest_area, channels=None, precompute=False,
+                **kwargs):
+        """Project the loaded *channels* to *dest_area*."""
+        del kwargs
+        area_def = area_geometry.get_area_def(dest_area)
+        res = FakeScene(self.swath, [chn.name for chn in self.channels],
+                        self.compositer, self.projector, self.info,
+                        area=area_def)
+        table = self.projector.get_table(area_def, precompute)
+        for chn in self.loaded_channels():
+            if channels is not None and chn.name not in channels:
+                continue
+            res[chn.name].data = self.projector.project(chn.data, area_def,
+                                                        table)
+            res[chn.name].area = area_def
+        return res
+
+
+class BenchProcessor(DataProcessor):
+
+    """Data processor making fake scenes of *channels* on *swath*."""
+
+    def __init__(self, swath, channels, compositer, projector, writer,
+                 overpass=False):
+        DataProcessor.__init__(self, writer=writer)
+        self.swath = swath
+        self.channel_names = channels
+        self.compositer = compositer
+        self.projector = projector
+        self.overpass = overpass
+
+    def create_scene_from_mda(self, mda):
+        """Make a fake scene for the metadata *mda*."""
+        scene = FakeScene(self.swath, self.channel_names, self.compositer,
+                          self.projector, mda)
+        if self.overpass:
+            scene.overpass = FakeOverpass(self.swath)
+        return scene
+
+
+def make_swath(lines, cols):
+    """Make a *lines* x *cols* swath around the center."""
+    lons = np.linspace(CENTER[0] - SWATH_EXTENT[0],
+                       CENTER[0] + SWATH_EXTENT[0], cols)
+    lats = np.linspace(CENTER[1] + SWATH_EXTENT[1],
+                       CENTER[1] - SWATH_EXTENT[1], lines)
+    lons, lats = np.meshgrid(lons, lats)
+    return SwathDefinition(lons, lats)
+
+
+def write_product_list(fname, tmp_dir, options, min_coverage=None):
+    """Write a copy of the product list *fname* in *tmp_dir*, the products
+    being saved there, without dumps nor overlays, the areas named after
+    their ids, and with the common *options*. Returns the filename of the copy and the (area id, products)
+    of the areas, the products being given as (product id, Sun corrected)
+    tuples.
+    """
+    tree = ET.parse(fname)
+    root = tree.getroot()
+    common = root.find("common")
+    if common is None:
+        common = ET.SubElement(root, "common")
+    options = dict(options, output_dir=os.path.join(tmp_dir, "output"))
+    for key, val in options.items():
+        elt = common.find(key)
+        if elt is None:
+            elt = ET.SubElement(common, key)
+        elt.text = val
+
+    areas = []
+    for prodlist in root.findall("product_list"):
+        for dump in prodlist.findall("dump"):
+            prodlist.remove(dump)
+        for elt in prodlist.iter():
+            elt.attrib.pop("output_dir", None)
+            elt.attrib.pop("overlay", None)
+        for area in prodlist.findall("area"):
+            # some names have slashes
+            area.set("name", area.attrib["id"])
+            if min_coverage is not None:
+                area.set("min_coverage", str(min_coverage))
+            areas.append((area.attrib["id"],
+                          [(product.attrib["id"],
+                            "sunzen_day_maximum" in product.attrib)
+                           for product in area.findall("product")]))
+    copy = os.path.join(tmp_dir, os.path.basename(fname))
+    tree.write(copy)
+    return copy, areas
+
+
+def write_area_file(fname, area_ids, size):
+    """Write the definitions of the *area_ids*, *size* pixels wide, to
+    *fname*.
+    """
+    with open(fname, "w") as fd_:
+        for area_id in area_ids:
+            fd_.write(AREA_TEMPLATE % {"area_id": area_id,
+                                       "lon": CENTER[0],
+                                       "lat": CENTER[1],
+                                       "size": size,
+                                       "extent": -AREA_EXTENT,
+                                       "extent2": AREA_EXTENT})
+
+
+def print_stages(elapsed):
+    """Print the time spent in each stage."""
+    stages = {}
+    for summary in TIMINGS.get_summaries():
+        stage = stages.setdefault(summary["stage"],
+                                  {"count": 0, "total": 0.0, "max": 0.0})
+        stage["count"] += summary["count"]
+        stage["total"] += summary["mean"] * summary["count"]
+        stage["max"] = max(stage["max"], summary["max"])
+    print "  %-20s %8s %10s %10s %10s %6s" % ("stage", "count", "total s",
+                                              "mean ms", "max ms", "%")
+    for name, stage in sorted(stages.items(),
+                              key=lambda item: -item[1]["total"]):
+        print "  %-20s %8d %10.2f %10.1f %10.1f %6.1f" % (
+            name, stage["count"], stage["total"],
+            stage["total"] / stage["count"] * 1000, stage["max"] * 1000,
+            stage["total"] / elapsed * 100)
+
+
+def main():
+    """Run the benchmark.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("product_list", nargs="?",
+                        default=os.path.join(
+                            EXAMPLES, "product_config_hrpt.xml_template"),
+                        help="Product list to produce")
+    parser.add_argument("--lines", type=int, default=2000,
+                        help="Number of lines of the swath")
+    parser.add_argument("--columns", type=int, default=2048,
+                        help="Number of columns of the swath")
+    parser.add_argument("--channels", type=int, default=5,
+                        help="Number of channels")
+    parser.add_argument("--area-size", type=int, default=1024,
+                        help="Size of the areas in pixels")
+    parser.add_argument("--projector", choices=["nearest", "random"],
+                        default="nearest",
+                        help="Nearest neighbour projection, or a random "
+                        "look-up table")
+    parser.add_argument("--min-coverage", type=float,
+                        help="Minimum coverage of the areas, in percent, "
+                        "to check the coverage")
+    parser.add_argument("--scenes", type=int, default=3,
+                        help="Number of scenes to process")
+    parser.add_argument("--writer-workers", type=int, default=1,
+                        help="Number of writer threads")
+    parser.add_argument("--set", nargs="+", default=[], metavar="KEY=VALUE",
+                        help="Common options of the product list, eg. "
+                        "area_workers=2")
+    args = parser.parse_args()
+
+    options = dict(opt.split("=", 1) for opt in args.set)
+    options.setdefault("check_coverage",
+                       str(args.min_coverage is not None))
+    # the messages aren't published
+    producer.Publish = NullPublish
+    np.random.seed(0)
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        fname, areas = write_product_list(args.product_list, tmp_dir,
+                                          options, args.min_coverage)
+        area_file = os.path.join(tmp_dir, "areas.def")
+        write_area_file(area_file, [area_id for area_id, _ in areas],
+                        args.area_size)
+        area_geometry.AREA_CACHE.area_file = area_file
+        area_geometry.AREA_CACHE.invalidate()
+        product_config = ProductList(fname)
+        os.makedirs(product_config.attrib["output_dir"])
+
+        swath = make_swath(args.lines, args.columns)
+        channels = ["%d" % (num + 1) for num in range(args.channels)]
+        products = set(product for _, area_products in areas
+                       for product in area_products)
+        compositer = make_compositer(products, channels)
+        projector = FakeProjector(swath, args.projector)
+        writer = DataWriter(workers=args.writer_workers)
+        processor = BenchProcessor(swath, channels, compositer, projector,
+                                   writer, args.min_coverage is not None)
+        input_file = os.path.join(tmp_dir, "input.l1b")
+        with open(input_file, "w") as fd_:
+            fd_.write("\0" * args.lines * args.columns * 2)
+
+        print "%s: %d areas, %d products" % (
+            os.path.basename(args.product_list), len(areas),
+            sum(len(area_products) for _, area_products in areas))
+        print "%dx%d swath, %d channels, %dx%d areas, %s projection" % (
+            args.lines, args.columns, args.channels, args.area_size,
+            args.area_size, args.projector)
+
+        scene_times = []
+        start = time.time()
+        for num in range(args.scenes):
+            start_time = datetime(2016, 6, 1, 12, 0) + timedelta(hours=num)
+            msg = Message("/bench", "file",
+                          {"platform_name": "NOAA 19",
+                           "orbit_number": 10000 + num,
+                           "time": start_time,
+                           "start_time": start_time,
+                           "end_time": start_time + timedelta(minutes=15),
+                           "sensor": "avhrr/3",
+                           "uri": input_file})
+            tic = time.time()
+            processor.run(product_config, msg)
+            scene_times.append(time.time() - tic)
+        elapsed = time.time() - start
+        processor.stop()
+        writer.join()
+
+        # the generic coverage, from the outline of the valid data
+        scene = processor.create_scene_from_mda(msg.data)
+        scene.load(channels[:1])
+        generic_times = []
+        for area_id, _ in areas:
+            tic = time.time()
+            coverage(scene, area_geometry.get_area_def(area_id))
+            generic_times.append(time.time() - tic)
+        del scene
+
+        saved = sum(stats["products"] for stats in writer.stats)
+        written = sum(stats["bytes_written"] for stats in writer.stats)
+        print "%d scenes in %.1f s: %.2f s per scene, best %.2f s" % (
+            args.scenes, elapsed, elapsed / args.scenes, min(scene_times))
+        print "%d products saved, %.2f products/s, %.1f MB written" % (
+            saved, saved / elapsed, written / 1024. ** 2)
+        print "Peak RSS: %.0f MB" % (
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.)
+        print "Generic coverage: %.1f ms per area" % (
+            sum(generic_times) / len(generic_times) * 1000)
+        print_stages(elapsed)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
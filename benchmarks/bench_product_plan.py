@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark the product planner on the example product lists: count the
+intermediates each area computes with and without sharing them between
+the composites, and time the lon/lat grids on an area of the given size.
+
+./bench_product_plan.py --size 1024 --extra overview_sun \
+    ../examples/product_config_hrpt.xml_template
+"""
+
+import argparse
+import os
+import time
+import xml.etree.ElementTree as ET
+
+from mpop.instruments.seviri import SeviriCompositer
+from mpop.instruments.viirs import ViirsCompositer
+from mpop.instruments.visir import VisirCompositer
+from pyresample.geometry import AreaDefinition
+
+from trollduction.product_planner import (SharedIntermediates,
+                                          get_composite_requirements,
+                                          plan_products)
+
+COMPOSITERS = {"visir": VisirCompositer,
+               "seviri": SeviriCompositer,
+               "viirs": ViirsCompositer}
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "..", "examples")
+
+
+class FakeChannel(object):
+
+    """Channel holding only an area."""
+
+    def __init__(self, area):
+        self.area = area
+
+
+class FakeScene(object):
+
+    """Projected scene with a single channel."""
+
+    def __init__(self, area):
+        self.channels = [FakeChannel(area)]
+
+    def loaded_channels(self):
+        """Get the loaded channels."""
+        return self.channels
+
+
+def get_areas(fname):
+    """Get the (area id, product ids) of the product list *fname*.
+    """
+    root = ET.parse(fname).getroot()
+    areas = []
+    for prodlist in root.findall("product_list"):
+        for area in prodlist.findall("area"):
+            areas.append((area.attrib["id"],
+                          [product.attrib["id"]
+                           for product in area.findall("product")]))
+    return areas
+
+
+def timeit(fun, repeat):
+    """Return the best time out of *repeat* runs of *fun*.
+    """
+    best = None
+    for _ in range(repeat):
+        tic = time.time()
+        fun()
+        elapsed = time.time() - tic
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def make_area(size):
+    """Make a *size* x *size* pixels area."""
+    return AreaDefinition("bench", "bench", "bench",
+                          {"proj": "stere", "lat_0": "60", "lon_0": "15",
+                           "ellps": "WGS84"},
+                          size, size, (-1.5e6, -1.5e6, 1.5e6, 1.5e6))
+
+
+def run_independent(size, consumers):
+    """Compute the grids once per consumer, like mpop does."""
+    area = make_area(size)
+    for _ in range(consumers):
+        area.get_lonlats()
+
+
+def run_shared(size, consumers):
+    """Compute the grids once and share them between the consumers."""
+    scene = FakeScene(make_area(size))
+    intermediates = SharedIntermediates(scene)
+    intermediates.provide(["lonlats"])
+    for _ in range(consumers):
+        scene.channels[0].area.get_lonlats()
+    intermediates.free_all()
+
+
+def main():
+    """Run the benchmark.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("product_lists", nargs="*",
+                        default=[os.path.join(EXAMPLES, name) for name in
+                                 ("product_config_hrpt.xml_template",
+                                  "product_config_hrit.xml_template")],
+                        help="Product lists to plan")
+    parser.add_argument("--compositer", choices=sorted(COMPOSITERS.keys()),
+                        help="Composites to use, guessed from the file "
+                        "name by default")
+    parser.add_argument("--extra", nargs="+", default=[],
+                        help="Products to add to every area, eg. "
+                        "overview_sun or snow")
+    parser.add_argument("--size", type=int, default=1024,
+                        help="Size of the areas in pixels")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of runs, the best one is kept")
+    args = parser.parse_args()
+
+    for fname in args.product_lists:
+        name = args.compositer
+        if name is None:
+            name = "seviri" if "hrit" in os.path.basename(fname) else "visir"
+        compositer = COMPOSITERS[name]
+        print "%s (%s composites)" % (os.path.basename(fname), name)
+        for area_id, products in get_areas(fname):
+            products = products + args.extra
+            funcs = dict((product, getattr(compositer, product, None))
+                         for product in products)
+            steps = plan_products(products, funcs.get)
+            consumers = len([product for product in products
+                             if funcs[product] is not None and
+                             "lonlats" in
+                             get_composite_requirements(funcs[product])[1]])
+            print "  %s: %d products, order %s" % (
+                area_id, len(products),
+                ", ".join(product for product, _, _ in steps))
+            print "    lon/lat grids: %d computed independently, %d " \
+                "planned" % (consumers, min(consumers, 1))
+            if consumers:
+                independent = timeit(
+                    lambda: run_independent(args.size, consumers),
+                    args.repeat)
+                shared = timeit(lambda: run_shared(args.size, consumers),
+                                args.repeat)
+                print "    %dx%d pixels: %.3f s independently, %.3f s " \
+                    "shared" % (args.size, args.size, independent, shared)
+
+
+if __name__ == '__main__':
+    main()
@@ -35,7 +35,7 @@ import logging.handlers
 import os
 import os.path
 from posttroll import message, publisher
-from mpop.projector import get_area_def
+from trollduction.area_geometry import get_area_of_interest
 
 LOGGER = logging.getLogger(__name__)
 CONFIG = RawConfigParser()
@@ -159,7 +159,7 @@ def setup(decoder):
     granule_triggers = []
 
     for section in CONFIG.sections():
-        regions = [get_area_def(region)
+        regions = [get_area_of_interest(region)
                    for region in CONFIG.get(section, "regions").split()]
 
         timeliness = timedelta(minutes=CONFIG.getint(section, "timeliness"))
@@ -5,6 +5,7 @@ import os
 import shutil
 from glob import glob
 from npp_runner.orbitno import TBUS_STYLE
+from trollduction.transfer import transfer_many
 import logging
 LOG = logging.getLogger(__name__)
 
@@ -82,14 +83,14 @@ def pack_sdr_files(sdrfiles, base_dir, subdir):
         os.mkdir(path)
 
     LOG.info("Number of SDR files: " + str(len(sdrfiles)))
-    retvl = []
+    transfers = []
     for sdrfile in sdrfiles:
         newfilename = os.path.join(path, os.path.basename(sdrfile))
         LOG.info("Copy sdrfile to destination: " + newfilename)
-        shutil.copy(sdrfile, newfilename)
-        retvl.append(newfilename)
+        transfers.append((sdrfile, newfilename))
 
-    return retvl
+    failed = set(dst for _, dst, _ in transfer_many(transfers))
+    return [dst for _, dst in transfers if dst not in failed]
 
 # --------------------------------
 if __name__ == "__main__":
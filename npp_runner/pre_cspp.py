@@ -113,7 +113,7 @@ def fix_nppfile4orbitnumber(orbits, npp_file, outdir):
     """Fix the NPP VIIRS RDR/SDR files with respect to oribit number. The
     RDR/SDR file is read and the correct orbit number is inserted, and the
     filename is fixed as well."""
-    import shutil
+    from trollduction.transfer import transfer
 
     # Determine the new output filename:
     start_orbnum = orbits['start']
@@ -127,7 +127,8 @@ def fix_nppfile4orbitnumber(orbits, npp_file, outdir):
         print "File exists! %s" % os.path.basename(outfile)
         return outfile
 
-    shutil.copy(npp_file, outfile)
+    # not linked, the copy being modified below
+    transfer(npp_file, outfile, link=False)
 
     # Start browsing file and change the orbit number:
     out = h5py.File(outfile)
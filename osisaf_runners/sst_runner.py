@@ -24,7 +24,8 @@
 """
 import os
 import ConfigParser
-import shutil
+
+from trollduction.transfer import transfer
 
 import logging
 LOG = logging.getLogger(__name__)
@@ -199,7 +200,7 @@ def start_sst_processing(sst_file, message, **kwargs):
         sir_filename = os.path.join(SST_SIR_DIR,
                                     "osafsst_%s%s.png_original" % (areaid_str,
                                                                    start_time.strftime('%y%m%d%H%M')))
-        shutil.copy(local_filename, sir_filename)
+        transfer(local_filename, sir_filename)
 
     prfx = platform_name.lower() + start_time.strftime("_%Y%m%d_%H") + \
         '_' + str(areaid)
@@ -223,7 +224,7 @@ def start_sst_processing(sst_file, message, **kwargs):
         sir_filename = os.path.join(SST_SIR_DIR,
                                     "osafsst_%s%s.png_original" % (areaid_str,
                                                                    start_time.strftime('%y%m%d%H%M')))
-        shutil.copy(local_filename, sir_filename)
+        transfer(local_filename, sir_filename)
 
     return sst_file
 
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""In-process cache of the area geometries.
+
+Area definitions, boundary longitudes and latitudes, lon/lat extents and
+contour polygons are memoized per area, with least recently used
+eviction. Everything is forgotten when the modification time of the areas
+file changes.
+"""
+
+import logging
+import os
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+from mpop import projector
+from trollsched.boundary import AreaDefBoundary
+
+LOGGER = logging.getLogger(__name__)
+
+
+def get_area_key(area_def):
+    """Get a hashable key identifying *area_def*.
+    """
+    return (str(area_def.area_id), str(area_def.proj4_string),
+            area_def.x_size, area_def.y_size, tuple(area_def.area_extent))
+
+
+class AreaOfInterest(object):
+
+    """An area definition with a precomputed contour polygon *poly*, which
+    trollsched uses instead of computing it again for every pass.
+    """
+
+    def __init__(self, area_def, poly):
+        self.area_def = area_def
+        self.poly = poly
+
+    def __getattr__(self, name):
+        if name == "area_def":
+            # not initialized yet, eg. when unpickling
+            raise AttributeError(name)
+        return getattr(self.area_def, name)
+
+
+class AreaGeometryCache(object):
+
+    """LRU cache of at most *max_size* area geometries. The areas are read
+    from *area_file*, mpop's areas file if None.
+    """
+
+    def __init__(self, max_size=128, area_file=None):
+        self.max_size = max_size
+        self.area_file = area_file
+        self._items = OrderedDict()
+        self._lock = Lock()
+        self._mtime = None
+        self.hits = 0
+        self.misses = 0
+
+    def _check_area_file(self):
+        """Forget everything if the areas file has been modified.
+        """
+        area_file = self.area_file or projector.get_area_file()
+        try:
+            mtime = os.stat(area_file).st_mtime
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            if self._items:
+                LOGGER.debug("Areas file changed, clearing area cache")
+            self._items.clear()
+            self._mtime = mtime
+
+    def _get(self, key, func, *args):
+        """Get the item for *key*, computing it with *func(*args)* if it's
+        not cached.
+        """
+        with self._lock:
+            self._check_area_file()
+            try:
+                value = self._items.pop(key)
+            except KeyError:
+                self.misses += 1
+            else:
+                self._items[key] = value
+                self.hits += 1
+                return value
+
+        value = func(*args)
+
+        with self._lock:
+            self._items[key] = value
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+        return value
+
+    def _parse_area(self, area_id):
+        """Read the definition of *area_id* from the areas file.
+        """
+        if self.area_file is None:
+            return projector.get_area_def(area_id)
+        return projector.utils.parse_area_file(self.area_file, area_id)[0]
+
+    def get_area_def(self, area_id):
+        """Get the definition of the area *area_id*. Area definitions are
+        passed through as is.
+        """
+        if not isinstance(area_id, basestring):
+            return area_id
+        return self._get(("area_def", area_id), self._parse_area, area_id)
+
+    def get_boundaries(self, area):
+        """Get the boundary longitudes and latitudes of *area*, as given by
+        :func:`trollduction.helper_functions.get_area_boundaries`.
+        """
+        from trollduction.helper_functions import get_area_boundaries
+        area_def = self.get_area_def(area)
+        return self._get(("boundaries", get_area_key(area_def)),
+                         get_area_boundaries, area_def)
+
+    def get_extent_ll(self, area):
+        """Get the (left lon, down lat, right lon, up lat) extent of *area*.
+        """
+        area_def = self.get_area_def(area)
+        return self._get(("extent_ll", get_area_key(area_def)),
+                         self._compute_extent_ll, area_def)
+
+    def _compute_extent_ll(self, area_def):
+        """Compute the lon/lat extent of *area_def* from its boundaries.
+        """
+        lons, lats = self.get_boundaries(area_def)
+        return (np.min(lons.side4), np.min(lats.side3),
+                np.max(lons.side2), np.max(lats.side1))
+
+    def get_contour_poly(self, area, frequency=100):
+        """Get the contour polygon of *area*, with one point every
+        *frequency* pixels.
+        """
+        area_def = self.get_area_def(area)
+        return self._get(("contour_poly", get_area_key(area_def), frequency),
+                         self._compute_contour_poly, area_def, frequency)
+
+    @staticmethod
+    def _compute_contour_poly(area_def, frequency):
+        """Compute the contour polygon of *area_def*.
+        """
+        return AreaDefBoundary(area_def, frequency=frequency).contour_poly
+
+    def get_area_of_interest(self, area, frequency=500):
+        """Get *area* along with its contour polygon, for trollsched's
+        coverage computations.
+        """
+        area_def = self.get_area_def(area)
+        return AreaOfInterest(area_def,
+                              self.get_contour_poly(area_def, frequency))
+
+    def invalidate(self):
+        """Forget all the cached geometries.
+        """
+        with self._lock:
+            self._items.clear()
+
+
+AREA_CACHE = AreaGeometryCache()
+
+
+def get_area_def(area_id):
+    """Get the definition of *area_id* from the shared area cache.
+    """
+    return AREA_CACHE.get_area_def(area_id)
+
+
+def get_area_boundaries(area):
+    """Get the boundaries of *area* from the shared area cache.
+    """
+    return AREA_CACHE.get_boundaries(area)
+
+
+def get_area_extent_ll(area):
+    """Get the lon/lat extent of *area* from the shared area cache.
+    """
+    return AREA_CACHE.get_extent_ll(area)
+
+
+def get_contour_poly(area, frequency=100):
+    """Get the contour polygon of *area* from the shared area cache.
+    """
+    return AREA_CACHE.get_contour_poly(area, frequency)
+
+
+def get_area_of_interest(area, frequency=500):
+    """Get *area* with its contour polygon from the shared area cache.
+    """
+    return AREA_CACHE.get_area_of_interest(area, frequency)
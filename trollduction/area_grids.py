@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Static longitude/latitude grids of the areas.
+
+The grids, and the pixels closest to given lon/lat locations, are computed
+once per area. If a cache directory is given, they are stored there as
+``.npy`` files, in a subdirectory named after the hash of the area
+definition, and the grids are read back memory-mapped.
+"""
+
+import logging
+import os
+import tempfile
+from threading import Lock
+
+import numpy as np
+
+from trollduction.resample_cache import get_geometry_hash, makedirs
+
+LOGGER = logging.getLogger(__name__)
+
+# number of lines of the grids to handle at once
+BLOCK_LINES = 1024
+
+
+def save_array(filename, arr):
+    """Save *arr* to *filename* atomically.
+    """
+    dirname = os.path.dirname(filename)
+    makedirs(dirname)
+    tempfd, tempname = tempfile.mkstemp(dir=dirname, suffix=".npy.tmp")
+    try:
+        with os.fdopen(tempfd, "wb") as fd_:
+            np.save(fd_, arr)
+        os.rename(tempname, filename)
+    except Exception:
+        os.remove(tempname)
+        raise
+
+
+def find_nearest_pixel(lons, lats, lon, lat):
+    """Get the (line, column) of the pixel of *lons*, *lats* closest to
+    *lon*, *lat* in degrees.
+    """
+    best = None
+    for start in range(0, lons.shape[0], BLOCK_LINES):
+        dists = ((lons[start:start + BLOCK_LINES] - lon) ** 2 +
+                 (lats[start:start + BLOCK_LINES] - lat) ** 2)
+        dists[np.isnan(dists)] = np.inf
+        idx = np.argmin(dists)
+        dist = dists.flat[idx]
+        if best is None or dist < best[0]:
+            line, col = np.unravel_index(idx, dists.shape)
+            best = (dist, start + int(line), int(col))
+    return best[1], best[2]
+
+
+class AreaGridCache(object):
+
+    """Cache of the lon/lat grids of the areas, stored in *cache_dir* if
+    given, and of the pixels nearest to lon/lat locations.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self._nearest = {}
+        self._lock = Lock()
+
+    def _get_filename(self, area_def, name):
+        """Get the filename of the array *name* for *area_def*.
+        """
+        return os.path.join(self.cache_dir, get_geometry_hash(area_def),
+                            name + ".npy")
+
+    def get_lonlats(self, area_def):
+        """Get the longitude and latitude grids of *area_def*.
+        """
+        if self.cache_dir is None:
+            return area_def.get_lonlats()
+
+        lons_file = self._get_filename(area_def, "lons")
+        lats_file = self._get_filename(area_def, "lats")
+        try:
+            return (np.load(lons_file, mmap_mode="r"),
+                    np.load(lats_file, mmap_mode="r"))
+        except IOError:
+            pass
+
+        LOGGER.debug("Computing the lon/lat grids of %s", area_def.area_id)
+        lons, lats = area_def.get_lonlats()
+        try:
+            save_array(lons_file, np.asarray(lons))
+            save_array(lats_file, np.asarray(lats))
+        except (IOError, OSError):
+            LOGGER.exception("Could not save the lon/lat grids")
+        return lons, lats
+
+    def get_nearest_pixel(self, area_def, lon, lat):
+        """Get the (line, column) of the pixel of *area_def* closest to
+        *lon*, *lat*.
+        """
+        key = (get_geometry_hash(area_def), float(lon), float(lat))
+        with self._lock:
+            if key in self._nearest:
+                return self._nearest[key]
+
+        filename = None
+        if self.cache_dir is not None:
+            filename = self._get_filename(area_def,
+                                          "nearest_%s_%s" % (key[1], key[2]))
+            try:
+                pixel = tuple(int(idx) for idx in np.load(filename))
+            except IOError:
+                pixel = None
+        else:
+            pixel = None
+
+        if pixel is None:
+            lons, lats = self.get_lonlats(area_def)
+            pixel = find_nearest_pixel(lons, lats, lon, lat)
+            del lons, lats
+            if filename is not None:
+                try:
+                    save_array(filename, np.array(pixel))
+                except (IOError, OSError):
+                    LOGGER.exception("Could not save the nearest pixel")
+
+        with self._lock:
+            self._nearest[key] = pixel
+        return pixel
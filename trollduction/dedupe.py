@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Index of the already processed passes.
+
+The passes are identified by their platform, orbit number, start time and
+product list, and forgotten after some time. The index is kept in memory
+and, if a filename is given, in a shelve file so that it survives
+restarts.
+
+A pass is recorded once processed. The passes being processed are only
+kept in memory, so that a pass interrupted by a crash or a restart is
+processed again.
+"""
+
+import logging
+import shelve
+import time
+from threading import Lock
+
+LOGGER = logging.getLogger(__name__)
+
+
+def get_pass_key(mda, product_list):
+    """Get the key identifying the pass described by the message metadata
+    *mda* for *product_list*, or None if it can't be identified.
+    """
+    try:
+        platform_name = mda["platform_name"]
+        start_time = mda["start_time"]
+    except (KeyError, TypeError):
+        return None
+    if start_time is None:
+        return None
+    return "|".join((str(platform_name), str(mda.get("orbit_number")),
+                     str(start_time), str(product_list)))
+
+
+class DedupeIndex(object):
+
+    """Passes processed less than *expiry* seconds ago, stored in
+    *filename* if given.
+    """
+
+    def __init__(self, filename=None, expiry=86400):
+        self.filename = filename
+        self.expiry = expiry
+        self._lock = Lock()
+        self._shelf = None
+        self._items = {}
+        self._running = set()
+        self._last_expiry = 0
+        if filename is not None:
+            self._shelf = shelve.open(filename)
+            self._items.update(self._shelf)
+            self.expire()
+
+    def add(self, key):
+        """Add *key* to the index. Returns False if it was already there.
+        """
+        now = time.time()
+        with self._lock:
+            added = self._items.get(key)
+            if added is not None and now - added < self.expiry:
+                return False
+            self._items[key] = now
+            if self._shelf is not None:
+                self._shelf[key] = now
+                self._shelf.sync()
+        # expire old entries now and then
+        if now - self._last_expiry > min(self.expiry, 3600):
+            self.expire()
+        return True
+
+    def start(self, key):
+        """Mark *key* as being processed. Returns False if the pass is
+        already processed or being processed.
+        """
+        with self._lock:
+            if key in self._running:
+                return False
+            added = self._items.get(key)
+            if added is not None and time.time() - added < self.expiry:
+                return False
+            self._running.add(key)
+        return True
+
+    def done(self, key):
+        """Record *key* as processed.
+        """
+        with self._lock:
+            self._running.discard(key)
+            self._items.pop(key, None)
+        self.add(key)
+
+    def remove(self, key):
+        """Remove *key* from the index, so that the pass can be processed
+        again.
+        """
+        with self._lock:
+            self._running.discard(key)
+            self._items.pop(key, None)
+            if self._shelf is not None and key in self._shelf:
+                del self._shelf[key]
+                self._shelf.sync()
+
+    def __contains__(self, key):
+        with self._lock:
+            added = self._items.get(key)
+        return added is not None and time.time() - added < self.expiry
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def expire(self):
+        """Forget the passes older than the expiry time.
+        """
+        now = time.time()
+        with self._lock:
+            self._last_expiry = now
+            old = [key for key, added in self._items.items()
+                   if now - added >= self.expiry]
+            for key in old:
+                del self._items[key]
+                if self._shelf is not None:
+                    del self._shelf[key]
+            if old and self._shelf is not None:
+                self._shelf.sync()
+        if old:
+            LOGGER.debug("Forgot %d processed passes", len(old))
+
+    def close(self):
+        """Close the index file.
+        """
+        with self._lock:
+            if self._shelf is not None:
+                self._shelf.close()
+                self._shelf = None
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Encoding of the images in a pool of processes.
+
+The encoding of PNG and GeoTIFF images is bound by the GIL when done in
+threads. The encoder pool saves the images in separate processes instead.
+The image channels are not pickled, but written to ``.npy`` files in a
+temporary directory (preferably in memory, like /dev/shm) which the
+processes read memory-mapped. The thumbnails are made from the image in
+memory at the same time, instead of reading the saved file back.
+"""
+
+import cPickle
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+
+def make_thumbnail(img, thname, size, fformat):
+    """Make a thumbnail of *size* from the image *img* in memory and save
+    it to *thname*.
+    """
+    from PIL import Image
+    pil_img = img.pil_image()
+    pil_img.thumbnail(size, Image.ANTIALIAS)
+    pil_img.save(thname, fformat)
+
+
+def share_image(img, tmp_dir=None):
+    """Store the channels of *img* in a new directory in *tmp_dir* and
+    return the directory and a picklable description of the image, or
+    None if *img* can't be shared.
+    """
+    channels = getattr(img, "channels", None)
+    if not isinstance(channels, (list, tuple)):
+        return None
+    state = dict((key, val) for key, val in img.__dict__.items()
+                 if key != "channels")
+    try:
+        state = cPickle.dumps(state, cPickle.HIGHEST_PROTOCOL)
+    except (cPickle.PicklingError, TypeError):
+        return None
+
+    shared_dir = tempfile.mkdtemp(dir=tmp_dir, prefix="encoder_")
+    files = []
+    try:
+        for num, chn in enumerate(channels):
+            data_file = os.path.join(shared_dir, "%d_data.npy" % num)
+            np.save(data_file, np.ma.getdata(chn))
+            mask = np.ma.getmask(chn)
+            if mask is np.ma.nomask:
+                mask_file = None
+            else:
+                mask_file = os.path.join(shared_dir, "%d_mask.npy" % num)
+                np.save(mask_file, mask)
+            files.append((data_file, mask_file))
+    except Exception:
+        shutil.rmtree(shared_dir, ignore_errors=True)
+        raise
+    return shared_dir, (img.__class__, state, files)
+
+
+def load_image(shared):
+    """Rebuild the image described by *shared*, with memory-mapped
+    channels.
+    """
+    cls, state, files = shared
+    img = cls.__new__(cls)
+    img.__dict__.update(cPickle.loads(state))
+    channels = []
+    for data_file, mask_file in files:
+        data = np.load(data_file, mmap_mode="r")
+        if mask_file is None:
+            channels.append(np.ma.array(data))
+        else:
+            channels.append(np.ma.array(data,
+                                        mask=np.load(mask_file,
+                                                     mmap_mode="r")))
+    img.channels = channels
+    return img
+
+
+def encode_image(shared, filename, fformat, compression, thumbnail=None):
+    """Save the image described by *shared* to *filename*, and its
+    thumbnail if *thumbnail* is given as (filename, size).
+    """
+    img = load_image(shared)
+    img.save(filename, fformat=fformat, compression=compression)
+    if thumbnail is not None:
+        thname, size = thumbnail
+        make_thumbnail(img, thname, size, fformat)
+
+
+class EncoderPool(object):
+
+    """Pool of *processes* saving the images, the channels being passed
+    through files in *tmp_dir*.
+    """
+
+    def __init__(self, processes, tmp_dir=None):
+        self.processes = processes
+        self.tmp_dir = tmp_dir
+        self._pool = multiprocessing.Pool(processes)
+
+    def encode(self, img, filename, fformat=None, compression=6,
+               thumbnail=None):
+        """Save *img* to *filename* in one of the processes, along with its
+        thumbnail if *thumbnail* is given as (filename, size). Returns
+        False if *img* can't be encoded out of process.
+        """
+        res = share_image(img, self.tmp_dir)
+        if res is None:
+            return False
+        shared_dir, shared = res
+        try:
+            self._pool.apply(encode_image, (shared, filename, fformat,
+                                            compression, thumbnail))
+        finally:
+            shutil.rmtree(shared_dir, ignore_errors=True)
+        return True
+
+    def close(self):
+        """Wait for the processes to finish and stop them.
+        """
+        self._pool.close()
+        self._pool.join()
@@ -27,8 +27,9 @@
 import numpy as np
 import os
 import xml_read
-from mpop.projector import get_area_def
+import area_geometry
 from pyresample.geometry import Boundary
+from pyproj import Proj
 import logging
 from ConfigParser import ConfigParser
 
@@ -57,114 +58,86 @@ def read_config_file(fname, config_item=None):
 def get_maximum_extent(area_def_names):
     '''Get maximum extend needed to produce all defined areas.
     '''
-    maximum_area_extent = [None, None, None, None]
-    for area in area_def_names:
-        extent = get_area_def(area)
-
-        if maximum_area_extent[0] is None:
-            maximum_area_extent = list(extent.area_extent)
-        else:
-            if maximum_area_extent[0] > extent.area_extent[0]:
-                maximum_area_extent[0] = extent.area_extent[0]
-            if maximum_area_extent[1] > extent.area_extent[1]:
-                maximum_area_extent[1] = extent.area_extent[1]
-            if maximum_area_extent[2] < extent.area_extent[2]:
-                maximum_area_extent[2] = extent.area_extent[2]
-            if maximum_area_extent[3] < extent.area_extent[3]:
-                maximum_area_extent[3] = extent.area_extent[3]
-
-    return maximum_area_extent
+    if not area_def_names:
+        return [None, None, None, None]
+    extents = np.array([area_geometry.get_area_def(area).area_extent
+                        for area in area_def_names])
+    return [extents[:, 0].min(), extents[:, 1].min(),
+            extents[:, 2].max(), extents[:, 3].max()]
 
 
 def get_maximum_extent_ll(area_def_names):
     '''Get maximum extend needed to produce all the defined areas
     given in *area_def_names*.
     '''
-    maximum_area_extent = [None, None, None, None]
-
-    for area in area_def_names:
-        area_def = get_area_def(area['definition'])
-
-        lons, lats = get_area_boundaries(area_def)
-        left_lon, down_lat, right_lon, up_lat = \
-            np.min(lons.side4), \
-            np.min(lats.side3), \
-            np.max(lons.side2), \
-            np.max(lats.side1)
-
-        if maximum_area_extent[0] is None:
-            maximum_area_extent = [left_lon, down_lat, right_lon, up_lat]
-        else:
-            if maximum_area_extent[0] > left_lon:
-                maximum_area_extent[0] = left_lon
-            if maximum_area_extent[1] > down_lat:
-                maximum_area_extent[1] = down_lat
-            if maximum_area_extent[2] < right_lon:
-                maximum_area_extent[2] = right_lon
-            if maximum_area_extent[3] < up_lat:
-                maximum_area_extent[3] = up_lat
-
-    return maximum_area_extent
+    if not area_def_names:
+        return [None, None, None, None]
+    extents = np.array([area_geometry.get_area_extent_ll(area['definition'])
+                        for area in area_def_names])
+    return [extents[:, 0].min(), extents[:, 1].min(),
+            extents[:, 2].max(), extents[:, 3].max()]
 
 
 def get_maximum_ll_borders(area_def_names):
     '''Get maximum extend needed to produce all the defined areas
     given in *area_def_names*.
     '''
-    maximum_area_extent = [None, None, None, None]
+    return get_maximum_extent_ll(area_def_names)
 
-    for area in area_def_names:
-        area_def = get_area_def(area['definition'])
 
-        lons, lats = get_area_boundaries(area_def)
-        left_lon, down_lat, right_lon, up_lat = \
-            np.min(lons.side4), \
-            np.min(lats.side3), \
-            np.max(lons.side2), \
-            np.max(lats.side1)
+def get_lonlats_at(area_def, rows, cols):
+    '''Get the longitudes and latitudes of the pixels of *area_def* at
+    *rows* and *cols*, with one projection call for all the pixels.
+    '''
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
 
-        if maximum_area_extent[0] is None:
-            maximum_area_extent = [left_lon, down_lat, right_lon, up_lat]
-        else:
-            if maximum_area_extent[0] > left_lon:
-                maximum_area_extent[0] = left_lon
-            if maximum_area_extent[1] > down_lat:
-                maximum_area_extent[1] = down_lat
-            if maximum_area_extent[2] < right_lon:
-                maximum_area_extent[2] = right_lon
-            if maximum_area_extent[3] < up_lat:
-                maximum_area_extent[3] = up_lat
+    lons = getattr(area_def, "lons", None)
+    lats = getattr(area_def, "lats", None)
+    if lons is not None and lats is not None:
+        # swath, or area with cached coordinates
+        return np.asarray(lons[rows, cols]), np.asarray(lats[rows, cols])
 
-    return maximum_area_extent
+    try:
+        x_coords = cols * area_def.pixel_size_x + area_def.pixel_upper_left[0]
+        y_coords = area_def.pixel_upper_left[1] - rows * area_def.pixel_size_y
+        proj = Proj(**area_def.proj_dict)
+    except AttributeError:
+        lonlats = [area_def.get_lonlat(row, col)
+                   for row, col in zip(rows.ravel(), cols.ravel())]
+        lonlats = np.array(lonlats, dtype=np.float64).reshape(rows.shape +
+                                                              (2, ))
+        return lonlats[..., 0], lonlats[..., 1]
+
+    if proj.is_latlong():
+        # the coordinates are already in degrees, as in pyresample
+        return (np.asarray(x_coords, dtype=np.float64),
+                np.asarray(y_coords, dtype=np.float64))
+    lons, lats = proj(x_coords, y_coords, inverse=True)
+    return np.asarray(lons), np.asarray(lats)
 
 
 def get_area_boundaries(area_def):
     '''Get area boundaries from area definition.
     '''
-
-    # upper boundary
-    lonlat = np.array([area_def.get_lonlat(0, i)
-                       for i in range(area_def.x_size)])
-    up_lons = lonlat[:, 0]
-    up_lats = lonlat[:, 1]
-
-    # lower boundary
-    lonlat = np.array([area_def.get_lonlat(area_def.y_size - 1, i)
-                       for i in range(area_def.x_size)])
-    down_lons = lonlat[:, 0]
-    down_lats = lonlat[:, 1]
-
-    # left boundary
-    lonlat = np.array([area_def.get_lonlat(i, 0)
-                       for i in range(area_def.y_size)])
-    left_lons = lonlat[:, 0]
-    left_lats = lonlat[:, 1]
-
-    # right boundary
-    lonlat = np.array([area_def.get_lonlat(i, area_def.x_size - 1)
-                       for i in range(area_def.y_size)])
-    right_lons = lonlat[:, 0]
-    right_lats = lonlat[:, 1]
+    x_size, y_size = area_def.x_size, area_def.y_size
+    cols = np.arange(x_size)
+    rows = np.arange(y_size)
+
+    # upper, lower, left and right boundaries, projected in one go
+    all_rows = np.concatenate((np.zeros(x_size, dtype=np.int64),
+                               np.full(x_size, y_size - 1, dtype=np.int64),
+                               rows,
+                               rows))
+    all_cols = np.concatenate((cols,
+                               cols,
+                               np.zeros(y_size, dtype=np.int64),
+                               np.full(y_size, x_size - 1, dtype=np.int64)))
+    lons, lats = get_lonlats_at(area_def, all_rows, all_cols)
+
+    splits = np.cumsum((x_size, x_size, y_size))
+    up_lons, down_lons, left_lons, right_lons = np.split(lons, splits)
+    up_lats, down_lats, left_lats, right_lats = np.split(lats, splits)
 
     return (Boundary(up_lons, right_lons, down_lons, left_lons),
             Boundary(up_lats, right_lats, down_lats, left_lats))
@@ -184,6 +157,31 @@ def get_indices_from_boundaries(boundary_lons, boundary_lats,
     return valid_index
 
 
+def get_swath_window(area_defs, lons, lats, radius_of_influence):
+    '''Get the (row, column) slices of the swath *lons*, *lats* holding
+    all the pixels that can be used when resampling to *area_defs*, or
+    None if there are none.
+    '''
+    valid = np.zeros(lons.shape, dtype=np.bool)
+    for area_def in area_defs:
+        boundary_lons, boundary_lats = \
+            area_geometry.get_area_boundaries(area_def)
+        valid_index = get_indices_from_boundaries(boundary_lons,
+                                                  boundary_lats,
+                                                  lons, lats,
+                                                  radius_of_influence)
+        if np.ndim(valid_index) != valid.ndim:
+            # the boundaries can't be used to reduce the data
+            return (slice(None), ) * valid.ndim
+        valid |= np.ma.filled(valid_index, False)
+
+    rows = np.nonzero(valid.any(axis=1))[0]
+    if rows.size == 0:
+        return None
+    cols = np.nonzero(valid.any(axis=0))[0]
+    return (slice(rows[0], rows[-1] + 1), slice(cols[0], cols[-1] + 1))
+
+
 def get_angle_sum(lons_side1, lons_side2, lons_side3, lons_side4):
     '''Calculate angle sum for winding number theorem.  Note that all
     the sides need to be connected, that is:
@@ -194,9 +192,9 @@ def get_angle_sum(lons_side1, lons_side2, lons_side3, lons_side4):
     '''
     angle_sum = 0
     for side in (lons_side1, lons_side2, lons_side3, lons_side4):
-        side_diff = np.sum(np.diff(side))
+        side_diff = np.diff(side)
         idxs, = np.where(np.abs(side_diff) > 180)
-        if idxs:
+        if idxs.size:
             side_diff[idxs] = (np.abs(side_diff[idxs]) - 360) * \
                 np.sign(side_diff[idxs])
         angle_sum += np.sum(side_diff)
@@ -244,13 +242,14 @@ def _get_valid_index(lons_side1, lons_side2, lons_side3, lons_side4,
 
     max_angle_s2 = max(abs(lats_side2.max()), abs(lats_side2.min()))
     max_angle_s4 = max(abs(lats_side4.max()), abs(lats_side4.min()))
+    # a degree of longitude is shortest at the highest latitude
     lon_min_buffered = lons_side4.min() - \
         np.degrees(float(radius_of_influence) /
-                   (np.sin(np.radians(max_angle_s4)) * earth_radius))
+                   (np.cos(np.radians(max_angle_s4)) * earth_radius))
 
     lon_max_buffered = lons_side2.max() + \
         np.degrees(float(radius_of_influence) /
-                   (np.sin(np.radians(max_angle_s2)) * earth_radius))
+                   (np.cos(np.radians(max_angle_s2)) * earth_radius))
 
     # From the winding number theorem follows:
     # angle_sum possiblilities:
@@ -24,6 +24,7 @@
 '''Listener module for Trollduction.'''
 
 from posttroll.subscriber import NSSubscriber
+from trollduction.timing import TIMINGS
 from Queue import Queue
 from threading import Thread
 import time
@@ -37,14 +38,16 @@ class ListenerContainer(object):
     '''Container for listener instance
     '''
 
-    def __init__(self, topics=None):
+    def __init__(self, topics=None, queue=None):
         self.listener = None
         self.queue = None
         self.thread = None
 
         if topics is not None:
-            # Create queue for the messages
-            self.queue = Queue()  # Pipe()
+            # Create queue for the messages, unless one is given
+            if queue is None:
+                queue = Queue()  # Pipe()
+            self.queue = queue
 
             # Create a Listener instance
             self.listener = Listener(topics=topics, queue=self.queue)
@@ -59,7 +62,7 @@ class ListenerContainer(object):
         if self.listener is not None:
             if self.listener.running:
                 self.stop()
-        self.__init__(topics=topics)
+        self.__init__(topics=topics, queue=self.queue)
 
     def stop(self):
         '''Stop listener.'''
@@ -98,6 +101,7 @@ class Listener(object):
     def add_to_queue(self, msg):
         '''Add message to queue
         '''
+        TIMINGS.mark_received(msg)
         self.queue.put(msg)
 
     def run(self):
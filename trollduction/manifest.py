@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Manifest of the output files.
+
+Each file written is recorded with its size, modification time and the id
+of the scene it was made from. A file is complete for a scene if it is
+recorded for that scene and still has the recorded size and modification
+time, so that reprocessing a scene can skip the files already written.
+The scene id includes the end time and the files of the scene, so that a
+pass sent again with more data is produced again.
+
+The manifest is kept in an sqlite database, in memory or in a file if a
+filename is given, indexed on the filenames so that recording and looking
+up a file don't depend on the number of files recorded. The records are
+committed in batches, and forgotten after some time.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from threading import Lock
+
+LOGGER = logging.getLogger(__name__)
+
+# time in seconds after which the files are forgotten
+EXPIRY = 7 * 86400
+# maximum number of records, and seconds, between two commits
+COMMIT_RECORDS = 100
+COMMIT_INTERVAL = 5
+
+
+def _get_key(filename):
+    """Get the manifest key of *filename*, as a utf-8 string."""
+    if isinstance(filename, unicode):
+        return filename.encode("utf-8")
+    return filename
+
+
+def get_uris(info):
+    """Get the sorted uris of the files described by *info*, from its uri,
+    dataset or collection.
+    """
+    uris = []
+    if info.get("uri") is not None:
+        uris.append(info["uri"])
+    for item in info.get("dataset") or []:
+        uris.extend(get_uris(item))
+    for item in info.get("collection") or []:
+        uris.extend(get_uris(item))
+    return sorted(uris)
+
+
+def get_scene_id(info):
+    """Get the id of the scene described by *info*, eg. the message
+    metadata or the filename parameters, or None if it can't be
+    identified.
+    """
+    try:
+        platform_name = info["platform_name"]
+    except (KeyError, TypeError):
+        return None
+    start_time = info.get("start_time") or info.get("time")
+    if start_time is None:
+        return None
+    uris = hashlib.sha1("\n".join(_get_key(uri)
+                                  for uri in get_uris(info))).hexdigest()
+    return "|".join((str(platform_name), str(info.get("orbit_number")),
+                     str(start_time), str(info.get("end_time")), uris))
+
+
+class OutputManifest(object):
+
+    """Output files recorded with their size, modification time and scene
+    id, stored in *filename* if given, and forgotten after *expiry*
+    seconds. Up to *commit_records* records or *commit_interval* seconds
+    of records can be lost in a crash, the files being then written again.
+    """
+
+    def __init__(self, filename=None, expiry=EXPIRY,
+                 commit_records=COMMIT_RECORDS,
+                 commit_interval=COMMIT_INTERVAL):
+        self.filename = filename
+        self.expiry = expiry
+        self.commit_records = commit_records
+        self.commit_interval = commit_interval
+        self._lock = Lock()
+        self._conn = sqlite3.connect(filename or ":memory:",
+                                     check_same_thread=False)
+        self._conn.text_factory = str
+        if filename is not None:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS files "
+                           "(filename TEXT PRIMARY KEY, size INTEGER, "
+                           "mtime REAL, scene_id TEXT, recorded REAL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS files_recorded "
+                           "ON files (recorded)")
+        self._conn.commit()
+        self._pending = 0
+        self._last_commit = time.time()
+        self._last_expiry = 0
+        self.expire()
+
+    def _commit(self, force=False):
+        """Commit the pending records if there are enough of them, or if
+        they are old enough, or if *force* is True. Called with the lock
+        held.
+        """
+        if not self._pending:
+            return
+        now = time.time()
+        if (force or self._pending >= self.commit_records or
+                now - self._last_commit >= self.commit_interval):
+            self._conn.commit()
+            self._pending = 0
+            self._last_commit = now
+
+    def record(self, filename, scene_id):
+        """Record *filename* as written from the scene *scene_id*.
+        """
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            LOGGER.warning("Can't record missing file %s", filename)
+            return
+        now = time.time()
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.execute("INSERT OR REPLACE INTO files VALUES "
+                               "(?, ?, ?, ?, ?)",
+                               (_get_key(filename), stat.st_size,
+                                stat.st_mtime, scene_id, now))
+            self._pending += 1
+            self._commit()
+        # expire old entries now and then
+        if now - self._last_expiry > min(self.expiry, 3600):
+            self.expire()
+
+    def _get_entry(self, filename):
+        """Get the (size, mtime, scene id) recorded for *filename*, None if
+        it isn't recorded.
+        """
+        with self._lock:
+            if self._conn is None:
+                return None
+            return self._conn.execute(
+                "SELECT size, mtime, scene_id FROM files WHERE filename = ?",
+                (_get_key(filename), )).fetchone()
+
+    def is_complete(self, filename, scene_id):
+        """Check if *filename* has been written from *scene_id* and not
+        modified since.
+        """
+        if scene_id is None:
+            return False
+        entry = self._get_entry(filename)
+        if entry is None or entry[2] != scene_id:
+            return False
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            self.remove(filename)
+            return False
+        return (stat.st_size, stat.st_mtime) == tuple(entry[:2])
+
+    def remove(self, filename):
+        """Forget *filename*.
+        """
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.execute("DELETE FROM files WHERE filename = ?",
+                               (_get_key(filename), ))
+            self._pending += 1
+            self._commit()
+
+    def expire(self):
+        """Forget the files recorded more than the expiry time ago.
+        """
+        now = time.time()
+        with self._lock:
+            self._last_expiry = now
+            if self._conn is None:
+                return
+            old = self._conn.execute("DELETE FROM files WHERE recorded < ?",
+                                     (now - self.expiry, )).rowcount
+            self._conn.commit()
+            self._pending = 0
+            self._last_commit = now
+        if old > 0:
+            LOGGER.debug("Forgot %d output files", old)
+
+    def __contains__(self, filename):
+        return self._get_entry(filename) is not None
+
+    def __len__(self):
+        with self._lock:
+            if self._conn is None:
+                return 0
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def close(self):
+        """Commit the pending records and close the manifest.
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._commit(force=True)
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Processing pipeline stages.
+
+Each stage is a thread taking items from its input queue, handling them,
+and passing the results to the input queue of the next stage. The queues
+being bounded, a slow stage holds back the stages before it.
+"""
+
+import logging
+import Queue
+import time
+from threading import Lock, Thread
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Stage(Thread):
+
+    """A pipeline stage called *name*, running *func* on the items of
+    *in_queue*. The results which aren't None are put in *out_queue*, if
+    given. The results which can't be passed on because the stage is
+    stopped are given to *on_reject*, if given.
+
+    The time spent working, waiting for items and waiting for room in
+    *out_queue* is recorded in :attr:`stats`.
+    """
+
+    def __init__(self, name, func, in_queue, out_queue=None,
+                 on_reject=None):
+        Thread.__init__(self, name=name)
+        self.func = func
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.on_reject = on_reject
+        self._loop = True
+        self._lock = Lock()
+        self._started = None
+        self.stats = {"items": 0,
+                      "busy_time": 0.0,
+                      "wait_time": 0.0,
+                      "blocked_time": 0.0,
+                      "max_queue_depth": 0}
+
+    def run(self):
+        """Run the thread."""
+        self._started = time.time()
+        while self._loop:
+            wait_start = time.time()
+            try:
+                item = self.in_queue.get(True, 1)
+            except Queue.Empty:
+                self._add("wait_time", time.time() - wait_start)
+                continue
+            busy_start = time.time()
+            with self._lock:
+                self.stats["wait_time"] += busy_start - wait_start
+                self.stats["max_queue_depth"] = \
+                    max(self.stats["max_queue_depth"],
+                        self.in_queue.qsize() + 1)
+            try:
+                result = self.func(item)
+            except Exception:
+                LOGGER.exception("Stage %s failed", self.name)
+                result = None
+            del item
+            put_start = time.time()
+            with self._lock:
+                self.stats["items"] += 1
+                self.stats["busy_time"] += put_start - busy_start
+            if result is not None and self.out_queue is not None:
+                if not self.put(result):
+                    self.reject(result)
+                self._add("blocked_time", time.time() - put_start)
+            # done once passed on, so that joining the queues in order
+            # waits for the whole pipeline
+            self.in_queue.task_done()
+
+    def put(self, item):
+        """Put *item* in the output queue, waiting for room in it unless
+        the stage is stopped. Returns False if *item* wasn't put.
+        """
+        while self._loop:
+            try:
+                self.out_queue.put(item, True, 1)
+                return True
+            except Queue.Full:
+                continue
+        return False
+
+    def reject(self, item):
+        """Give *item*, which couldn't be passed on, to the reject
+        callback.
+        """
+        LOGGER.warning("Stage %s stopped, item not passed on", self.name)
+        if self.on_reject is None:
+            return
+        try:
+            self.on_reject(item)
+        except Exception:
+            LOGGER.exception("Stage %s failed to reject an item", self.name)
+
+    def _add(self, key, value):
+        """Add *value* to the statistic *key*."""
+        with self._lock:
+            self.stats[key] += value
+
+    def get_stats(self):
+        """Get the statistics of the stage, with its occupancy, the
+        fraction of time spent working.
+        """
+        with self._lock:
+            stats = self.stats.copy()
+        if self._started is not None:
+            elapsed = time.time() - self._started
+        else:
+            elapsed = 0
+        stats["occupancy"] = stats["busy_time"] / elapsed if elapsed else 0.0
+        return stats
+
+    def log_stats(self):
+        """Log the statistics of the stage."""
+        stats = self.get_stats()
+        LOGGER.info("Stage %s: %d items, occupancy %.0f %%, %.1f s busy, "
+                    "%.1f s waiting for input, %.1f s waiting for output, "
+                    "max queue depth %d",
+                    self.name, stats["items"], stats["occupancy"] * 100,
+                    stats["busy_time"], stats["wait_time"],
+                    stats["blocked_time"], stats["max_queue_depth"])
+
+    def stop(self):
+        """Stop the stage."""
+        self._loop = False
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Planning of the channel loads of the product groups.
+"""
+
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+
+def get_channels_size(scene):
+    """Get the size in bytes of the loaded channels of *scene*, as a
+    dictionary keyed by channel name.
+    """
+    sizes = {}
+    for chn in scene.loaded_channels():
+        data = chn.data
+        size = data.nbytes
+        mask = getattr(data, "mask", None)
+        if mask is not None and getattr(mask, "nbytes", None):
+            size += mask.nbytes
+        sizes[chn.name] = size
+    return sizes
+
+
+class ChannelLoadPlan(object):
+
+    """Plan the processing of groups, given as (key, channels, unload)
+    tuples, where *channels* is the set of channels the group requires
+    (None for all the channels) and *unload* tells if all the channels
+    are unloaded before and after the group.
+
+    Each channel is unloaded after the last group requiring it. If
+    *reorder* is True, the groups are also ordered so that groups sharing
+    channels follow each other. If *planned* is False, or if some group
+    requires all the channels, the original order is kept and nothing is
+    unloaded.
+    """
+
+    def __init__(self, groups, planned=True, reorder=True):
+        self.groups = list(groups)
+        self.reorder = reorder
+        self.steps = []
+        if not planned or any(channels is None
+                              for _, channels, _ in self.groups):
+            self.planned = False
+            self.steps = [(key, channels, set())
+                          for key, channels, _ in self.groups]
+        else:
+            self.planned = True
+            self._plan()
+
+    def _plan(self):
+        """Order the groups and find when to unload each channel.
+        """
+        remaining = list(self.groups)
+        order = []
+        loaded = set()
+        if not self.reorder:
+            order, remaining = remaining, []
+        while remaining:
+            # most shared channels with the loaded ones, the earliest
+            # group first
+            idx = max(range(len(remaining)),
+                      key=lambda i: (len(remaining[i][1] & loaded), -i))
+            best = remaining.pop(idx)
+            order.append(best)
+            if best[2]:
+                loaded = set()
+            else:
+                loaded |= best[1]
+
+        last_use = {}
+        for i, (_, channels, _) in enumerate(order):
+            for chn in channels:
+                last_use[chn] = i
+        for i, (key, channels, _) in enumerate(order):
+            unload_after = set(chn for chn, last in last_use.items()
+                               if last == i)
+            self.steps.append((key, channels, unload_after))
+
+    @property
+    def channels(self):
+        """All the channels required by the groups.
+        """
+        res = set()
+        for _, channels, _ in self.groups:
+            res |= channels or set()
+        return res
+
+    def get_peak(self, sizes=None):
+        """Get the planned peak of loaded channels, counted in bytes using
+        the channel *sizes*, or in number of channels if *sizes* is None.
+        """
+        if sizes is None:
+            sizes = {}
+            default = 1
+        else:
+            default = 0
+        unloads = dict((key, unload) for key, _, unload in self.groups)
+        peak = 0
+        loaded = set()
+        for key, channels, unload_after in self.steps:
+            if unloads[key]:
+                loaded = set()
+            loaded |= channels or set()
+            peak = max(peak, sum(sizes.get(chn, default) for chn in loaded))
+            if unloads[key]:
+                loaded = set()
+            else:
+                loaded -= unload_after
+        return peak
+
+    def log_peak(self, sizes, actual_peak):
+        """Log the planned and *actual_peak* channel memory, in bytes.
+        """
+        if not self.planned:
+            LOGGER.info("Peak channel memory: %.1f MB",
+                        actual_peak / 1024. ** 2)
+            return
+        LOGGER.info("Peak channel memory: planned %.1f MB, actual %.1f MB",
+                    self.get_peak(sizes) / 1024. ** 2,
+                    actual_peak / 1024. ** 2)
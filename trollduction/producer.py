@@ -39,29 +39,47 @@ TODO:
 from .listener import ListenerContainer
 from mpop.satellites import GenericFactory as GF
 import time
-from mpop.projector import get_area_def
-from threading import Thread
+from threading import Thread, BoundedSemaphore, Condition, Lock
+from functools import partial
+from multiprocessing.pool import ThreadPool
 from pyorbital import astronomy
 import numpy as np
 import os
 import Queue
+import cPickle
+import copy
 import logging
 import logging.handlers
 from fnmatch import fnmatch
 from trollduction import helper_functions
+from trollduction import xml_read
+from trollduction import area_geometry
+from trollduction import dedupe
+from trollduction.resample_cache import ResampleCache, project_scene
+from trollduction.planning import ChannelLoadPlan, get_channels_size
+from trollduction.area_grids import AreaGridCache
+from trollduction.pipeline import Stage
+from trollduction.product_planner import SharedIntermediates, plan_products
+from trollduction.scheduler import MessageScheduler
+from trollduction.retry import RetryQueue
+from trollduction.encoder import EncoderPool, make_thumbnail
+from trollduction.manifest import OutputManifest, get_scene_id
+from trollduction.timing import TIMINGS
+from trollduction.transfer import fan_out, transfer, transfer_many
+from trollduction.transfer import log_stats as log_transfer_stats
 from trollsift import compose
 from urlparse import urlparse, urlunsplit
 import socket
-import shutil
 from mpop.satout.cfscene import CFScene
 from posttroll.publisher import Publish
 from posttroll.message import Message
 from pyresample.utils import AreaNotFound
+from pyresample.geometry import SwathDefinition
 from trollsched.satpass import Pass
-from trollsched.boundary import Boundary, AreaDefBoundary
-import errno
+from trollsched.boundary import Boundary
 import netifaces
 import tempfile
+from datetime import timedelta
 
 try:
     from mipp import DecodeError
@@ -126,6 +144,24 @@ def is_uri_on_server(uri, strict=False):
     return True
 
 
+def get_message_uris(msg):
+    """Get the uri, or list of uris, of the data announced in *msg*, or
+    None if the type of message isn't supported.
+    """
+    if msg.type == "file":
+        return msg.data['uri']
+    elif msg.type == "dataset":
+        return [mda['uri'] for mda in msg.data['dataset']]
+    elif msg.type == 'collection':
+        if 'dataset' in msg.data['collection'][0]:
+            uri = []
+            for dataset in msg.data['collection']:
+                uri.extend([mda['uri'] for mda in dataset['dataset']])
+            return uri
+        return [mda['uri'] for mda in msg.data['collection']]
+    return None
+
+
 def check_uri(uri):
     """Check that the provided *uri* is on the local host and return the
     file path.
@@ -232,12 +268,12 @@ class ConfigWatcher(object):
 
 def covers(overpass, area_item):
     try:
-        area_def = get_area_def(area_item.attrib['id'])
         min_coverage = float(area_item.attrib.get('min_coverage', 0))
         if min_coverage == 0 or overpass is None:
             return True
         min_coverage /= 100.0
-        coverage = overpass.area_coverage(area_def)
+        coverage = overpass.area_coverage(
+            area_geometry.get_area_of_interest(area_item.attrib['id']))
         if coverage <= min_coverage:
             LOGGER.info("Coverage too small %.1f%% (out of %.1f%%) with %s",
                         coverage * 100, min_coverage * 100,
@@ -254,55 +290,61 @@ def covers(overpass, area_item):
 
 
 def get_polygons_positions(datas, frequency=1):
-
+    """Get the (line, column) positions of the outlines of the valid data
+    in *datas*, one polygon per block of consecutive valid lines. Only
+    every *frequency* line is used for the left and right sides.
+    """
     mask = None
     for data in datas:
         if mask is None:
-            mask = data.mask
+            mask = np.ma.getmaskarray(data)
         else:
-            mask = np.logical_or(mask, data.mask)
+            mask = np.logical_or(mask, np.ma.getmaskarray(data))
+
+    valid = np.logical_not(mask)
+    lines = np.nonzero(valid.any(axis=1))[0]
+    if lines.size == 0:
+        return []
+    first_cols = valid.argmax(axis=1)
+    last_cols = valid.shape[1] - 1 - valid[:, ::-1].argmax(axis=1)
+
+    def side(side_lines, cols):
+        """Get the positions on a side as a list of tuples."""
+        return zip(side_lines.tolist(), cols[side_lines].tolist())
+
+    # split the valid lines in blocks of consecutive lines
+    breaks = np.nonzero(np.diff(lines) != 1)[0] + 1
+    blocks = np.split(lines, breaks)
 
     polygons = []
-    polygon_left = []
-    polygon_right = []
-    count = 0
-    last_valid_line = None
-    for line in range(mask.shape[0]):
-        if np.any(1 - mask[line, :]):
-            indices = np.nonzero(1 - mask[line, :])[0]
-
-            if last_valid_line is not None and last_valid_line != line - 1:
-                # close the polygon and start a new one.
-                last_indices = np.nonzero(1 - mask[last_valid_line, :])[0]
-                if count % frequency != 0:
-                    polygon_right.append((last_valid_line, last_indices[-1]))
-                    polygon_left.append((last_valid_line, last_indices[0]))
-                for indice in last_indices[1:-1:frequency]:
-                    polygon_left.append((last_valid_line, indice))
-                polygon_left.reverse()
-                polygons.append(polygon_left + polygon_right)
-                polygon_left = []
-                polygon_right = []
-                count = 0
-
-                for indice in indices[1::frequency]:
-                    polygon_right.append((line, indice))
-                polygon_left.append((line, indices[0]))
-
-            elif count % frequency == 0:
-                polygon_left.append((line, indices[0]))
-                polygon_right.append((line, indices[-1]))
-            count += 1
-            last_valid_line = line
-
-    if (count - 1) % frequency != 0 and last_valid_line is not None:
-        polygon_left.append((last_valid_line, indices[0]))
-        polygon_right.append((last_valid_line, indices[-1]))
-
-    polygon_left.reverse()
-    result = polygon_left + polygon_right
-    if result:
-        polygons.append(result)
+    for num, block in enumerate(blocks):
+        count = block.size
+        sampled = block[::frequency]
+        polygon_left = side(sampled, first_cols)
+        if num == 0:
+            polygon_right = side(sampled, last_cols)
+        else:
+            # the top of the block is part of the outline
+            top_cols = np.nonzero(valid[block[0], :])[0][1::frequency]
+            polygon_right = [(int(block[0]), col)
+                             for col in top_cols.tolist()]
+            polygon_right += side(sampled[1:], last_cols)
+
+        last_line = block[-1:]
+        if num < len(blocks) - 1:
+            if count % frequency != 0:
+                polygon_right += side(last_line, last_cols)
+                polygon_left += side(last_line, first_cols)
+            # the bottom of the block is part of the outline
+            bottom_cols = np.nonzero(valid[block[-1], :])[0][1:-1:frequency]
+            polygon_left += [(int(block[-1]), col)
+                             for col in bottom_cols.tolist()]
+        elif (count - 1) % frequency != 0:
+            polygon_left += side(last_line, first_cols)
+            polygon_right += side(last_line, last_cols)
+
+        polygon_left.reverse()
+        polygons.append(polygon_left + polygon_right)
 
     return polygons
 
@@ -314,30 +356,23 @@ def get_polygons(datas, area, frequency=1):
 
     llpolygons = []
     for poly in polygons:
-        lons = []
-        lats = []
-        for line, col in poly:
-            lon, lat = area.get_lonlat(line, col)
-            lons.append(lon)
-            lats.append(lat)
-        lons = np.array(lons)
-        lats = np.array(lats)
+        lines, cols = zip(*poly)
+        lons, lats = helper_functions.get_lonlats_at(area, lines, cols)
         llpolygons.append(Boundary(lons, lats))
 
     return llpolygons
 
 
-def coverage(scene, area):
-    """Calculate coverages.
+def get_swath_polys(scene):
+    """Get the contour polygons of the valid data of *scene*, one list of
+    polygons per shape of the loaded channels.
     """
     shapes = set()
     for channel in scene.channels:
         if channel.is_loaded():
             shapes.add(channel.shape)
 
-    coverages = []
-
-    # from trollsched.satpass import Mapper
+    swath_polys = []
 
     for shape in shapes:
 
@@ -348,12 +383,18 @@ def coverage(scene, area):
                 datas.append(channel.data)
                 areas.append(channel.area)
 
-        disk_polys = [poly.contour_poly
-                      for poly
-                      in get_polygons(datas, areas[0], frequency=100)]
+        swath_polys.append([poly.contour_poly
+                            for poly
+                            in get_polygons(datas, areas[0], frequency=100)])
+    return swath_polys
 
-        area_poly = AreaDefBoundary(area, frequency=100).contour_poly
 
+def get_coverage(swath_polys, area_poly):
+    """Get the fraction of *area_poly* covered by the polygons of
+    *swath_polys*, the smallest one over all the shapes.
+    """
+    coverages = []
+    for disk_polys in swath_polys:
         inter_area = 0
 
         for poly in disk_polys:
@@ -368,14 +409,21 @@ def coverage(scene, area):
         return coverages[0]
 
 
+def coverage(scene, area):
+    """Calculate coverages.
+    """
+    area_poly = area_geometry.get_contour_poly(area, frequency=100)
+    return get_coverage(get_swath_polys(scene), area_poly)
+
+
 def generic_covers(scene, area_item):
     """Check if scene covers area_item with high enough percentage.
     """
-    area_def = get_area_def(area_item.attrib['id'])
     min_coverage = float(area_item.attrib.get('min_coverage', 0))
     if min_coverage == 0:
         return True
     min_coverage /= 100.0
+    area_def = area_geometry.get_area_def(area_item.attrib['id'])
     cov = coverage(scene, area_def)
     if cov <= min_coverage:
         LOGGER.info("Coverage too small %.1f%% (out of %.1f%%) with %s",
@@ -388,19 +436,222 @@ def generic_covers(scene, area_item):
         return True
 
 
+class CoverageEngine(object):
+
+    """Coverage of the areas by the scenes. The outline of the swath is
+    computed only once per scene, and the coverages are memoized per scene
+    and area.
+
+    The overpass of the scene is used if it has one, otherwise (*generic*)
+    the outline of the valid data of the loaded channels.
+    """
+
+    def __init__(self):
+        self._scene_key = None
+        self._swath_polys = {}
+        self._coverages = {}
+
+    @staticmethod
+    def get_scene_key(scene):
+        """Get the key identifying *scene*.
+        """
+        return (id(scene), getattr(scene, "time_slot", None))
+
+    def _set_scene(self, scene):
+        """Forget the results of the previous scene if *scene* is a new
+        one.
+        """
+        key = self.get_scene_key(scene)
+        if key != self._scene_key:
+            self._scene_key = key
+            self._swath_polys = {}
+            self._coverages = {}
+        return key
+
+    def _get_swath_polys(self, scene, generic):
+        """Get the key and the contour polygons of the swath of *scene*.
+        """
+        if not generic:
+            key = "overpass"
+            if key not in self._swath_polys:
+                self._swath_polys[key] = \
+                    [[scene.overpass.boundary.contour_poly]]
+        else:
+            key = frozenset((chn.name, chn.shape)
+                            for chn in scene.channels if chn.is_loaded())
+            if key not in self._swath_polys:
+                self._swath_polys[key] = get_swath_polys(scene)
+        return key, self._swath_polys[key]
+
+    def get_coverages(self, scene, area_items, generic=False):
+        """Get the coverages of the areas of *area_items* by *scene*, as a
+        dictionary of fractions keyed by area id. Coverages that can't be
+        computed are None.
+        """
+        scene_key = self._set_scene(scene)
+        try:
+            swath_key, swath_polys = self._get_swath_polys(scene, generic)
+        except AttributeError:
+            LOGGER.warning("Can't compute the outline of the swath!")
+            swath_key, swath_polys = None, None
+        res = {}
+        computed = []
+        for area_item in area_items:
+            area_id = area_item.attrib['id']
+            key = (scene_key, area_id, swath_key)
+            if key not in self._coverages:
+                self._coverages[key] = None
+                # same resolutions of the outlines as trollsched and
+                # generic_covers
+                frequency = 100 if generic else 500
+                try:
+                    area_poly = area_geometry.get_contour_poly(area_id,
+                                                               frequency)
+                    if swath_polys is not None:
+                        self._coverages[key] = get_coverage(swath_polys,
+                                                            area_poly)
+                        computed.append((area_item.attrib['name'],
+                                         self._coverages[key]))
+                except AttributeError:
+                    LOGGER.warning("Can't compute area coverage with %s!",
+                                   area_item.attrib['name'])
+            res[area_id] = self._coverages[key]
+        if computed:
+            LOGGER.info("Coverages: %s",
+                         ", ".join("%s %.1f%%" % (name, cov * 100)
+                                   for name, cov in computed))
+        return res
+
+    def covers(self, scene, area_item, generic=False):
+        """Check if *scene* covers *area_item* with high enough
+        percentage.
+        """
+        min_coverage = float(area_item.attrib.get('min_coverage', 0))
+        if min_coverage == 0:
+            return True
+        if not generic and scene.overpass is None:
+            return True
+        min_coverage /= 100.0
+        cov = self.get_coverages(scene, [area_item],
+                                 generic)[area_item.attrib['id']]
+        if cov is None:
+            return True
+        if cov <= min_coverage:
+            LOGGER.info("Coverage too small %.1f%% (out of %.1f%%) with %s",
+                        cov * 100, min_coverage * 100,
+                        area_item.attrib['name'])
+            return False
+        else:
+            LOGGER.info("Coverage %.1f%% with %s",
+                        cov * 100, area_item.attrib['name'])
+            return True
+
+
+def has_sunzen_limits(product):
+    """Check if *product* is restricted by Sun zenith angle limits.
+    """
+    return ('sunzen_night_minimum' in product.attrib or
+            'sunzen_day_maximum' in product.attrib)
+
+
+def get_sunzen_location(product):
+    """Get the pixel (x, y) location and the (lon, lat) location where the
+    Sun zenith angle limits of *product* are checked.
+    """
+    if 'sunzen_xy_loc' in product.attrib:
+        xy_loc = [int(x) for x in
+                  product.attrib['sunzen_xy_loc'].split(',')]
+        lonlat = None
+    else:
+        xy_loc = None
+        if 'sunzen_lonlat' in product.attrib:
+            lonlat = [float(x) for x in
+                      product.attrib['sunzen_lonlat'].split(',')]
+        else:
+            lonlat = None
+    return xy_loc, lonlat
+
+
+def crop_scene(scene, area_defs, radius=None):
+    """Get a copy of *scene* where the loaded swath channels are cropped to
+    the pixels that can be used when projecting to *area_defs*. Return
+    None if no pixel can be used, and *scene* itself if the channels can't
+    be cropped.
+    """
+    channels = [chn for chn in scene.channels if chn.is_loaded()]
+    areas = {}
+    for chn in channels:
+        lons = getattr(chn.area, "lons", None)
+        lats = getattr(chn.area, "lats", None)
+        if (lons is None or lats is None or np.ndim(lons) != 2 or
+                np.shape(lons) != chn.shape):
+            LOGGER.debug("Can't crop channel %s, keeping the full swath",
+                         chn.name)
+            return scene
+        if radius is None:
+            chn_radius = 5 * chn.resolution if chn.resolution > 0 else 10000
+        else:
+            chn_radius = radius
+        areas.setdefault(id(chn.area), [chn.area, 0])
+        areas[id(chn.area)][1] = max(areas[id(chn.area)][1], chn_radius)
+
+    cropped_areas = {}
+    for key, (area, chn_radius) in areas.items():
+        window = helper_functions.get_swath_window(area_defs,
+                                                   np.asanyarray(area.lons),
+                                                   np.asanyarray(area.lats),
+                                                   chn_radius)
+        if window is not None:
+            cropped_areas[key] = (window,
+                                  SwathDefinition(area.lons[window],
+                                                  area.lats[window]))
+    if not cropped_areas:
+        return None
+
+    res = copy.copy(scene)
+    res.channels = []
+    for chn in scene.channels:
+        if not chn.is_loaded():
+            res.channels.append(chn)
+            continue
+        try:
+            window, cropped_area = cropped_areas[id(chn.area)]
+        except KeyError:
+            # no useful data in this channel
+            continue
+        cropped = copy.copy(chn)
+        cropped.data = chn.data[window]
+        cropped.area = cropped_area
+        res.channels.append(cropped)
+        LOGGER.debug("Cropped channel %s from %s to %s", chn.name,
+                     str(chn.shape), str(cropped.shape))
+    return res
+
+
 class DataProcessor(object):
 
     """Process the data.
     """
 
-    def __init__(self, publish_topic=None, port=0):
+    def __init__(self, publish_topic=None, port=0, writer=None):
         self.global_data = None
         self.local_data = None
         self.product_config = None
         self._publish_topic = publish_topic
         self._data_ok = True
-        self.writer = DataWriter(publish_topic=self._publish_topic, port=port)
-        self.writer.start()
+        self._resample_cache = None
+        self._grid_cache = None
+        self._job = None
+        self._times_lock = Lock()
+        self._product_times = []
+        self._cancelled = 0
+        self.coverage_engine = CoverageEngine()
+        if writer is None:
+            writer = DataWriter(publish_topic=self._publish_topic, port=port)
+        self.writer = writer
+        # the writer may be shared with other data processors
+        if not self.writer.is_alive():
+            self.writer.start()
 
     def set_publish_topic(self, publish_topic):
         '''Set published topic.'''
@@ -482,7 +733,7 @@ class DataProcessor(object):
                 "Saved as netcdf4/cf by pytroll/mpop.")
             cfscene = CFScene(data)
 
-            self.writer.write(cfscene, item, params)
+            self.writer.write(cfscene, item, params, job=id(self))
             LOGGER.info("Sent netcdf/cf scene to writer.")
         except IOError:
             LOGGER.error("Saving unprojected data to NetCDF failed!")
@@ -496,28 +747,33 @@ class DataProcessor(object):
     def run(self, product_config, msg):
         """Process the data
         """
+        if not self.prepare(product_config, msg):
+            return
+        self.project()
+        self.finish()
+
+    def prepare(self, product_config, msg):
+        """Read the data announced in *msg*, select the areas to process
+        and load the channels of the first product group. Returns False if
+        there is nothing to process.
+        """
 
+        TIMINGS.record_start(msg)
         self.product_config = product_config
+        with self._times_lock:
+            self._product_times = []
+            self._cancelled = 0
 
-        if msg.type == "file":
-            uri = msg.data['uri']
-        elif msg.type == "dataset":
-            uri = [mda['uri'] for mda in msg.data['dataset']]
-        elif msg.type == 'collection':
+        if msg.type == 'collection':
             all_areas = self.get_area_def_names()
             if not msg.data['collection_area_id'] in all_areas:
                 LOGGER.info('Collection does not contain data for '
                             'current areas. Skipping.')
-                return
-            if 'dataset' in msg.data['collection'][0]:
-                uri = []
-                for dataset in msg.data['collection']:
-                    uri.extend([mda['uri'] for mda in dataset['dataset']])
-            else:
-                uri = [mda['uri'] for mda in msg.data['collection']]
-        else:
+                return False
+        uri = get_message_uris(msg)
+        if uri is None:
             LOGGER.warning("Can't run on %s messages", msg.type)
-            return
+            return False
         # TODO collections and collections of datasets
 
         LOGGER.info('New data available: %s', uri)
@@ -529,7 +785,7 @@ class DataProcessor(object):
         except IOError as err:
             LOGGER.info(str(err))
             LOGGER.info("Skipping...")
-            return
+            return False
 
         self.global_data = self.create_scene_from_message(msg)
         self._data_ok = True
@@ -547,6 +803,18 @@ class DataProcessor(object):
             self.product_config.attrib.get("use_extern_calib", "").lower() in \
             ["true", "yes", "1"]
         keywords = {"use_extern_calib": use_extern_calib}
+        area_workers = int(self.product_config.attrib.get("area_workers", 1))
+        # crop the swath to each area, or to each group, before projecting
+        crop_swath = self.product_config.attrib.get("crop_swath", "").lower()
+        if crop_swath in ["true", "yes", "1"]:
+            crop_swath = "area"
+        max_areas_in_flight = \
+            int(self.product_config.attrib.get("max_areas_in_flight",
+                                               area_workers))
+        if area_workers > 1:
+            LOGGER.info("Processing up to %d areas in parallel with %d "
+                        "workers.", max_areas_in_flight, area_workers)
+        resample_cache = self.get_resample_cache()
 
         for area_item in self.product_config.prodlist:
             if area_item.tag == "dump":
@@ -558,6 +826,17 @@ class DataProcessor(object):
                 except (IndexError, IOError, DecodeError, StructError):
                     LOGGER.exception("Incomplete or corrupted input data.")
 
+        # compute the coverage of all the areas at once
+        coverage_start = time.time()
+        if getattr(self.global_data, "overpass", None) is not None:
+            self.coverage_engine.get_coverages(
+                self.global_data,
+                [area_item for group in self.product_config.groups
+                 for area_item in group.data
+                 if float(area_item.attrib.get('min_coverage', 0)) != 0])
+
+        # Select the areas to process in each group
+        selected = []
         for group in self.product_config.groups:
             LOGGER.debug("processing %s", group.info['id'])
             area_def_names = self.get_area_def_names(group.data)
@@ -574,80 +853,177 @@ class DataProcessor(object):
 
             for area_item in group.data:
                 try:
-                    if not covers(self.global_data.overpass, area_item):
+                    if not self.coverage_engine.covers(self.global_data,
+                                                       area_item):
                         skip.append(area_item)
                         continue
-                    else:
-                        skip_group = False
                 except AttributeError:
                     LOGGER.exception("Can't compute coverage from "
                                      "unloaded data, continuing")
                     do_generic_coverage = True
-                    skip_group = False
+                # Don't load nor project data for areas where every
+                # product would be skipped anyway
+                if not self.plan_area(area_item):
+                    skip.append(area_item)
+                    continue
+                skip_group = False
                 for product in area_item:
                     products.append(product)
             if not products or skip_group:
                 continue
 
-            if group.get("unload", "").lower() in ["yes", "true", "1"]:
-                loaded_channels = [chn.name for chn
-                                   in self.global_data.loaded_channels()]
-                self.global_data.unload(*loaded_channels)
-                LOGGER.debug("unloading all channels before group %s",
-                             group.id)
-            try:
-                req_channels = self.get_req_channels(products)
-                LOGGER.debug("loading channels: %s", str(req_channels))
-                keywords = {"filename": filename,
-                            "area_def_names": area_def_names,
-                            "use_extern_calib": use_extern_calib}
-                try:
-                    keywords["time_interval"] = (msg.data["start_time"],
-                                                 msg.data["end_time"])
-                except KeyError:
-                    pass
-                if "resolution" in group.info:
-                    keywords["resolution"] = int(group.resolution)
+            selected.append((group, area_def_names, skip,
+                             do_generic_coverage,
+                             self.get_req_channels(products)))
+
+        TIMINGS.record("coverage", time.time() - coverage_start)
+
+        # Plan when to unload the channels, and the order of the groups
+        # if allowed
+        plan_loads = \
+            self.product_config.attrib.get("plan_channel_loads",
+                                           "true").lower() in \
+            ["true", "yes", "1"]
+        reorder = \
+            self.product_config.attrib.get("reorder_groups",
+                                           "false").lower() in \
+            ["true", "yes", "1"]
+        plan = ChannelLoadPlan(
+            [(i, self.get_channel_names(req_channels),
+              group.get("unload", "").lower() in ["yes", "true", "1"])
+             for i, (group, _, _, _, req_channels) in enumerate(selected)],
+            planned=plan_loads, reorder=reorder)
+        if plan.planned:
+            LOGGER.debug("Group order: %s",
+                         ", ".join(selected[key][0].info['id']
+                                   for key, _, _ in plan.steps))
+            unneeded = [chn.name for chn
+                        in self.global_data.loaded_channels()
+                        if chn.name not in plan.channels]
+            if unneeded:
+                LOGGER.debug("unloading unneeded channels %s",
+                             str(unneeded))
+                self.global_data.unload(*unneeded)
+
+        self._job = {"msg": msg,
+                     "uri": uri,
+                     "filename": filename,
+                     "start": t1a,
+                     "use_extern_calib": use_extern_calib,
+                     "crop_swath": crop_swath,
+                     "area_workers": area_workers,
+                     "max_areas_in_flight": max_areas_in_flight,
+                     "resample_cache": resample_cache,
+                     "kwargs": {"mode": proj_method,
+                                "nprocs": nprocs,
+                                "precompute": precompute,
+                                "resample_cache": resample_cache},
+                     "selected": selected,
+                     "plan": plan,
+                     "loaded": 0,
+                     "sizes": {},
+                     "actual_peak": 0}
+
+        if plan.steps:
+            self.load_group(plan.steps[0][0])
+        return True
 
+    def load_group(self, key):
+        """Load the channels needed by the selected group *key*.
+        """
+        job = self._job
+        msg = job["msg"]
+        group, area_def_names, _, _, req_channels = job["selected"][key]
+        job["loaded"] += 1
+
+        if group.get("unload", "").lower() in ["yes", "true", "1"]:
+            loaded_channels = [chn.name for chn
+                               in self.global_data.loaded_channels()]
+            self.global_data.unload(*loaded_channels)
+            LOGGER.debug("unloading all channels before group %s",
+                         group.id)
+        try:
+            LOGGER.debug("loading channels: %s", str(req_channels))
+            keywords = {"filename": job["filename"],
+                        "area_def_names": area_def_names,
+                        "use_extern_calib": job["use_extern_calib"]}
+            try:
+                keywords["time_interval"] = (msg.data["start_time"],
+                                             msg.data["end_time"])
+            except KeyError:
+                pass
+            if "resolution" in group.info:
+                keywords["resolution"] = int(group.resolution)
+
+            with TIMINGS.timer("load"):
                 self.global_data.load(req_channels, **keywords)
-                LOGGER.debug("loaded data: %s", str(self.global_data))
-            except (IndexError, IOError, DecodeError, StructError):
-                LOGGER.exception("Incomplete or corrupted input data.")
-                self._data_ok = False
+            LOGGER.debug("loaded data: %s", str(self.global_data))
+        except (IndexError, IOError, DecodeError, StructError):
+            LOGGER.exception("Incomplete or corrupted input data.")
+            self._data_ok = False
+            return
+
+        loaded_sizes = get_channels_size(self.global_data)
+        job["sizes"].update(loaded_sizes)
+        job["actual_peak"] = max(job["actual_peak"],
+                                 sum(loaded_sizes.values()))
+
+    def project(self):
+        """Project the data of the prepared message to the selected areas
+        and send the images to the writer, loading the channels of each
+        group in turn.
+        """
+        job = self._job
+        crop_swath = job["crop_swath"]
+        area_workers = job["area_workers"]
+
+        for num, (key, _, unload_after) in enumerate(job["plan"].steps):
+            if not self._data_ok:
                 break
+            if num >= job["loaded"]:
+                self.load_group(key)
+                if not self._data_ok:
+                    break
+            group, _, skip, do_generic_coverage, _ = job["selected"][key]
 
+            areas = []
             for area_item in group.data:
                 if area_item in skip:
                     continue
                 elif (do_generic_coverage and
-                      not generic_covers(self.global_data, area_item)):
+                      not self.coverage_engine.covers(self.global_data,
+                                                      area_item,
+                                                      generic=True)):
                     continue
+                areas.append(area_item)
 
-                # reproject to local domain
-                LOGGER.debug("Projecting data to area %s",
-                             area_item.attrib['name'])
+            scene = None
+            if crop_swath == "group" and areas:
                 try:
-                    self.local_data = \
-                        self.global_data.project(
-                            area_item.attrib["id"],
-                            channels=self.get_req_channels(area_item),
-                            mode=proj_method, nprocs=nprocs,
-                            precompute=precompute)
-                except ValueError:
-                    LOGGER.warning("No data in this area")
-                    continue
-                except AreaNotFound:
-                    LOGGER.warning("Area %s not defined, skipping!",
-                                   area_item.attrib['id'])
-                    continue
-
-                LOGGER.info('Data reprojected for area: %s',
-                            area_item.attrib['name'])
-
-                # Draw requested images for this area.
-                self.draw_images(area_item)
-                del self.local_data
-                self.local_data = None
+                    scene = crop_scene(self.global_data,
+                                       [area_geometry.get_area_def(
+                                           area_item.attrib['id'])
+                                        for area_item in areas])
+                except AreaNotFound as err:
+                    LOGGER.warning("Can't crop the data to group %s: %s",
+                                   group.info['id'], str(err))
+                    scene = self.global_data
+                if scene is None:
+                    LOGGER.info("No data in the areas of group %s",
+                                group.info['id'])
+                    areas = []
+
+            kwargs = dict(job["kwargs"])
+            kwargs["crop"] = crop_swath == "area"
+            kwargs["scene"] = scene
+            if area_workers > 1 and len(areas) > 1:
+                self.process_areas_in_parallel(areas, area_workers,
+                                               job["max_areas_in_flight"],
+                                               **kwargs)
+            else:
+                for area_item in areas:
+                    self.process_area(area_item, **kwargs)
+            del scene, kwargs
 
             if group.get("unload", "").lower() in ["yes", "true", "1"]:
                 loaded_channels = [chn.name for chn
@@ -655,25 +1031,140 @@ class DataProcessor(object):
                 self.global_data.unload(*loaded_channels)
                 LOGGER.debug("unloading all channels after group %s",
                              group.id)
+            elif unload_after:
+                loaded_channels = [chn.name for chn
+                                   in self.global_data.loaded_channels()
+                                   if chn.name in unload_after]
+                if loaded_channels:
+                    self.global_data.unload(*loaded_channels)
+                    LOGGER.debug("unloading channels %s, not needed after "
+                                 "group %s", str(loaded_channels), group.id)
+
+        job["plan"].log_peak(job["sizes"], job["actual_peak"])
+        # the images hold what is needed from now on
+        self.release_memory()
+
+    def finish(self):
+        """Wait for the images of the message to be saved. Raises IOError
+        if the data was incomplete.
+        """
+        job = self._job
+        self._job = None
 
         # Wait for the writer to finish
         if self._data_ok:
             LOGGER.debug("Waiting for the files to be saved")
-        self.writer.prod_queue.join()
+        self.writer.wait(id(self))
+        self.writer.log_stats()
+        self.log_product_times()
 
-        self.release_memory()
+        if job["resample_cache"] is not None:
+            job["resample_cache"].log_stats()
 
         if self._data_ok:
             LOGGER.debug("All files saved")
-            LOGGER.info("File %s processed in %.1f s", uri,
-                        time.time() - t1a)
+            LOGGER.info("File %s processed in %.1f s", job["uri"],
+                        time.time() - job["start"])
 
         if not self._data_ok:
             LOGGER.warning("File %s not processed due to "
                            "incomplete/missing/corrupted data.",
-                           uri)
+                           job["uri"])
             raise IOError
 
+    def get_resample_cache(self):
+        """Get the resampling cache configured in the product list, or
+        None if it isn't used.
+        """
+        cache_dir = self.product_config.attrib.get("resample_cache_dir")
+        if not cache_dir:
+            return None
+        max_size = self.product_config.attrib.get("resample_cache_size")
+        if max_size is not None:
+            # given in megabytes
+            max_size = int(float(max_size) * 1024 ** 2)
+        if (self._resample_cache is None or
+                self._resample_cache.cache_dir != cache_dir or
+                self._resample_cache.max_size != max_size):
+            LOGGER.debug("Using resampling cache in %s", cache_dir)
+            self._resample_cache = ResampleCache(cache_dir, max_size)
+        return self._resample_cache
+
+    def process_area(self, area_item, mode=None, nprocs=1, precompute=False,
+                     resample_cache=None, crop=False, scene=None):
+        """Project the global data, or *scene* if given, to *area_item*
+        and draw its images. If *resample_cache* is given, the resampling
+        tables are taken from it instead of being recomputed. If *crop* is
+        True, the swath is cropped to the area before projecting.
+        """
+        if scene is None:
+            scene = self.global_data
+        # reproject to local domain
+        LOGGER.debug("Projecting data to area %s",
+                     area_item.attrib['name'])
+        channels = self.get_req_channels(area_item)
+        project_start = time.time()
+        try:
+            if crop:
+                area_def = area_geometry.get_area_def(area_item.attrib["id"])
+                scene = crop_scene(scene, [area_def])
+                if scene is None:
+                    raise ValueError("No data in the area")
+            if resample_cache is None:
+                local_data = scene.project(area_item.attrib["id"],
+                                           channels=channels,
+                                           mode=mode, nprocs=nprocs,
+                                           precompute=precompute)
+            else:
+                local_data = project_scene(scene,
+                                           area_item.attrib["id"],
+                                           resample_cache,
+                                           channels=channels,
+                                           mode=mode, nprocs=nprocs)
+        except ValueError:
+            LOGGER.warning("No data in this area")
+            return
+        except AreaNotFound:
+            LOGGER.warning("Area %s not defined, skipping!",
+                           area_item.attrib['id'])
+            return
+
+        TIMINGS.record("project", time.time() - project_start,
+                       area_item.attrib['name'])
+        LOGGER.info('Data reprojected for area: %s',
+                    area_item.attrib['name'])
+
+        # Draw requested images for this area.
+        self.draw_images(area_item, local_data)
+        del local_data
+
+    def process_areas_in_parallel(self, areas, workers, max_in_flight,
+                                  **kwargs):
+        """Process *areas* from the already loaded global data using a
+        pool of *workers* threads. At most *max_in_flight* areas are
+        projected and held in memory at the same time.
+        """
+        in_flight = BoundedSemaphore(max_in_flight)
+
+        def process(area_item):
+            """Process one area and free its slot."""
+            try:
+                self.process_area(area_item, **kwargs)
+            except Exception:
+                LOGGER.exception("Processing area %s failed",
+                                 area_item.attrib['name'])
+            finally:
+                in_flight.release()
+
+        pool = ThreadPool(workers)
+        try:
+            for area_item in areas:
+                in_flight.acquire()
+                pool.apply_async(process, (area_item, ))
+        finally:
+            pool.close()
+            pool.join()
+
     def release_memory(self):
         """Run garbage collection for diagnostics"""
         if mem_top is not None:
@@ -707,6 +1198,20 @@ class DataProcessor(object):
                             product.attrib['id'])
         return reqs
 
+    def get_channel_names(self, channels):
+        """Get the names of the scene channels matching *channels*, given
+        as names or wavelengths. None stands for all the channels.
+        """
+        if channels is None:
+            return None
+        names = set()
+        for chn in channels:
+            try:
+                names.add(self.global_data[chn].name)
+            except (KeyError, TypeError):
+                names.add(chn)
+        return names
+
     def get_area_def_names(self, group=None):
         '''Collect and return area definition names from product
         config to a list.
@@ -727,7 +1232,7 @@ class DataProcessor(object):
 
         # Check the list of valid satellites
         if 'valid_satellite' in config.keys():
-            if self.global_data.info['platform_name'] not in +\
+            if self.global_data.info['platform_name'] not in \
                     config.attrib['valid_satellite']:
 
                 info = 'Satellite %s not in list of valid ' \
@@ -753,6 +1258,86 @@ class DataProcessor(object):
 
         return True
 
+    def get_grid_cache(self):
+        """Get the cache of the area lon/lat grids, stored in the
+        directory configured in the product list if any.
+        """
+        cache_dir = None
+        if self.product_config is not None:
+            cache_dir = self.product_config.attrib.get("grid_cache_dir")
+        if (self._grid_cache is None or
+                self._grid_cache.cache_dir != cache_dir):
+            self._grid_cache = AreaGridCache(cache_dir)
+        return self._grid_cache
+
+    def get_sunzen_pixel(self, area_def, xy_loc=None, lonlat=None):
+        '''Get the (x, y) pixel of *area_def* where the Sun zenith angle is
+        checked: *xy_loc*, else the pixel closest to *lonlat*, else the
+        center of the area.
+        '''
+        if xy_loc is not None and len(xy_loc) == 2:
+            # Use the given xy-location
+            return tuple(xy_loc)
+        elif lonlat is not None and len(lonlat) == 2:
+            # Find the closest pixel to the given coordinates
+            y_idx, x_idx = self.get_grid_cache().get_nearest_pixel(area_def,
+                                                                   *lonlat)
+            return x_idx, y_idx
+        else:
+            # Use image center
+            return int(area_def.x_size / 2), int(area_def.y_size / 2)
+
+    def check_sunzen_before_projection(self, config, area_def, xy_loc=None,
+                                       lonlat=None):
+        '''Check the Sun zenith angle limits of a product in *area_def*
+        from the scene time alone, without the projected data.
+        '''
+        try:
+            return self.check_sunzen(config, area_def=area_def,
+                                     xy_loc=xy_loc, lonlat=lonlat,
+                                     data=self.global_data)
+        except (AttributeError, IndexError, ValueError):
+            LOGGER.debug("Can't check the Sun zenith angle before "
+                         "projection", exc_info=True)
+            return True
+
+    def plan_area(self, area_item):
+        '''Check the satellite and Sun zenith angle restrictions of the
+        products of *area_item* before projecting any data. Return False,
+        and log why, if every product would be skipped.
+        '''
+        area_def = None
+        reasons = []
+        for product in area_item:
+            if product.tag != "product":
+                return True
+            if not self.check_satellite(product):
+                reasons.append("%s: satellite %s not valid" %
+                               (product.attrib['name'],
+                                self.global_data.info['platform_name']))
+                continue
+            if has_sunzen_limits(product):
+                if area_def is None:
+                    try:
+                        area_def = area_geometry.get_area_def(
+                            area_item.attrib['id'])
+                    except AreaNotFound:
+                        return True
+                xy_loc, lonlat = get_sunzen_location(product)
+                if not self.check_sunzen_before_projection(product.attrib,
+                                                           area_def,
+                                                           xy_loc=xy_loc,
+                                                           lonlat=lonlat):
+                    reasons.append("%s: out of Sun zenith angle limits" %
+                                   product.attrib['name'])
+                    continue
+            return True
+
+        LOGGER.info("Skipping area %s before projection: %s",
+                    area_item.attrib['name'],
+                    "; ".join(reasons) or "no products")
+        return False
+
     def get_parameters(self, item):
         """Get the parameters for filename sifting.
         """
@@ -768,83 +1353,179 @@ class DataProcessor(object):
 
         return params
 
-    def draw_images(self, area):
-        '''Generate images from local data using given area name and
-        product definitions.
+    def draw_images(self, area, local_data=None):
+        '''Generate images from *local_data* (defaults to the current
+        local data) using given area name and product definitions.
+
+        The products exceeding their time budget before their composite is
+        started, and the products left when the area exceeds its time
+        budget, are cancelled. The finished composites are always saved.
         '''
+        if local_data is None:
+            local_data = self.local_data
 
         params = self.get_parameters(area)
-        # Create images for each color composite
-        for product in area:
-            params.update(self.get_parameters(product))
-            if product.tag == "dump":
+        area_budget = TimeBudget(
+            area.attrib['name'],
+            self.get_time_budget(area, "area_time_budget"))
+        # Compute the intermediates shared by the composites only once
+        intermediates = SharedIntermediates(local_data,
+                                            self.get_grid_cache())
+        try:
+            for product, needed, free_after in plan_products(
+                    list(area),
+                    partial(self._get_composite_func, local_data)):
+                if product.tag != "product":
+                    self._draw_image(area, product, params, local_data,
+                                     intermediates, needed)
+                    intermediates.free(free_after)
+                    continue
+                budget = TimeBudget(
+                    product.attrib['id'],
+                    self.get_time_budget(product, "product_time_budget"))
                 try:
-                    self.save_to_netcdf(self.local_data,
-                                        product,
-                                        params)
-                except IOError:
-                    LOGGER.error("Saving projected data to NetCDF failed!")
-                continue
-            elif product.tag != "product":
-                continue
-            # TODO
-            # Check if satellite is one that should be processed
-            if not self.check_satellite(product):
-                # Skip this product, if the return value is True
-                continue
-
-            # Check if Sun zenith angle limits match this product
-            if 'sunzen_night_minimum' in product.attrib or \
-                    'sunzen_day_maximum' in product.attrib:
-                if 'sunzen_xy_loc' in product.attrib:
-                    xy_loc = [int(x) for x in
-                              product.attrib['sunzen_xy_loc'].split(',')]
-                    lonlat = None
+                    area_budget.check()
+                    self._draw_image(area, product, params, local_data,
+                                     intermediates, needed, budget)
+                except TimeBudgetExceeded as err:
+                    LOGGER.warning("Product %s for area %s cancelled: %s",
+                                   product.attrib['id'],
+                                   area.attrib['name'], str(err))
+                    with self._times_lock:
+                        self._cancelled += 1
                 else:
-                    xy_loc = None
-                    if 'sunzen_lonlat' in product.attrib:
-                        lonlat = [float(x) for x in
-                                  product.attrib['sunzen_lonlat'].split(',')]
-                    else:
-                        lonlat = None
-                if not self.check_sunzen(product.attrib,
-                                         area_def=get_area_def(
-                                             area.attrib['id']),
-                                         xy_loc=xy_loc, lonlat=lonlat):
-                    # If the return value is False, skip this product
-                    continue
-
-            try:
-                # Check if this combination is defined
-                func = getattr(self.local_data.image, product.attrib['id'])
-                LOGGER.debug("Generating composite \"%s\"",
-                             product.attrib['id'])
-                img = func()
-                img.info.update(self.global_data.info)
-                img.info["product_name"] = \
-                    product.attrib.get("name", product.attrib["id"])
-            except AttributeError as err:
-                # Log incorrect product funcion name
-                LOGGER.error('Incorrect product id: %s for area %s (%s)',
-                             product.attrib['id'], area.attrib['name'], str(err))
-            except KeyError as err:
-                # log missing channel
-                LOGGER.warning('Missing channel on product %s for area %s: %s',
-                               product.attrib['name'], area.attrib['name'],
-                               str(err))
-            except Exception:
-                # log other errors
-                LOGGER.exception('Error on product %s for area %s',
-                                 product.attrib['name'],
-                                 area.attrib['name'])
-            else:
-                self.writer.write(img, product, params)
+                    if budget.exceeded():
+                        LOGGER.warning("Product %s for area %s exceeded its "
+                                       "time budget of %.1f s (%.1f s)",
+                                       product.attrib['id'],
+                                       area.attrib['name'], budget.seconds,
+                                       budget.elapsed())
+                intermediates.free(free_after)
+                with self._times_lock:
+                    self._product_times.append((budget.elapsed(),
+                                                area.attrib['name'],
+                                                product.attrib['id']))
+        finally:
+            intermediates.free_all()
 
         # log and publish completion of this area def
         LOGGER.info('Area %s completed', area.attrib['name'])
 
+    def get_time_budget(self, item, option):
+        """Get the time budget in seconds of *item*, given by its
+        time_budget attribute or by the product list *option*. 0 means no
+        limit.
+        """
+        return float(item.attrib.get(
+            "time_budget", self.product_config.attrib.get(option, 0)))
+
+    def log_product_times(self, num=5):
+        """Log the *num* slowest products of the scene, and the number of
+        cancelled products.
+        """
+        with self._times_lock:
+            slowest = sorted(self._product_times, reverse=True)[:num]
+            cancelled = self._cancelled
+            self._product_times = []
+            self._cancelled = 0
+        if slowest:
+            LOGGER.info("Slowest products: %s",
+                        ", ".join("%s/%s %.1f s" % (area_name, product_id,
+                                                     elapsed)
+                                  for elapsed, area_name, product_id
+                                  in slowest))
+        if cancelled:
+            LOGGER.warning("%d products cancelled for exceeding their time "
+                           "budget", cancelled)
+
+    @staticmethod
+    def _get_composite_func(local_data, product):
+        """Get the composite function of *product*, None if it isn't a
+        composite.
+        """
+        if product.tag != "product":
+            return None
+        return getattr(local_data.image, product.attrib['id'], None)
+
+    def _draw_image(self, area, product, params, local_data, intermediates,
+                    needed, budget=None):
+        """Generate the image of *product* for *area* and send it to the
+        writer, providing the *needed* *intermediates* first. Raises
+        TimeBudgetExceeded if the product exceeds its time *budget* before
+        the composite is started.
+        """
+        if budget is None:
+            budget = TimeBudget(product.attrib.get('id'))
+        params.update(self.get_parameters(product))
+        if product.tag == "dump":
+            try:
+                self.save_to_netcdf(local_data,
+                                    product,
+                                    params)
+            except IOError:
+                LOGGER.error("Saving projected data to NetCDF failed!")
+            return
+        elif product.tag != "product":
+            return
+        if (self.product_config.attrib.get("skip_complete_products",
+                                           "").lower() in
+                ["true", "yes", "1"] and
+                self.writer.is_complete(product, params)):
+            LOGGER.info("Product %s for area %s already complete, skipping",
+                        product.attrib['id'], area.attrib['name'])
+            return
+        # TODO
+        # Check if satellite is one that should be processed
+        if not self.check_satellite(product):
+            # Skip this product, if the return value is True
+            return
+
+        # Check if Sun zenith angle limits match this product
+        if has_sunzen_limits(product):
+            xy_loc, lonlat = get_sunzen_location(product)
+            area_def = area_geometry.get_area_def(area.attrib['id'])
+            if not self.check_sunzen(product.attrib,
+                                     area_def=area_def,
+                                     xy_loc=xy_loc, lonlat=lonlat,
+                                     data=local_data):
+                # If the return value is False, skip this product
+                return
+
+        try:
+            # Check if this combination is defined
+            func = getattr(local_data.image, product.attrib['id'])
+            budget.check()
+            intermediates.provide(needed)
+            budget.check()
+            LOGGER.debug("Generating composite \"%s\"",
+                         product.attrib['id'])
+            with TIMINGS.timer("composite", area.attrib['name'],
+                               product.attrib['id']):
+                img = func()
+            img.info.update(self.global_data.info)
+            img.info["product_name"] = \
+                product.attrib.get("name", product.attrib["id"])
+        except TimeBudgetExceeded:
+            raise
+        except AttributeError as err:
+            # Log incorrect product funcion name
+            LOGGER.error('Incorrect product id: %s for area %s (%s)',
+                         product.attrib['id'], area.attrib['name'], str(err))
+        except KeyError as err:
+            # log missing channel
+            LOGGER.warning('Missing channel on product %s for area %s: %s',
+                           product.attrib['name'], area.attrib['name'],
+                           str(err))
+        except Exception:
+            # log other errors
+            LOGGER.exception('Error on product %s for area %s',
+                             product.attrib['name'],
+                             area.attrib['name'])
+        else:
+            self.writer.write(img, product, params, job=id(self))
+
     def check_sunzen(self, config, area_def=None, xy_loc=None, lonlat=None,
-                     data_name='local_data'):
+                     data_name='local_data', data=None):
         '''Check if the data is within Sun zenith angle limits.
 
         :param config: configuration options for this product
@@ -857,60 +1538,46 @@ class DataProcessor(object):
         :type lonlat: tuple
         :param data_name: name of the dataset to get data from
         :type data_name: str
+        :param data: dataset to use instead of the one named by *data_name*
+        :type data: scene
 
         If both *xy_loc* and *lonlat* are None, image center is used as reference point. *xy_loc* overrides *lonlat*.
         '''
 
         LOGGER.info('Checking Sun zenith angle limits')
-        try:
-            data = getattr(self, data_name)
-        except AttributeError:
-            LOGGER.error('No such data: %s', data_name)
-            return False
+        if data is None:
+            try:
+                data = getattr(self, data_name)
+            except AttributeError:
+                LOGGER.error('No such data: %s', data_name)
+                return False
 
         if area_def is None and xy_loc is None:
             LOGGER.error('No area definition or pixel location given')
             return False
-
-        # Check availability of coordinates, load if necessary
-        if data.area.lons is None:
-            LOGGER.debug('Load coordinates for %s', data_name)
-            data.area.lons, data.area.lats = data.area.get_lonlats()
-
-        # Check availability of Sun zenith angles, calculate if necessary
-        try:
-            data.__getattribute__('sun_zen')
-        except AttributeError:
-            LOGGER.debug('Calculating Sun zenith angles for %s', data_name)
-            data.sun_zen = astronomy.sun_zenith_angle(data.time_slot,
-                                                      data.area.lons,
-                                                      data.area.lats)
-
-        if xy_loc is not None and len(xy_loc) == 2:
-            # Use the given xy-location
-            x_idx, y_idx = xy_loc
-        else:
-            if lonlat is not None and len(lonlat) == 2:
-                # Find the closest pixel to the given coordinates
-                dists = (data.area.lons - lonlat[0]) ** 2 + \
-                    (data.area.lats - lonlat[1]) ** 2
-                y_idx, x_idx = np.where(dists == np.min(dists))
-                y_idx, x_idx = int(y_idx), int(x_idx)
-            else:
-                # Use image center
-                y_idx = int(area_def.y_size / 2)
-                x_idx = int(area_def.x_size / 2)
+        if area_def is None:
+            area_def = data.area
+
+        x_idx, y_idx = self.get_sunzen_pixel(area_def, xy_loc=xy_loc,
+                                             lonlat=lonlat)
+        lons, lats = helper_functions.get_lonlats_at(area_def,
+                                                     [y_idx], [x_idx])
+        lon, lat = float(lons[0]), float(lats[0])
+        if not (np.isfinite(lon) and np.isfinite(lat) and abs(lat) <= 90):
+            # don't drop the product on a wrong location
+            LOGGER.warning("Invalid location for the Sun zenith angle "
+                           "check: (lon, lat) %s, %s (x, y: %d, %d)",
+                           lon, lat, x_idx, y_idx)
+            return True
+        sun_zen = astronomy.sun_zenith_angle(data.time_slot, lon, lat)
 
         # Check if Sun is too low (day-only products)
         try:
             LOGGER.debug('Checking Sun zenith-angle limit at '
                          '(lon, lat) %3.1f, %3.1f (x, y: %d, %d)',
-                         data.area.lons[y_idx, x_idx],
-                         data.area.lats[y_idx, x_idx],
-                         x_idx, y_idx)
+                         lon, lat, x_idx, y_idx)
 
-            if float(config['sunzen_day_maximum']) < \
-                    data.sun_zen[y_idx, x_idx]:
+            if float(config['sunzen_day_maximum']) < sun_zen:
                 LOGGER.info('Sun too low for day-time product.')
                 return False
         except KeyError:
@@ -918,8 +1585,7 @@ class DataProcessor(object):
 
         # Check if Sun is too high (night-only products)
         try:
-            if float(config['sunzen_night_minimum']) > \
-                    data.sun_zen[y_idx, x_idx]:
+            if float(config['sunzen_night_minimum']) > sun_zen:
                 LOGGER.info('Sun too high for night-time '
                             'product.')
                 return False
@@ -1010,6 +1676,16 @@ def _create_message(obj, filename, uri, params, publish_topic=None, uid=None):
     return msg
 
 
+def apply_aliases(params):
+    """Get a copy of the filename *params* with their aliases substituted.
+    """
+    local_params = params.copy()
+    for key, aliases in params['aliases'].items():
+        if key in local_params:
+            local_params[key] = aliases.get(params[key], params[key])
+    return local_params
+
+
 def link_or_copy(src, dst, tmpdst=None, retry=1):
     """Create a hardlink from *src* to *dst*, or if that fails, copy.
     """
@@ -1017,28 +1693,14 @@ def link_or_copy(src, dst, tmpdst=None, retry=1):
         LOGGER.warning("Trying to copy a file over itself: %s", src)
         return
     try:
-        os.link(src, dst)
-        if tmpdst is not None:
-            os.remove(tmpdst)
-    except OSError as err:
-        if err.errno not in [errno.EXDEV]:
-            LOGGER.exception("Could not link: %s -> %s", src, dst)
-            return
-        try:
-            if tmpdst is not None:
-                shutil.copy(src, tmpdst)
-                os.rename(tmpdst, dst)
-            else:
-                shutil.copy(src, dst)
-        except shutil.Error:
-            LOGGER.exception("Something went wrong in copying a file")
-        except IOError as err:
-            LOGGER.info("Error copying file: %s", str(err))
-            if retry:
-                LOGGER.info("Retrying...")
-                link_or_copy(src, dst, tmpdst, retry - 1)
-            else:
-                LOGGER.exception("Could not copy: %s -> %s", src, dst)
+        transfer(src, dst, tmpdst)
+    except (IOError, OSError) as err:
+        LOGGER.info("Error copying file: %s", str(err))
+        if retry:
+            LOGGER.info("Retrying...")
+            link_or_copy(src, dst, tmpdst, retry - 1)
+        else:
+            LOGGER.exception("Could not copy: %s -> %s", src, dst)
 
 
 def thumbnail(filename, thname, size, fformat):
@@ -1062,19 +1724,81 @@ def hash_color(colorstring):
     return (r_col, g_col, b_col)
 
 
+class SpilledProduct(object):
+
+    """A product waiting in the writer queue, stored on disk in *filename*
+    instead of memory.
+    """
+
+    def __init__(self, filename, job=None):
+        self.filename = filename
+        self.job = job
+
+    def load(self):
+        """Read the product back and remove the spill file.
+        """
+        try:
+            with open(self.filename, "rb") as fd_:
+                return cPickle.load(fd_)
+        finally:
+            os.remove(self.filename)
+
+
 class DataWriter(Thread):
     """Writes data to disk.
 
     This is separate from the DataProcessor since it takes IO time and
     we don't want to block processing.
+
+    The products are saved by a pool of *workers* threads. If *queue_size*
+    is positive, at most *queue_size* products are kept in memory waiting
+    to be saved. When the queue is full, :meth:`write` either blocks
+    (*queue_policy* "block") or spills the product to disk in *spill_dir*
+    (*queue_policy* "spill"). If an *encoder* pool is given, the images
+    are encoded in its processes, see
+    :class:`trollduction.encoder.EncoderPool`. The pool has to be created
+    before any thread is started, and is closed by its creator.
+
+    Products can be tagged with a *job* when written, and :meth:`wait`
+    waits for the products of a single job to be saved, so that several
+    data processors can share the writer.
+
+    If a *manifest* is given, the files written are recorded in it, and
+    the products whose files are already complete are skipped, see
+    :class:`trollduction.manifest.OutputManifest`.
     """
 
-    def __init__(self, publish_topic=None, port=0):
+    def __init__(self, publish_topic=None, port=0, workers=1, queue_size=0,
+                 queue_policy="block", spill_dir=None, encoder=None,
+                 manifest=None):
         Thread.__init__(self)
         self.prod_queue = Queue.Queue()
         self._publish_topic = publish_topic
         self._port = port
         self._loop = True
+        self._workers = max(int(workers), 1)
+        if queue_size > 0:
+            self._slots = BoundedSemaphore(queue_size)
+        else:
+            self._slots = None
+        if queue_policy not in ("block", "spill"):
+            raise ValueError("Unknown writer queue policy: " +
+                             str(queue_policy))
+        self._queue_policy = queue_policy
+        self._spill_dir = spill_dir
+        self._pub_lock = Lock()
+        self._stats_lock = Lock()
+        self.stats = [{"products": 0,
+                       "save_time": 0.0,
+                       "bytes_written": 0,
+                       "max_queue_depth": 0}
+                      for _ in range(self._workers)]
+        self.spilled = 0
+        self.skipped = 0
+        self.manifest = manifest
+        self._jobs = {}
+        self._jobs_done = Condition(self._stats_lock)
+        self._encoder = encoder
 
     def set_publish_topic(self, publish_topic):
         """Set published topic."""
@@ -1083,120 +1807,310 @@ class DataWriter(Thread):
     def run(self):
         """Run the thread."""
         with Publish("l2producer", port=self._port) as pub:
-            umask = os.umask(0)
-            os.umask(umask)
-            default_mode = int('666', 8) - umask
+            workers = [Thread(target=self._work, args=(pub, stats),
+                              name="DataWriter-%d" % num)
+                       for num, stats in enumerate(self.stats)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+    def _work(self, pub, stats):
+        """Save the products from the queue until stopped."""
+        umask = os.umask(0)
+        os.umask(umask)
+        default_mode = int('666', 8) - umask
+
+        while self._loop:
+            try:
+                item = self.prod_queue.get(True, 1)
+            except Queue.Empty:
+                continue
+            in_memory = not isinstance(item, SpilledProduct)
+            job = item[3] if in_memory else item.job
+            with self._stats_lock:
+                stats["max_queue_depth"] = max(stats["max_queue_depth"],
+                                               self.prod_queue.qsize() + 1)
+            try:
+                if in_memory:
+                    obj, file_items, params = item[:3]
+                else:
+                    obj, file_items, params = item.load()[:3]
+                del item
+                self.save(pub, obj, file_items, params, default_mode, stats)
+            except Exception:
+                LOGGER.exception("Could not read spilled product")
+            finally:
+                if in_memory and self._slots is not None:
+                    self._slots.release()
+                self._job_done(job)
+                self.prod_queue.task_done()
+
+    def _job_done(self, job):
+        """Count one more product of *job* as saved."""
+        if job is None:
+            return
+        with self._stats_lock:
+            self._jobs[job] -= 1
+            if self._jobs[job] <= 0:
+                del self._jobs[job]
+                self._jobs_done.notify_all()
+
+    def wait(self, job=None):
+        """Wait for the products of *job* to be saved, or for all the
+        products if *job* is None.
+        """
+        if job is None:
+            self.prod_queue.join()
+            return
+        with self._stats_lock:
+            while job in self._jobs:
+                self._jobs_done.wait(1)
+
+    def encode(self, obj, filename, fformat, compression, thumb=None):
+        """Save *obj* to *filename*, in the encoder processes if possible.
+        Returns True if the thumbnail *thumb*, given as (filename, size),
+        has been made too.
+        """
+        if (self._encoder is not None and
+                self._encoder.encode(obj, filename, fformat=fformat,
+                                     compression=compression,
+                                     thumbnail=thumb)):
+            return thumb is not None
+        obj.save(filename, fformat=fformat, compression=compression)
+        return False
 
-            while self._loop:
-                try:
-                    obj, file_items, params = self.prod_queue.get(True, 1)
-                except Queue.Empty:
-                    continue
-                local_params = params.copy()
-                try:
-                    # Sort the file items in categories, to allow copying
-                    # similar ones.
-                    sorted_items = {}
-                    for item in file_items:
-                        attrib = item.attrib.copy()
-                        for key in ["output_dir",
-                                    "thumbnail_name",
-                                    "thumbnail_size"]:
-                            if key in attrib:
-                                del attrib[key]
-                        if 'format' not in attrib:
-                            attrib.setdefault('format',
-                                              os.path.splitext(item.text)[1][1:])
-
-                        key = tuple(sorted(attrib.items()))
-                        sorted_items.setdefault(key, []).append(item)
-
-                    local_aliases = local_params['aliases']
-                    for key, aliases in local_aliases.items():
-                        if key in local_params:
-                            local_params[key] = aliases.get(params[key],
-                                                            params[key])
-                    for item, copies in sorted_items.items():
-                        attrib = dict(item)
-                        if attrib.get("overlay", "").startswith("#"):
-                            obj.add_overlay(hash_color(attrib.get("overlay")))
-                        elif len(attrib.get("overlay", "")) > 0:
-                            LOGGER.debug("Adding overlay from config file")
-                            obj.add_overlay_config(attrib["overlay"])
-                        fformat = attrib.get("format")
-
-                        # Actually save the data to disk.
-                        saved = False
-                        for copy in copies:
-                            output_dir = copy.attrib.get("output_dir",
-                                                         params["output_dir"])
-
-                            fname = compose(os.path.join(output_dir, copy.text),
-                                            local_params)
-                            tempfd, tempname = tempfile.mkstemp(dir=os.path.dirname(fname))
-                            os.chmod(tempname, default_mode)
-                            os.close(tempfd)
-                            LOGGER.debug("Saving %s", fname)
-                            if not saved:
-                                try:
-                                    obj.save(tempname,
-                                             fformat=fformat,
-                                             compression=copy.attrib.get("compression", 6))
-                                except IOError:  # retry once
-                                    try:
-                                        obj.save(tempname,
-                                                 fformat=fformat,
-                                                 compression=copy.attrib.get("compression", 6))
-                                    except IOError:
-                                        LOGGER.exception("Can't save file %s", fname)
-                                        continue
-                                os.rename(tempname, fname)
-
-                                LOGGER.info("Saved %s to %s", str(obj), fname)
-                                saved = fname
-                                uid = os.path.basename(fname)
+    def send(self, pub, msg):
+        """Publish *msg*, the publisher being shared between workers."""
+        with self._pub_lock:
+            pub.send(str(msg))
+
+    def save(self, pub, obj, file_items, params, default_mode, stats):
+        """Save *obj* to the files described in *file_items*."""
+        local_params = params.copy()
+        try:
+            # Sort the file items in categories, to allow copying
+            # similar ones.
+            sorted_items = {}
+            for item in file_items:
+                attrib = item.attrib.copy()
+                for key in ["output_dir",
+                            "thumbnail_name",
+                            "thumbnail_size"]:
+                    if key in attrib:
+                        del attrib[key]
+                if 'format' not in attrib:
+                    attrib.setdefault('format',
+                                      os.path.splitext(item.text)[1][1:])
+
+                key = tuple(sorted(attrib.items()))
+                sorted_items.setdefault(key, []).append(item)
+
+            local_params = apply_aliases(params)
+            scene_id = get_scene_id(params)
+            area_name = params.get("areaname")
+            product_name = params.get("productname")
+            for item, copies in sorted_items.items():
+                attrib = dict(item)
+                if attrib.get("overlay", "").startswith("#"):
+                    obj.add_overlay(hash_color(attrib.get("overlay")))
+                elif len(attrib.get("overlay", "")) > 0:
+                    LOGGER.debug("Adding overlay from config file")
+                    obj.add_overlay_config(attrib["overlay"])
+                fformat = attrib.get("format")
+
+                # Actually save the data to disk once, and link or
+                # copy it to the other files concurrently.
+                saved = False
+                outputs = []
+                links = []
+                for copy in copies:
+                    output_dir = copy.attrib.get("output_dir",
+                                                 params["output_dir"])
+
+                    fname = compose(os.path.join(output_dir, copy.text),
+                                    local_params)
+                    tempfd, tempname = tempfile.mkstemp(dir=os.path.dirname(fname))
+                    os.chmod(tempname, default_mode)
+                    os.close(tempfd)
+                    LOGGER.debug("Saving %s", fname)
+                    thumb = None
+                    if ("thumbnail_name" in copy.attrib and
+                            "thumbnail_size" in copy.attrib):
+                        # The product list items may be cached
+                        # and reused, so don't modify them here.
+                        thsize = [int(val) for val
+                                  in copy.attrib[
+                            "thumbnail_size"].split("x")]
+                        thname = \
+                            compose(os.path.join(
+                                output_dir,
+                                copy.attrib["thumbnail_name"]),
+                                local_params)
+                        thumb = (thname, thsize)
+                    if saved:
+                        links.append((fname, tempname, thumb))
+                        continue
+                    save_start = time.time()
+                    try:
+                        thumb_done = self.encode(
+                            obj, tempname, fformat,
+                            copy.attrib.get("compression", 6), thumb)
+                    except IOError:  # retry once
+                        try:
+                            thumb_done = self.encode(
+                                obj, tempname, fformat,
+                                copy.attrib.get("compression", 6), thumb)
+                        except IOError:
+                            LOGGER.exception("Can't save file %s", fname)
+                            continue
+                    os.rename(tempname, fname)
+                    save_time = time.time() - save_start
+                    TIMINGS.record("save", save_time, area_name, product_name)
+                    with self._stats_lock:
+                        stats["products"] += 1
+                        stats["save_time"] += save_time
+                        stats["bytes_written"] += os.path.getsize(fname)
+
+                    LOGGER.info("Saved %s to %s", str(obj), fname)
+                    saved = fname
+                    uid = os.path.basename(fname)
+                    outputs.append((fname, thumb, thumb_done))
+
+                if links:
+                    transfer_start = time.time()
+                    failed = fan_out(saved, [(fname, tempname)
+                                             for fname, tempname, _ in links])
+                    if failed:  # retry once
+                        LOGGER.info("Retrying...")
+                        failed = transfer_many([(src, dst)
+                                                for src, dst, _ in failed])
+                    TIMINGS.record("transfer", time.time() - transfer_start,
+                                   area_name, product_name)
+                    failed = set(dst for _, dst, _ in failed)
+                    for fname, _, thumb in links:
+                        if fname not in failed:
+                            LOGGER.info("Copied/Linked %s to %s",
+                                        saved, fname)
+                            outputs.append((fname, thumb, False))
+
+                for fname, thumb, thumb_done in outputs:
+                    if thumb is not None:
+                        thname, thsize = thumb
+                        if not thumb_done:
+                            if hasattr(obj, "pil_image"):
+                                make_thumbnail(obj, thname, thsize, fformat)
                             else:
-                                LOGGER.info("Copied/Linked %s to %s", saved, fname)
-                                link_or_copy(saved, fname, tempname)
-                                saved = fname
-                            if ("thumbnail_name" in copy.attrib and
-                                    "thumbnail_size" in copy.attrib):
-                                thsize = [int(val) for val
-                                          in copy.attrib[
-                                    "thumbnail_size"].split("x")]
-                                copy.attrib["thumbnail_size"] = thsize
-                                thname = \
-                                    compose(os.path.join(
-                                        output_dir,
-                                        copy.attrib["thumbnail_name"]),
-                                        local_params)
-                                copy.attrib["thumbnail_name"] = thname
                                 thumbnail(fname, thname, thsize, fformat)
+                        with self._stats_lock:
+                            stats["bytes_written"] += os.path.getsize(thname)
+
+                    msg = _create_message(obj, os.path.basename(fname),
+                                          fname, params,
+                                          publish_topic=self._publish_topic,
+                                          uid=uid)
+                    with TIMINGS.timer("publish"):
+                        self.send(pub, msg)
+                    LOGGER.debug("Sent message %s", str(msg))
+                    if self.manifest is not None:
+                        self.manifest.record(fname, scene_id)
+        except Exception as e:
+            LOGGER.exception("Something wrong happened saving "
+                             "%s to %s: %s (%s)",
+                             str(obj),
+                             str([tostring(item)
+                                  for item in file_items]),
+                             e.message,
+                             local_params)
+
+    def get_filenames(self, item, params):
+        """Get the names of the files of the product *item*.
+        """
+        local_params = apply_aliases(params)
+        return [compose(os.path.join(file_item.attrib.get(
+            "output_dir", params["output_dir"]), file_item.text),
+            local_params)
+            for file_item in item]
+
+    def is_complete(self, item, params):
+        """Check if the files of the product *item* have all been written
+        from the scene described by *params*, according to the manifest.
+        """
+        if self.manifest is None:
+            return False
+        scene_id = get_scene_id(params)
+        if scene_id is None:
+            return False
+        try:
+            filenames = self.get_filenames(item, params)
+        except (KeyError, ValueError):
+            return False
+        return bool(filenames) and all(
+            self.manifest.is_complete(filename, scene_id)
+            for filename in filenames)
 
-                            msg = _create_message(obj, os.path.basename(fname),
-                                                  fname, params,
-                                                  publish_topic=self._publish_topic,
-                                                  uid=uid)
-                            pub.send(str(msg))
-                            LOGGER.debug("Sent message %s", str(msg))
-                except Exception as e:
-                    for item in file_items:
-                        if "thumbnail_size" in item.attrib:
-                            item.attrib["thumbnail_size"] = str(
-                                item.attrib["thumbnail_size"])
-                    LOGGER.exception("Something wrong happened saving "
-                                     "%s to %s: %s (%s)",
-                                     str(obj),
-                                     str([tostring(item)
-                                          for item in file_items]),
-                                     e.message,
-                                     local_params)
-                finally:
-                    self.prod_queue.task_done()
-
-    def write(self, obj, item, params):
-        """Write to queue."""
-        self.prod_queue.put((obj, list(item), params.copy()))
+    def write(self, obj, item, params, job=None):
+        """Write to queue, the product being part of *job* if given.
+
+        Blocks or spills the product to disk if the queue is full,
+        depending on the queue policy. The product is skipped if its files
+        are already complete.
+        """
+        if self.is_complete(item, params):
+            LOGGER.info("Files of %s already complete, skipping", str(obj))
+            with self._stats_lock:
+                self.skipped += 1
+            return
+        product = (obj, list(item), params.copy(), job)
+        if job is not None:
+            with self._stats_lock:
+                self._jobs[job] = self._jobs.get(job, 0) + 1
+        if self._slots is None:
+            self.prod_queue.put(product)
+            return
+        if self._queue_policy == "spill" and not self._slots.acquire(False):
+            try:
+                self.prod_queue.put(self.spill(product))
+                return
+            except (cPickle.PicklingError, TypeError, IOError, OSError):
+                LOGGER.warning("Could not spill %s to disk, waiting for "
+                               "the writer queue instead.", str(obj))
+            self._slots.acquire()
+        elif self._queue_policy == "block":
+            self._slots.acquire()
+        self.prod_queue.put(product)
+
+    def spill(self, product):
+        """Store *product* on disk and return a reference to it."""
+        tempfd, tempname = tempfile.mkstemp(dir=self._spill_dir,
+                                            suffix=".spill")
+        try:
+            with os.fdopen(tempfd, "wb") as fd_:
+                cPickle.dump(product, fd_, cPickle.HIGHEST_PROTOCOL)
+        except Exception:
+            os.remove(tempname)
+            raise
+        with self._stats_lock:
+            self.spilled += 1
+        LOGGER.debug("Writer queue full, spilled %s to %s",
+                     str(product[0]), tempname)
+        return SpilledProduct(tempname, product[3])
+
+    def log_stats(self):
+        """Log the statistics of each worker."""
+        with self._stats_lock:
+            for num, stats in enumerate(self.stats):
+                LOGGER.info("Writer worker %d: %d products saved in %.1f s, "
+                            "%d bytes written, max queue depth %d",
+                            num, stats["products"], stats["save_time"],
+                            stats["bytes_written"],
+                            stats["max_queue_depth"])
+            if self.spilled:
+                LOGGER.info("%d products spilled to disk", self.spilled)
+            if self.skipped:
+                LOGGER.info("%d products already complete, skipped",
+                            self.skipped)
+        log_transfer_stats()
 
     def stop(self):
         """Stop the data writer."""
@@ -1204,6 +2118,116 @@ class DataWriter(Thread):
         self._loop = False
 
 
+# instrument: (scan lines per second, pixels per line, number of channels),
+# the high resolution channels counting for several channels
+SCAN_GEOMETRY = {"avhrr/3": (6.0, 2048, 6),
+                 "viirs": (16 / 1.786, 3200, 16 + 5 * 4),
+                 "modis": (10 / 1.477, 1354, 36)}
+
+# float32 data and mask of the loaded channels
+BYTES_PER_PIXEL = 5
+
+
+def estimate_memory(msg):
+    """Estimate the memory, in bytes, needed to hold the channels of the
+    swath announced in *msg*.
+
+    The swath size is computed from the duration of the swath for the
+    instruments in :data:`SCAN_GEOMETRY`, otherwise it is taken from the
+    size of the input files, assuming they contain 2-byte counts.
+    """
+    sensor = msg.data.get("sensor")
+    if isinstance(sensor, (list, tuple, set)):
+        sensor = list(sensor)[0]
+    try:
+        lines_per_second, columns, channels = SCAN_GEOMETRY[sensor]
+        duration = (msg.data["end_time"] -
+                    msg.data["start_time"]).total_seconds()
+    except (KeyError, TypeError, AttributeError):
+        pass
+    else:
+        lines = int(duration * lines_per_second)
+        return lines * columns * channels * BYTES_PER_PIXEL
+
+    uris = get_message_uris(msg) or []
+    if isinstance(uris, (str, unicode)):
+        uris = [uris]
+    size = 0
+    for uri in uris:
+        try:
+            size += os.path.getsize(urlparse(uri).path)
+        except OSError:
+            pass
+    return size / 2 * BYTES_PER_PIXEL
+
+
+class TimeBudgetExceeded(Exception):
+
+    """Raised when a product or area exceeds its time budget."""
+    pass
+
+
+class TimeBudget(object):
+
+    """Time budget of *seconds* for *name*, starting when created. A
+    budget of 0 is unlimited.
+
+    A running composite can't be interrupted, so the budget is checked
+    before the steps of the processing. A finished composite is kept, as
+    saving it doesn't hold back the processing.
+    """
+
+    def __init__(self, name, seconds=0):
+        self.name = name
+        self.seconds = seconds
+        self.start = time.time()
+
+    def elapsed(self):
+        """Get the time elapsed since the start of the budget."""
+        return time.time() - self.start
+
+    def exceeded(self):
+        """Check if the budget is exceeded."""
+        return self.seconds > 0 and self.elapsed() > self.seconds
+
+    def check(self):
+        """Raise TimeBudgetExceeded if the budget is exceeded."""
+        if self.exceeded():
+            raise TimeBudgetExceeded("%s exceeded its time budget of "
+                                     "%.1f s (%.1f s)" %
+                                     (self.name, self.seconds,
+                                      self.elapsed()))
+
+
+class MemoryBudget(object):
+
+    """Admission of jobs within a memory budget of *limit* bytes, 0 for no
+    limit. A job larger than the budget is admitted when no other job is
+    running.
+    """
+
+    def __init__(self, limit=0):
+        self.limit = limit
+        self.in_use = 0
+        self._cond = Condition()
+
+    def acquire(self, size):
+        """Wait until *size* bytes fit in the budget, and reserve them.
+        """
+        with self._cond:
+            while (self.limit and self.in_use > 0 and
+                   self.in_use + size > self.limit):
+                self._cond.wait(1)
+            self.in_use += size
+
+    def release(self, size):
+        """Give back *size* bytes to the budget.
+        """
+        with self._cond:
+            self.in_use -= size
+            self._cond.notify_all()
+
+
 class Trollduction(object):
 
     """Trollduction takes in messages and generates DataProcessor jobs.
@@ -1215,6 +2239,7 @@ class Trollduction(object):
         self.td_config = None
         self.product_config = None
         self.listener = None
+        self.scheduler = MessageScheduler()
 
         self.global_data = None
         self.local_data = None
@@ -1223,10 +2248,21 @@ class Trollduction(object):
         self.thr = None
 
         self.data_processor = None
+        self.data_processors = []
+        self.worker_status = []
+        self._idle_workers = Queue.Queue()
+        self._status_lock = Lock()
+        self.memory_budget = None
+        self.stages = []
         self.config_watcher = None
+        self.product_config_watcher = None
+        self.product_config_cache = xml_read.ProductListCache()
+        self._managed = managed
 
-        self._previous_pass = {"platform_name": None,
-                               "start_time": None}
+        self.dedupe_index = None
+        self.output_manifest = None
+        self.encoder = None
+        self.retries = RetryQueue()
 
         # read everything from the Trollduction config file
         try:
@@ -1243,14 +2279,63 @@ class Trollduction(object):
             self.td_config = config
             self.update_td_config()
 
-        self.data_processor = \
-            DataProcessor(publish_topic=self.td_config.get('publish_topic'),
-                          port=int(self.td_config.get('port', 0)))
+        writer = \
+            DataWriter(publish_topic=self.td_config.get('publish_topic'),
+                       port=int(self.td_config.get('port', 0)),
+                       workers=int(self.td_config.get('writer_workers', 1)),
+                       queue_size=int(self.td_config.get('writer_queue_size',
+                                                         0)),
+                       queue_policy=self.td_config.get('writer_queue_policy',
+                                                       'block'),
+                       spill_dir=self.td_config.get('writer_spill_dir'),
+                       encoder=self.encoder,
+                       manifest=self.get_output_manifest())
+        # the processing workers share the data writer
+        pipeline = self.td_config.get('pipeline', "false").lower() in \
+            ["true", "yes", "1"]
+        # one message in each stage by default when pipelining
+        workers = max(int(self.td_config.get('processing_workers',
+                                             3 if pipeline else 1)), 1)
+        for num in range(workers):
+            self.data_processors.append(
+                DataProcessor(publish_topic=self.td_config.get('publish_topic'),
+                              writer=writer))
+            self.worker_status.append({"state": "idle"})
+            self._idle_workers.put(num)
+        self.data_processor = self.data_processors[0]
+        # given in megabytes
+        self.memory_budget = \
+            MemoryBudget(int(float(self.td_config.get('memory_budget', 0)) *
+                             1024 ** 2))
+        if workers > 1:
+            LOGGER.info("Processing up to %d messages in parallel", workers)
+        if pipeline:
+            self.start_pipeline(
+                int(self.td_config.get('pipeline_queue_size', 1)))
+
+    def start_pipeline(self, queue_size=1):
+        """Start the load, project and write stages, connected by queues
+        holding at most *queue_size* messages.
+        """
+        queues = [Queue.Queue(queue_size) for _ in range(3)]
+        self.stages = [Stage("load", partial(self._pipeline_step, "load"),
+                             queues[0], queues[1],
+                             on_reject=self._pipeline_rejected),
+                       Stage("project",
+                             partial(self._pipeline_step, "project"),
+                             queues[1], queues[2],
+                             on_reject=self._pipeline_rejected),
+                       Stage("write", partial(self._pipeline_step, "write"),
+                             queues[2])]
+        for stage in self.stages:
+            stage.start()
+        LOGGER.info("Processing messages in a pipeline")
 
     def update_td_config_from_file(self, fname, config_item=None):
         '''Read Trollduction config file and use the new parameters.
         '''
         self.td_config = helper_functions.read_config_file(fname, config_item)
+        self.product_config_cache.invalidate()
         self.update_td_config()
 
     def update_td_config(self):
@@ -1259,10 +2344,24 @@ class Trollduction(object):
 
         LOGGER.info('Trollduction configuration read successfully.')
 
+        # the listener queues the messages in the scheduler
+        self.scheduler.configure(self.td_config)
+        self.retries.max_attempts = int(self.td_config.get('retry_attempts',
+                                                           2))
+        self.retries.delay = float(self.td_config.get('retry_delay', 2))
+        self.retries.max_delay = float(self.td_config.get('retry_max_delay',
+                                                          300))
+        TIMINGS.configure(
+            window=float(self.td_config.get('timing_window', 3600)),
+            interval=float(self.td_config.get('timing_interval', 0)),
+            filename=self.td_config.get('timing_file'))
+        self.start_encoder()
+
         # Initialize/restart listener
         if self.listener is None:
             self.listener = \
-                ListenerContainer(topics=self.td_config['topics'].split(','))
+                ListenerContainer(topics=self.td_config['topics'].split(','),
+                                  queue=self.scheduler)
 #            self.listener = ListenerContainer()
             LOGGER.info("Listener started")
         else:
@@ -1275,15 +2374,60 @@ class Trollduction(object):
         except KeyError:
             LOGGER.exception("Key 'product_config_file' is "
                              "missing from Trollduction config")
+        else:
+            if not self._managed:
+                self.watch_product_config(
+                    self.td_config['product_config_file'])
+
+    def start_encoder(self):
+        '''Start the pool of encoder processes, if configured. The pool is
+        started before the listener and the other threads, as forking a
+        process with running threads can leave locks held in the children.
+        '''
+        processes = int(self.td_config.get('encoder_processes', 0))
+        if self.encoder is not None or self.listener is not None:
+            running = self.encoder.processes if self.encoder else 0
+            if processes != running:
+                LOGGER.warning("The number of encoder processes can't be "
+                               "changed while running, restart to use %d",
+                               processes)
+            return
+        if processes <= 0:
+            return
+        self.encoder = EncoderPool(processes,
+                                   self.td_config.get('encoder_tmp_dir'))
+        LOGGER.info("Encoding the images in %d processes", processes)
+
+    def watch_product_config(self, fname):
+        '''Invalidate the cached product list when *fname* is changed.
+        '''
+        if self.product_config_watcher is not None:
+            if self.product_config_watcher.config_file == fname:
+                return
+            self.product_config_watcher.stop()
+        self.product_config_watcher = \
+            ConfigWatcher(fname, None, self.product_config_changed)
+        self.product_config_watcher.start()
+
+    def product_config_changed(self, fname, config_item=None):
+        '''Called by the product config watcher when *fname* changes.
+        '''
+        del config_item
+        LOGGER.info("Product config %s changed", fname)
+        self.product_config_cache.invalidate(fname)
 
     def update_product_config(self, fname):
         '''Update area definitions, associated product names, output
         filename prototypes and other relevant information from the
         given file.
         '''
-        import xml_read
-
-        self.product_config = xml_read.ProductList(fname)
+        self.product_config = self.product_config_cache.get(fname)
+        # given in minutes
+        max_age = self.product_config.attrib.get("max_age")
+        if max_age:
+            self.scheduler.max_age = timedelta(minutes=float(max_age))
+        else:
+            self.scheduler.max_age = None
 
         # add checks, or do we just assume the config to be valid at
         # this point?
@@ -1304,8 +2448,22 @@ class Trollduction(object):
             self.data_processor.stop()
             if self.config_watcher is not None:
                 self.config_watcher.stop()
+            if self.product_config_watcher is not None:
+                self.product_config_watcher.stop()
             if self.listener is not None:
                 self.listener.stop()
+            for stage in self.stages:
+                stage.stop()
+            if self.encoder is not None:
+                # let the writer finish the images being encoded
+                self.data_processor.writer.join()
+                self.encoder.close()
+            if self.dedupe_index is not None:
+                self.dedupe_index.close()
+            if self.output_manifest is not None:
+                self.output_manifest.close()
+            if TIMINGS.interval > 0:
+                TIMINGS.dump()
 
     def stop(self):
         """Stop running.
@@ -1322,69 +2480,258 @@ class Trollduction(object):
         """
         try:
             while self._loop:
-                # wait for new messages
+                for (msg, pass_key), attempt in self.retries.pop_due():
+                    LOGGER.info("Retrying %s, attempt %d",
+                                get_message_uris(msg), attempt)
+                    self.update_product_config(
+                        self.td_config['product_config_file'])
+                    self.handle(msg, pass_key, attempt)
+                # wait for new messages, or for the next retry
+                timeout = 5
+                next_retry = self.retries.next_due()
+                if next_retry is not None:
+                    timeout = min(timeout, max(next_retry, 0.1))
                 try:
-                    msg = self.listener.queue.get(True, 5)
+                    msg = self.listener.queue.get(True, timeout)
                 except KeyboardInterrupt:
                     self.stop()
                     raise
                 except Queue.Empty:
                     continue
                 LOGGER.debug(str(msg))
+                self.scheduler.log_counters()
                 if isinstance(msg.data['sensor'], (list, tuple, set)):
                     sensors = set(msg.data['sensor'])
                 else:
                     sensors = set((msg.data['sensor'], ))
 
-                prev_pass = self._previous_pass
                 if (msg.type in ["file", 'collection', 'dataset'] and
                     sensors.intersection(
                         self.td_config['instruments'].split(','))):
-                    try:
-                        if self.td_config.get('process_only_once',
-                                              "false").lower() in \
-                           ["true", "yes", "1"] and \
-                           self._previous_pass["platform_name"] == \
-                           msg.data["platform_name"] and \
-                           self._previous_pass["start_time"] == \
-                           msg.data["start_time"]:
-                            LOGGER.info(
-                                "File was already processed. Skipping.")
+                    pass_key = None
+                    if self.td_config.get('process_only_once',
+                                          "false").lower() in \
+                            ["true", "yes", "1"]:
+                        pass_key = dedupe.get_pass_key(
+                            msg.data, self.td_config['product_config_file'])
+                        if pass_key is None:
+                            LOGGER.info("Can't check if file is already "
+                                        "processed, so let's do it anyway.")
+                        elif not self.get_dedupe_index().start(pass_key):
+                            LOGGER.info("File was already processed, or is "
+                                        "being processed. Skipping.")
                             continue
-                        else:
-                            self._previous_pass["platform_name"] = \
-                                msg.data["platform_name"]
-                            self._previous_pass["start_time"] = \
-                                msg.data["start_time"]
-                    except TypeError:
-                        self._previous_pass["platform_name"] = \
-                            msg.data["platform_name"]
-                        self._previous_pass["start_time"] = \
-                            msg.data["start_time"]
-
-                    except KeyError:
-                        LOGGER.info("Can't check if file is already processed, "
-                                    "so let's do it anyway.")
 
                     self.update_product_config(
                         self.td_config['product_config_file'])
 
-                    retried = False
-                    while True:
-                        try:
-                            self.data_processor.run(self.product_config, msg)
-                            break
-                        except IOError:
-                            if retried:
-                                LOGGER.debug("History of processed files not "
-                                             "updated due to "
-                                             "missing/corrupted/incomplete "
-                                             "data.")
-                                self._previous_pass = prev_pass
-                                break
-                            else:
-                                retried = True
-                                LOGGER.info("Retrying once in 2 seconds.")
-                                time.sleep(2)
+                    self.handle(msg, pass_key)
         finally:
             self.shutdown()
+
+    def handle(self, msg, pass_key, attempt=1):
+        """Process *msg*, in a worker or the pipeline if there are any.
+        """
+        if len(self.data_processors) > 1 or self.stages:
+            self.dispatch(msg, pass_key, attempt)
+        else:
+            self.process(self.data_processor, self.product_config, msg,
+                         pass_key, attempt)
+
+    def get_dedupe_index(self):
+        """Get the index of the processed passes, stored in the file given
+        by the dedupe_file option if any.
+        """
+        if self.dedupe_index is None:
+            # given in hours
+            expiry = float(self.td_config.get('dedupe_expiry', 24)) * 3600
+            self.dedupe_index = \
+                dedupe.DedupeIndex(self.td_config.get('dedupe_file'), expiry)
+        return self.dedupe_index
+
+    def get_output_manifest(self):
+        """Get the manifest of the output files, stored in the file given
+        by the output_manifest option, or None if not configured.
+        """
+        if (self.output_manifest is None and
+                self.td_config.get('output_manifest')):
+            expiry = float(self.td_config.get('output_manifest_expiry',
+                                              24 * 7)) * 3600
+            self.output_manifest = \
+                OutputManifest(self.td_config['output_manifest'],
+                               expiry=expiry)
+        return self.output_manifest
+
+    def process(self, data_processor, product_config, msg, pass_key,
+                attempt=1):
+        """Process *msg* with *data_processor*, scheduling a retry if the
+        data is missing or corrupted.
+        """
+        try:
+            data_processor.run(product_config, msg)
+        except IOError:
+            self._retry(msg, pass_key, attempt)
+        else:
+            self._processed(pass_key, attempt)
+
+    def _processed(self, pass_key, attempt):
+        """Record *pass_key* as processed, and count the message as
+        recovered if it succeeded after *attempt* tries.
+        """
+        if pass_key is not None:
+            self.get_dedupe_index().done(pass_key)
+        if attempt > 1:
+            self.retries.recovered()
+            self.retries.log_counters()
+
+    def _retry(self, msg, pass_key, attempt):
+        """Schedule *msg*, which failed at *attempt*, for a new attempt,
+        or give up.
+        """
+        if self.retries.schedule((msg, pass_key), attempt):
+            LOGGER.info("Retrying in %.0f seconds.",
+                        self.retries.get_delay(attempt))
+        else:
+            LOGGER.warning("Giving up %s after %d attempts.",
+                           get_message_uris(msg), attempt)
+            LOGGER.debug("History of processed files not "
+                         "updated due to "
+                         "missing/corrupted/incomplete "
+                         "data.")
+            self._forget_pass(pass_key)
+        self.retries.log_counters()
+
+    def _forget_pass(self, pass_key):
+        """Remove *pass_key* from the processed passes, so that the pass
+        can be processed again.
+        """
+        if pass_key is not None:
+            self.get_dedupe_index().remove(pass_key)
+
+    def dispatch(self, msg, pass_key, attempt=1):
+        """Process *msg* in the next idle worker, once the memory it needs
+        fits in the memory budget.
+        """
+        num = self._idle_workers.get()
+        size = estimate_memory(msg)
+        LOGGER.debug("Estimated memory for %s: %.1f MB",
+                     msg.data.get("platform_name"), size / 1024. ** 2)
+        self.memory_budget.acquire(size)
+        with self._status_lock:
+            self.worker_status[num] = {
+                "state": "busy",
+                "platform_name": msg.data.get("platform_name"),
+                "start_time": msg.data.get("start_time"),
+                "since": time.time(),
+                "memory": size}
+        self.log_worker_status()
+        if self.stages:
+            self.stages[0].in_queue.put({"num": num,
+                                         "product_config": self.product_config,
+                                         "msg": msg,
+                                         "pass_key": pass_key,
+                                         "size": size,
+                                         "attempt": attempt})
+            return
+        thr = Thread(target=self._work,
+                     args=(num, self.product_config, msg, pass_key, size,
+                           attempt),
+                     name="DataProcessor-%d" % num)
+        thr.start()
+
+    def _work(self, num, product_config, msg, pass_key, size, attempt=1):
+        """Process *msg* in worker *num*, then release the worker and its
+        share of the memory budget.
+        """
+        try:
+            self.process(self.data_processors[num], product_config, msg,
+                         pass_key, attempt)
+        except Exception:
+            LOGGER.exception("Processing failed in worker %d", num)
+            self._forget_pass(pass_key)
+        finally:
+            self._release(num, size)
+
+    def _release(self, num, size):
+        """Make worker *num* idle again and give back its *size* bytes of
+        the memory budget.
+        """
+        self.memory_budget.release(size)
+        with self._status_lock:
+            self.worker_status[num] = {"state": "idle"}
+        self._idle_workers.put(num)
+        self.log_worker_status()
+
+    def _pipeline_step(self, stage, job):
+        """Run the pipeline *stage* on *job*. Returns the job if it goes on
+        to the next stage.
+        """
+        num = job["num"]
+        passed_on = False
+        try:
+            data_processor = self.data_processors[num]
+            with self._status_lock:
+                self.worker_status[num]["stage"] = stage
+            if stage == "load":
+                if data_processor.prepare(job["product_config"], job["msg"]):
+                    passed_on = True
+                    return job
+                # nothing to process
+                self._processed(job["pass_key"], job["attempt"])
+            elif stage == "project":
+                data_processor.project()
+                passed_on = True
+                return job
+            else:
+                data_processor.finish()
+                self._processed(job["pass_key"], job["attempt"])
+        except IOError:
+            self._retry(job["msg"], job["pass_key"], job["attempt"])
+        except Exception:
+            LOGGER.exception("Processing failed in worker %d", num)
+            self._forget_pass(job["pass_key"])
+        finally:
+            if not passed_on:
+                self._end_job(job)
+        return None
+
+    def _pipeline_rejected(self, job):
+        """Give up *job*, which the pipeline couldn't pass on to the next
+        stage as it is stopping.
+        """
+        LOGGER.warning("Pipeline stopped, giving up %s",
+                       get_message_uris(job["msg"]))
+        self._forget_pass(job["pass_key"])
+        self._end_job(job)
+
+    def _end_job(self, job):
+        """Release the worker and the memory of the pipeline *job*.
+        """
+        self._release(job["num"], job["size"])
+        for pipeline_stage in self.stages:
+            pipeline_stage.log_stats()
+
+    def get_worker_status(self):
+        """Get the status of each processing worker.
+        """
+        with self._status_lock:
+            return [status.copy() for status in self.worker_status]
+
+    def log_worker_status(self):
+        """Log the status of each processing worker and the memory in use.
+        """
+        now = time.time()
+        for num, status in enumerate(self.get_worker_status()):
+            if status["state"] == "busy":
+                LOGGER.info("Processing worker %d: busy with %s %s for "
+                            "%.1f s%s, estimated %.1f MB",
+                            num, status["platform_name"],
+                            str(status["start_time"]),
+                            now - status["since"],
+                            (" in stage " + status["stage"]
+                             if "stage" in status else ""),
+                            status["memory"] / 1024. ** 2)
+            else:
+                LOGGER.info("Processing worker %d: idle", num)
+        LOGGER.info("Memory budget in use: %.1f MB",
+                    self.memory_budget.in_use / 1024. ** 2)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Planning of the products of an area.
+
+Some composites use intermediate arrays besides the channels, like the
+lon/lat grids of the area for the Sun zenith angle corrections, which mpop
+computes again for every composite. The composites calling
+``get_lonlats`` or ``sunzen_corr``, eg. overview_sun or snow, are found
+to use the lon/lat grids. Other composites can declare the intermediates
+they use in their ``intermediates`` attribute, beside their
+``prerequisites``, or the products of the product list in their
+``intermediates`` attribute, eg. ``intermediates="lonlats"``.
+
+The planner keeps the configured order of the products, and tells when
+each intermediate can be freed. :class:`SharedIntermediates` computes the
+intermediates once for a projected scene.
+"""
+
+import copy
+import logging
+from threading import Lock
+
+from trollduction.planning import ChannelLoadPlan
+
+LOGGER = logging.getLogger(__name__)
+
+# the intermediates which can be shared
+INTERMEDIATES = ("lonlats", )
+
+_REQUIREMENTS = {}
+_REQUIREMENTS_LOCK = Lock()
+
+
+def parse_intermediates(names):
+    """Get the set of known intermediates in *names*, given as a comma
+    separated string or a sequence.
+    """
+    if not names:
+        return set()
+    if isinstance(names, basestring):
+        names = names.split(",")
+    res = set()
+    for name in names:
+        name = name.strip()
+        if name in INTERMEDIATES:
+            res.add(name)
+        elif name:
+            LOGGER.warning("Unknown intermediate %s, not shared", name)
+    return res
+
+
+def find_intermediates(func):
+    """Find the intermediates the composite *func* computes itself, from
+    the names its code uses.
+    """
+    code = getattr(func, "func_code", None)
+    if code is None:
+        return set()
+    if "get_lonlats" in code.co_names or "sunzen_corr" in code.co_names:
+        return set(["lonlats"])
+    return set()
+
+
+def get_composite_requirements(func):
+    """Get the channels and the intermediates used by the composite
+    *func*, as two sets.
+    """
+    func = getattr(func, "im_func", func)
+    with _REQUIREMENTS_LOCK:
+        try:
+            return _REQUIREMENTS[func]
+        except KeyError:
+            pass
+    channels = set(getattr(func, "prerequisites", None) or [])
+    intermediates = (parse_intermediates(getattr(func, "intermediates",
+                                                 None)) |
+                     find_intermediates(func))
+    with _REQUIREMENTS_LOCK:
+        _REQUIREMENTS[func] = (channels, intermediates)
+    return channels, intermediates
+
+
+def plan_products(items, get_func):
+    """Plan the product *items* of an area, *get_func* giving the
+    composite function of a product, or None if it isn't a composite.
+
+    Returns a list of (item, intermediates, free_after) tuples, in the
+    order of *items*.
+    """
+    intermediates = []
+    for item in items:
+        func = get_func(item)
+        if func is None:
+            intermediates.append(set())
+        else:
+            intermediates.append(
+                get_composite_requirements(func)[1] |
+                parse_intermediates(getattr(item, "attrib", {}).get(
+                    "intermediates")))
+    plan = ChannelLoadPlan([(i, needed, False)
+                            for i, needed in enumerate(intermediates)],
+                           reorder=False)
+    return [(items[i], needed, free_after)
+            for i, needed, free_after in plan.steps]
+
+
+class SharedIntermediates(object):
+
+    """Intermediates of the projected *scene*, computed once and shared
+    by its composites. The lon/lat grids are taken from *grid_cache* if
+    given.
+    """
+
+    def __init__(self, scene, grid_cache=None):
+        self.scene = scene
+        self.grid_cache = grid_cache
+        self._areas = []
+        self.computed = set()
+
+    def provide(self, names):
+        """Make sure the intermediates *names* are available to the
+        composites.
+        """
+        for name in names:
+            if name in self.computed:
+                continue
+            if name == "lonlats":
+                self._provide_lonlats()
+            self.computed.add(name)
+
+    def _provide_lonlats(self):
+        """Give the channels a copy of their area holding its lon/lat
+        grids, so that mpop computes them only once.
+        """
+        copies = {}
+        for chn in self.scene.loaded_channels():
+            area = chn.area
+            if getattr(area, "lons", 0) is not None or \
+               not hasattr(area, "get_lonlats"):
+                # an area name, a swath or grids already there
+                continue
+            if id(area) not in copies:
+                area_copy = copy.copy(area)
+                if self.grid_cache is not None:
+                    lons, lats = self.grid_cache.get_lonlats(area)
+                else:
+                    lons, lats = area.get_lonlats()
+                area_copy.lons, area_copy.lats = lons, lats
+                copies[id(area)] = area_copy
+                LOGGER.debug("Computed the lon/lat grids of %s once",
+                             getattr(area, "area_id", str(area)))
+            self._areas.append((chn, area, copies[id(area)]))
+            chn.area = copies[id(area)]
+
+    def free(self, names):
+        """Free the intermediates *names*.
+        """
+        for name in names:
+            if name not in self.computed:
+                continue
+            if name == "lonlats":
+                for chn, area, area_copy in self._areas:
+                    chn.area = area
+                    # the images may keep a reference to the copy
+                    area_copy.lons = None
+                    area_copy.lats = None
+                self._areas = []
+            self.computed.discard(name)
+
+    def free_all(self):
+        """Free all the intermediates.
+        """
+        self.free(list(self.computed))
@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Shared on-disk cache for the resampling look-up tables.
+
+The look-up tables computed by :class:`mpop.projector.Projector` are stored
+in a content addressed directory, keyed by sensor, resolution, input
+geometry, target area and projection method. File locking makes it
+possible for several l2processor instances to share the same directory.
+When the directory grows over its maximum size, the least recently used
+tables are removed.
+
+Only the tables projecting from an area definition, eg. geostationary data,
+are cached. Swaths, eg. polar passes, never have exactly the same geometry
+twice, so their tables are computed directly and not stored, not to evict
+useful tables from the cache.
+"""
+
+import copy
+import errno
+import fcntl
+import hashlib
+import logging
+import os
+import tempfile
+import weakref
+from contextlib import contextmanager
+from threading import Lock
+
+import numpy as np
+from mpop.projector import Projector
+
+from trollduction.area_geometry import get_area_def
+
+LOGGER = logging.getLogger(__name__)
+
+def makedirs(dirname):
+    """Create *dirname* if it doesn't exist yet.
+    """
+    try:
+        os.makedirs(dirname)
+    except OSError as err:
+        if err.errno != errno.EEXIST:
+            raise
+
+
+@contextmanager
+def locked(lock_file, exclusive=True):
+    """Hold an flock on *lock_file* for the duration of the block.
+    """
+    fdesc = os.open(lock_file, os.O_RDWR | os.O_CREAT, int('666', 8))
+    try:
+        fcntl.flock(fdesc, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        fcntl.flock(fdesc, fcntl.LOCK_UN)
+        os.close(fdesc)
+
+
+def get_geometry_hash(area):
+    """Get a hash string identifying the geometry of the area definition
+    *area*.
+    """
+    sha = hashlib.sha1()
+    sha.update(str(area.proj4_string))
+    sha.update(str((area.x_size, area.y_size)))
+    sha.update(str(tuple(area.area_extent)))
+    return sha.hexdigest()
+
+
+class CachedProjector(Projector):
+
+    """A projector using precomputed look-up tables *params*.
+    """
+
+    def __init__(self, in_area, out_area, params, mode, radius):
+        # Projector.__init__ would compute the tables, so don't call it.
+        # pylint: disable=super-init-not-called
+        self.in_area = in_area
+        self.out_area = out_area
+        self.mode = mode
+        self.radius = radius
+        self._cache = dict(params)
+        self._file_cache = self._cache
+        self._filename = None
+
+
+class ResampleCache(object):
+
+    """Cache of resampling look-up tables in *cache_dir*, holding at most
+    *max_size* bytes (no limit if None).
+    """
+
+    def __init__(self, cache_dir, max_size=None):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._lock_file = os.path.join(cache_dir, ".lock")
+        self._stats_lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.uncached = 0
+        makedirs(cache_dir)
+
+    def get_key(self, sensor, resolution, in_area, out_area, mode, radius):
+        """Get the key for the tables projecting *in_area* to *out_area*.
+        """
+        fields = (str(sensor), str(resolution), get_geometry_hash(in_area),
+                  str(out_area.area_id), get_geometry_hash(out_area),
+                  str(mode), str(radius))
+        return hashlib.sha1("|".join(fields)).hexdigest()
+
+    def _get_filename(self, key):
+        """Get the filename of the tables for *key*.
+        """
+        return os.path.join(self.cache_dir, key[:2], key + ".npz")
+
+    def load(self, key):
+        """Get the tables for *key*, or None if they are not cached.
+        """
+        filename = self._get_filename(key)
+        with locked(self._lock_file, exclusive=False):
+            try:
+                npz = np.load(filename)
+            except IOError:
+                return None
+            try:
+                params = dict((name, npz[name]) for name in npz.files)
+            finally:
+                npz.close()
+            # the modification time is used for the LRU eviction
+            try:
+                os.utime(filename, None)
+            except OSError:
+                pass
+        return params
+
+    def store(self, key, params):
+        """Store the tables *params* under *key*.
+        """
+        filename = self._get_filename(key)
+        dirname = os.path.dirname(filename)
+        with locked(self._lock_file, exclusive=False):
+            makedirs(dirname)
+            tempfd, tempname = tempfile.mkstemp(dir=dirname,
+                                                suffix=".npz.tmp")
+            try:
+                with os.fdopen(tempfd, "wb") as fd_:
+                    np.savez(fd_, **params)
+                os.rename(tempname, filename)
+            except Exception:
+                os.remove(tempname)
+                raise
+        LOGGER.debug("Saved resampling tables to %s", filename)
+        self.evict()
+
+    def get_projector(self, in_area, out_area, mode, radius, nprocs=1,
+                      sensor=None, resolution=None):
+        """Get a projector from *in_area* to *out_area*, from the cache if
+        *in_area* is an area definition.
+        """
+        if mode is None:
+            if (hasattr(in_area, "proj_dict") and
+                    hasattr(out_area, "proj_dict")):
+                mode = "quick"
+            else:
+                mode = "nearest"
+        if not hasattr(in_area, "proj_dict"):
+            with self._stats_lock:
+                self.uncached += 1
+            return Projector(in_area, out_area, mode=mode, radius=radius,
+                             nprocs=nprocs)
+        key = self.get_key(sensor, resolution, in_area, out_area, mode,
+                           radius)
+        params = self.load(key)
+        if params is None:
+            # Only one process computes the tables for a given key, the
+            # others wait for it and read the result.
+            filename = self._get_filename(key)
+            makedirs(os.path.dirname(filename))
+            with locked(filename + ".lock"):
+                params = self.load(key)
+                if params is None:
+                    with self._stats_lock:
+                        self.misses += 1
+                    projector = Projector(in_area, out_area, mode=mode,
+                                          radius=radius, nprocs=nprocs)
+                    params = projector._cache or projector._file_cache
+                    params = dict((name, params[name]) for name in params)
+                    try:
+                        self.store(key, params)
+                    except (IOError, OSError):
+                        LOGGER.exception("Could not save resampling tables")
+                    return projector
+        with self._stats_lock:
+            self.hits += 1
+        return CachedProjector(in_area, out_area, params, mode, radius)
+
+    def get_size(self):
+        """Get the total size of the cached tables, in bytes.
+        """
+        return sum(size for _, size, _ in self._list_files())
+
+    def _list_files(self):
+        """List the (modification time, size, filename) of cached tables.
+        """
+        files = []
+        for dirpath, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if not filename.endswith(".npz"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def evict(self):
+        """Remove the least recently used tables until the cache holds at
+        most *max_size* bytes.
+        """
+        if self.max_size is None:
+            return
+        with locked(self._lock_file):
+            files = sorted(self._list_files())
+            size = sum(fsize for _, fsize, _ in files)
+            for _, fsize, path in files:
+                if size <= self.max_size:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                size -= fsize
+                with self._stats_lock:
+                    self.evictions += 1
+                LOGGER.debug("Evicted %s from the resampling cache", path)
+
+    def log_stats(self):
+        """Log the cache statistics.
+        """
+        LOGGER.info("Resampling cache %s: %d hits, %d misses, %d evictions, "
+                    "%d swaths not cached", self.cache_dir, self.hits,
+                    self.misses, self.evictions, self.uncached)
+
+
+def project_scene(scene, dest_area, cache, channels=None, mode=None,
+                  radius=None, nprocs=1):
+    """Project *scene* to *dest_area* like :meth:`mpop.scene.Scene.project`,
+    but get the resampling tables from *cache*.
+
+    Falls back to the scene's own projection if some channel doesn't have
+    a proper geometry attached to it.
+    """
+    if channels is None:
+        _channels = scene.loaded_channels()
+    else:
+        _channels = set()
+        for chn in channels:
+            try:
+                _channels.add(scene[chn])
+            except KeyError:
+                LOGGER.warning("Channel %s not found, thus not projected.",
+                               str(chn))
+        _channels &= scene.loaded_channels()
+
+    for chn in _channels:
+        if not (hasattr(chn.area, "lons") or hasattr(chn.area, "proj_dict")):
+            LOGGER.debug("Can't use the resampling cache for %s",
+                         str(chn.area))
+            return scene.project(dest_area, channels=channels, mode=mode,
+                                 radius=radius, nprocs=nprocs)
+
+    if isinstance(dest_area, str):
+        dest_area = get_area_def(dest_area)
+    sensor = getattr(scene, "instrument_name", None)
+
+    res = copy.copy(scene)
+    res.area = dest_area
+    res.channels = []
+
+    projectors = {}
+    for chn in sorted(_channels, key=lambda x: x.resolution, reverse=True):
+        if radius is None:
+            if chn.resolution > 0:
+                radius = 5 * chn.resolution
+            else:
+                radius = 10000
+        if id(chn.area) not in projectors:
+            projectors[id(chn.area)] = \
+                cache.get_projector(chn.area, dest_area, mode, radius,
+                                    nprocs=nprocs, sensor=sensor,
+                                    resolution=chn.resolution)
+        res.channels.append(chn.project(projectors[id(chn.area)]))
+
+    try:
+        if res._CompositerClass is not None:
+            res.image = res._CompositerClass(weakref.proxy(res))
+    except AttributeError:
+        pass
+
+    return res
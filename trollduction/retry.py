@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Delayed retries of the messages whose data couldn't be processed.
+
+The messages are held back with an exponential backoff, and handed back
+to the processing loop once due, without blocking it in the meantime.
+"""
+
+import heapq
+import logging
+import time
+from threading import Lock
+
+LOGGER = logging.getLogger(__name__)
+
+
+class RetryQueue(object):
+
+    """Messages waiting to be retried. A message is tried at most
+    *max_attempts* times, waiting *delay* seconds before the first retry,
+    multiplied by *backoff* before each following one, up to *max_delay*.
+    """
+
+    def __init__(self, max_attempts=2, delay=2, backoff=2, max_delay=300):
+        self.max_attempts = max_attempts
+        self.delay = delay
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self._items = []
+        self._count = 0
+        self._lock = Lock()
+        self.counters = {"retried": 0,
+                         "recovered": 0,
+                         "abandoned": 0}
+
+    def get_delay(self, attempt):
+        """Get the delay before retrying after the failure of *attempt*,
+        counted from 1.
+        """
+        return min(self.delay * self.backoff ** (attempt - 1),
+                   self.max_delay)
+
+    def schedule(self, item, attempt):
+        """Schedule *item*, which failed at *attempt*, for a new attempt.
+        Returns False if it has been tried too many times.
+        """
+        with self._lock:
+            if attempt >= self.max_attempts:
+                self.counters["abandoned"] += 1
+                return False
+            self.counters["retried"] += 1
+            self._count += 1
+            heapq.heappush(self._items,
+                           (time.time() + self.get_delay(attempt),
+                            self._count, attempt + 1, item))
+            return True
+
+    def recovered(self):
+        """Count one more item processed after being retried.
+        """
+        with self._lock:
+            self.counters["recovered"] += 1
+
+    def pop_due(self):
+        """Get the (item, attempt) pairs due for a new attempt.
+        """
+        now = time.time()
+        res = []
+        with self._lock:
+            while self._items and self._items[0][0] <= now:
+                _, _, attempt, item = heapq.heappop(self._items)
+                res.append((item, attempt))
+        return res
+
+    def next_due(self):
+        """Get the number of seconds until the next retry, None if there
+        is nothing to retry.
+        """
+        with self._lock:
+            if not self._items:
+                return None
+            return max(self._items[0][0] - time.time(), 0)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def log_counters(self):
+        """Log the number of retried, recovered and abandoned items.
+        """
+        with self._lock:
+            LOGGER.info("Retries: %d retried, %d recovered, %d abandoned, "
+                        "%d waiting", self.counters["retried"],
+                        self.counters["recovered"],
+                        self.counters["abandoned"], len(self._items))
@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Scheduling of the incoming messages.
+
+The scheduler is a drop-in replacement for the queue of the listener,
+which hands out the pending messages by priority instead of in arrival
+order. The priority of a message is the sum of the priority of its
+platform, of its area (for collections) and of its age in hours times the
+age priority, a negative age priority favouring the newest passes. The
+age term is computed from the time of the data alone, so that the
+priorities of messages received at different times can be compared.
+Messages with the same priority come out in arrival order.
+
+Messages older than the maximum age are dropped. When more messages than
+the threshold are pending, the messages older than the maximum age are
+dropped first, then those with the lowest priority are either moved to a
+low priority lane, handled only when nothing else is pending, or dropped.
+"""
+
+import heapq
+import logging
+import Queue
+import time
+from datetime import datetime, timedelta
+from threading import Condition
+
+LOGGER = logging.getLogger(__name__)
+
+# reference of the age term of the priorities
+REFERENCE_TIME = datetime(2000, 1, 1)
+
+
+def parse_priorities(priorities):
+    """Parse a "name:priority,name:priority" string into a dictionary.
+    """
+    res = {}
+    if not priorities:
+        return res
+    for item in priorities.split(","):
+        name, priority = item.rsplit(":", 1)
+        res[name.strip()] = float(priority)
+    return res
+
+
+def get_data_time(msg):
+    """Get the time of the data in *msg*, its start time, or the time the
+    message was sent if the start time is unknown. None if neither is
+    known.
+    """
+    data_time = None
+    if isinstance(msg.data, dict):
+        data_time = (msg.data.get("start_time") or
+                     msg.data.get("nominal_time"))
+    if not isinstance(data_time, datetime):
+        data_time = getattr(msg, "time", None)
+    if not isinstance(data_time, datetime):
+        return None
+    return data_time
+
+
+def get_message_age(msg, now=None):
+    """Get the age of the data in *msg*, see :func:`get_data_time`.
+    """
+    if now is None:
+        now = datetime.utcnow()
+    data_time = get_data_time(msg)
+    if data_time is None:
+        return timedelta(0)
+    return now - data_time
+
+
+class MessageScheduler(object):
+
+    """Priority queue of the messages to process.
+    """
+
+    def __init__(self, platform_priorities=None, area_priorities=None,
+                 age_priority=0, max_age=None, threshold=0,
+                 stale_policy="low"):
+        self.platform_priorities = platform_priorities or {}
+        self.area_priorities = area_priorities or {}
+        self.age_priority = age_priority
+        self.max_age = max_age
+        self.threshold = threshold
+        self.stale_policy = stale_policy
+        self._main = []
+        self._low = []
+        self._count = 0
+        self._cond = Condition()
+        self.counters = {"received": 0,
+                         "dispatched": 0,
+                         "expired": 0,
+                         "demoted": 0,
+                         "dropped": 0}
+
+    def configure(self, config):
+        """Read the scheduling options from the Trollduction *config*.
+        """
+        stale_policy = config.get("scheduler_stale_policy", "low")
+        if stale_policy not in ("low", "drop"):
+            raise ValueError("Unknown scheduler stale policy: " +
+                             str(stale_policy))
+        with self._cond:
+            self.platform_priorities = parse_priorities(
+                config.get("scheduler_platform_priorities"))
+            self.area_priorities = parse_priorities(
+                config.get("scheduler_area_priorities"))
+            self.age_priority = float(config.get("scheduler_age_priority",
+                                                 0))
+            self.threshold = int(config.get("scheduler_queue_threshold", 0))
+            self.stale_policy = stale_policy
+
+    def get_priority(self, msg, now=None):
+        """Get the priority of *msg*, the highest coming out first. The age
+        of the data is counted from a fixed reference instead of *now*,
+        which only shifts all the priorities by the same amount, so that
+        the priority doesn't depend on when it is computed. *now* is used
+        for the messages without a data time.
+        """
+        priority = 0.0
+        if isinstance(msg.data, dict):
+            priority += self.platform_priorities.get(
+                msg.data.get("platform_name"), 0)
+            priority += self.area_priorities.get(
+                msg.data.get("collection_area_id"), 0)
+        data_time = get_data_time(msg)
+        if data_time is None:
+            data_time = now or datetime.utcnow()
+        age = REFERENCE_TIME - data_time
+        return priority + self.age_priority * age.total_seconds() / 3600.
+
+    def put(self, msg, block=True, timeout=None):
+        """Add *msg* to the pending messages. Never blocks, the arguments
+        being there for compatibility with :class:`Queue.Queue`.
+        """
+        del block, timeout
+        with self._cond:
+            self.counters["received"] += 1
+            self._count += 1
+            heapq.heappush(self._main,
+                           (-self.get_priority(msg), self._count, msg))
+            if self.threshold > 0 and len(self._main) > self.threshold:
+                self._expire()
+                while len(self._main) > self.threshold:
+                    self._remove_lowest()
+            self._cond.notify()
+
+    def _expire(self):
+        """Drop the pending messages older than the maximum age.
+        """
+        if self.max_age is None:
+            return
+        now = datetime.utcnow()
+        for lane in (self._main, self._low):
+            fresh = []
+            for item in lane:
+                if get_message_age(item[2], now) > self.max_age:
+                    self.counters["expired"] += 1
+                    LOGGER.info("Message too old, dropping %s",
+                                str(item[2]))
+                else:
+                    fresh.append(item)
+            lane[:] = fresh
+            heapq.heapify(lane)
+
+    def _remove_lowest(self):
+        """Move the lowest priority message of the main lane to the low
+        priority lane, or drop it, depending on the stale policy.
+        """
+        item = max(self._main)
+        self._main.remove(item)
+        heapq.heapify(self._main)
+        if self.stale_policy == "drop":
+            self.counters["dropped"] += 1
+            LOGGER.info("Too many pending messages, dropping %s",
+                        str(item[2]))
+        else:
+            self.counters["demoted"] += 1
+            LOGGER.info("Too many pending messages, delaying %s",
+                        str(item[2]))
+            heapq.heappush(self._low, item)
+
+    def _pop(self):
+        """Pop the next message which isn't too old, None if there is
+        none.
+        """
+        now = datetime.utcnow()
+        for lane in (self._main, self._low):
+            while lane:
+                msg = heapq.heappop(lane)[2]
+                if (self.max_age is not None and
+                        get_message_age(msg, now) > self.max_age):
+                    self.counters["expired"] += 1
+                    LOGGER.info("Message too old, dropping %s", str(msg))
+                    continue
+                self.counters["dispatched"] += 1
+                return msg
+        return None
+
+    def get(self, block=True, timeout=None):
+        """Get the message with the highest priority, like
+        :meth:`Queue.Queue.get`.
+        """
+        end = None
+        if block and timeout is not None:
+            end = time.time() + timeout
+        with self._cond:
+            while True:
+                msg = self._pop()
+                if msg is not None:
+                    return msg
+                if not block:
+                    raise Queue.Empty
+                if end is None:
+                    self._cond.wait(1)
+                else:
+                    remaining = end - time.time()
+                    if remaining <= 0:
+                        raise Queue.Empty
+                    self._cond.wait(remaining)
+
+    def qsize(self):
+        """Get the number of pending messages.
+        """
+        with self._cond:
+            return len(self._main) + len(self._low)
+
+    def empty(self):
+        """Tell if there are no pending messages.
+        """
+        return self.qsize() == 0
+
+    def log_counters(self):
+        """Log the number of messages in each state.
+        """
+        with self._cond:
+            LOGGER.info("Scheduler: %d received, %d dispatched, %d expired, "
+                        "%d delayed, %d dropped, %d pending (%d delayed)",
+                        self.counters["received"],
+                        self.counters["dispatched"],
+                        self.counters["expired"],
+                        self.counters["demoted"],
+                        self.counters["dropped"],
+                        len(self._main) + len(self._low), len(self._low))
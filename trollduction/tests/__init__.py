@@ -31,7 +31,20 @@ from trollduction.tests import (test_helper_functions,
                                 test_xml_read,
                                 test_scisys,
                                 test_trigger,
-                                test_producer)
+                                test_producer,
+                                test_resample_cache,
+                                test_area_geometry,
+                                test_planning,
+                                test_area_grids,
+                                test_pipeline,
+                                test_scheduler,
+                                test_dedupe,
+                                test_retry,
+                                test_product_planner,
+                                test_encoder,
+                                test_transfer,
+                                test_manifest,
+                                test_timing)
 
 
 def suite():
@@ -47,5 +60,18 @@ def suite():
     mysuite.addTests(test_scisys.suite())
     mysuite.addTests(test_trigger.suite())
     mysuite.addTests(test_producer.suite())
+    mysuite.addTests(test_resample_cache.suite())
+    mysuite.addTests(test_area_geometry.suite())
+    mysuite.addTests(test_planning.suite())
+    mysuite.addTests(test_area_grids.suite())
+    mysuite.addTests(test_pipeline.suite())
+    mysuite.addTests(test_scheduler.suite())
+    mysuite.addTests(test_dedupe.suite())
+    mysuite.addTests(test_retry.suite())
+    mysuite.addTests(test_product_planner.suite())
+    mysuite.addTests(test_encoder.suite())
+    mysuite.addTests(test_transfer.suite())
+    mysuite.addTests(test_manifest.suite())
+    mysuite.addTests(test_timing.suite())
 
     return mysuite
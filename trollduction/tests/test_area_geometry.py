@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the area_geometry.py module
+"""
+
+import os
+import tempfile
+import unittest
+
+from trollduction.area_geometry import AreaGeometryCache
+
+AREAS = """REGION: merc1 {
+        NAME:           merc1
+        PCS_ID:         merc1
+        PCS_DEF:        proj=merc, ellps=WGS84, lon_0=15
+        XSIZE:          100
+        YSIZE:          50
+        AREA_EXTENT:    (-1000000, 6000000, 1000000, 7000000)
+};
+
+REGION: merc2 {
+        NAME:           merc2
+        PCS_ID:         merc2
+        PCS_DEF:        proj=merc, ellps=WGS84, lon_0=15
+        XSIZE:          10
+        YSIZE:          10
+        AREA_EXTENT:    (-500000, 6000000, 500000, 7000000)
+};
+"""
+
+
+class TestAreaGeometryCache(unittest.TestCase):
+
+    def setUp(self):
+        fd_, self.area_file = tempfile.mkstemp(suffix=".cfg")
+        with os.fdopen(fd_, "w") as fd_:
+            fd_.write(AREAS)
+        self.cache = AreaGeometryCache(max_size=3, area_file=self.area_file)
+
+    def tearDown(self):
+        os.remove(self.area_file)
+
+    def test_area_def(self):
+        area = self.cache.get_area_def("merc1")
+        self.assertEqual(area.x_size, 100)
+        self.assertTrue(self.cache.get_area_def("merc1") is area)
+        self.assertTrue(self.cache.get_area_def(area) is area)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_lru(self):
+        merc1 = self.cache.get_area_def("merc1")
+        merc2 = self.cache.get_area_def("merc2")
+        self.cache.get_contour_poly("merc2")
+        self.cache.get_area_def("merc1")
+        # evicts merc2, the least recently used
+        self.cache.get_extent_ll("merc1")
+        self.assertTrue(self.cache.get_area_def("merc1") is merc1)
+        self.assertFalse(self.cache.get_area_def("merc2") is merc2)
+
+    def test_extent_ll(self):
+        left, down, right, up = self.cache.get_extent_ll("merc1")
+        self.assertAlmostEqual(left + right, 30, 5)
+        self.assertTrue(down < up)
+        poi = self.cache.get_area_of_interest("merc1")
+        self.assertEqual(poi.area_id, "merc1")
+        self.assertTrue(poi.poly is self.cache.get_contour_poly("merc1",
+                                                                500))
+
+    def test_area_file_changed(self):
+        area = self.cache.get_area_def("merc1")
+        stat = os.stat(self.area_file)
+        os.utime(self.area_file, (stat.st_atime, stat.st_mtime + 10))
+        self.assertFalse(self.cache.get_area_def("merc1") is area)
+
+
+def suite():
+    """The suite for test_area_geometry
+    """
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestAreaGeometryCache))
+
+    return mysuite
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the area_grids.py module
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from pyresample.geometry import AreaDefinition
+
+from trollduction import area_grids
+from trollduction.area_grids import AreaGridCache, find_nearest_pixel
+
+
+class TestAreaGridCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.area = AreaDefinition("euron1", "euron1", "stere",
+                                   {"proj": "stere", "lat_0": "90",
+                                    "lon_0": "15", "lat_ts": "60",
+                                    "ellps": "WGS84"},
+                                   200, 150,
+                                   (-1000000, -4500000, 1000000, -3000000))
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_find_nearest_pixel(self):
+        lons, lats = self.area.get_lonlats()
+        dists = (lons - 25) ** 2 + (lats - 60) ** 2
+        expected = np.unravel_index(np.argmin(dists), dists.shape)
+        block_lines = area_grids.BLOCK_LINES
+        area_grids.BLOCK_LINES = 7
+        try:
+            self.assertEqual(find_nearest_pixel(lons, lats, 25, 60),
+                             expected)
+        finally:
+            area_grids.BLOCK_LINES = block_lines
+
+    def test_cache(self):
+        cache = AreaGridCache(self.cache_dir)
+        lons, lats = cache.get_lonlats(self.area)
+        self.assertFalse(isinstance(lons, np.memmap))
+        lons, lats = cache.get_lonlats(self.area)
+        self.assertTrue(isinstance(lons, np.memmap))
+        np.testing.assert_allclose(lons, self.area.get_lonlats()[0])
+
+        pixel = cache.get_nearest_pixel(self.area, 25, 60)
+        self.assertEqual(pixel, find_nearest_pixel(lons, lats, 25, 60))
+        # read back from the disk
+        cache = AreaGridCache(self.cache_dir)
+        self.assertEqual(cache.get_nearest_pixel(self.area, 25, 60), pixel)
+        files = os.listdir(os.path.join(self.cache_dir,
+                                        os.listdir(self.cache_dir)[0]))
+        self.assertEqual(sorted(files),
+                         ["lats.npy", "lons.npy", "nearest_25.0_60.0.npy"])
+
+    def test_no_cache_dir(self):
+        cache = AreaGridCache()
+        pixel = cache.get_nearest_pixel(self.area, 25, 60)
+        lons, lats = self.area.get_lonlats()
+        self.assertEqual(pixel, find_nearest_pixel(lons, lats, 25, 60))
+
+
+def suite():
+    """The suite for test_area_grids
+    """
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestAreaGridCache))
+
+    return mysuite
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the dedupe.py module
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+from mock import patch
+
+from trollduction.dedupe import DedupeIndex, get_pass_key
+
+
+class TestDedupeIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp_dir, "dedupe")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_get_pass_key(self):
+        mda = {"platform_name": "NOAA 19",
+               "orbit_number": 12345,
+               "start_time": datetime(2016, 1, 1, 12, 0)}
+        self.assertEqual(get_pass_key(mda, "hrpt.xml"),
+                         "NOAA 19|12345|2016-01-01 12:00:00|hrpt.xml")
+        self.assertNotEqual(get_pass_key(mda, "hrpt.xml"),
+                            get_pass_key(mda, "other.xml"))
+        self.assertTrue(get_pass_key({"platform_name": "NOAA 19"},
+                                     "hrpt.xml") is None)
+
+    def test_add(self):
+        index = DedupeIndex()
+        self.assertTrue(index.add("a"))
+        self.assertTrue(index.add("b"))
+        self.assertFalse(index.add("a"))
+        index.remove("a")
+        self.assertTrue(index.add("a"))
+
+    def test_start(self):
+        index = DedupeIndex(self.filename)
+        self.assertTrue(index.start("a"))
+        self.assertFalse(index.start("a"))
+        self.assertFalse("a" in index)
+        # the passes being processed aren't stored
+        index.close()
+        index = DedupeIndex(self.filename)
+        self.assertTrue(index.start("a"))
+        index.done("a")
+        self.assertTrue("a" in index)
+        self.assertFalse(index.start("a"))
+        self.assertTrue(index.start("b"))
+        index.remove("b")
+        self.assertTrue(index.start("b"))
+        index.close()
+        index = DedupeIndex(self.filename)
+        self.assertFalse(index.start("a"))
+        self.assertTrue(index.start("b"))
+        index.close()
+
+    @patch("trollduction.dedupe.time.time")
+    def test_expiry(self, time_):
+        time_.return_value = 1000.
+        index = DedupeIndex(expiry=100)
+        index.add("a")
+        time_.return_value = 1050.
+        index.add("b")
+        self.assertFalse(index.add("a"))
+        time_.return_value = 1120.
+        self.assertFalse("a" in index)
+        self.assertTrue("b" in index)
+        index.expire()
+        self.assertEqual(len(index), 1)
+        self.assertTrue(index.add("a"))
+
+    def test_persistence(self):
+        index = DedupeIndex(self.filename)
+        index.add("a")
+        index.add("b")
+        index.remove("b")
+        index.close()
+        index = DedupeIndex(self.filename)
+        self.assertTrue("a" in index)
+        self.assertFalse(index.add("a"))
+        self.assertTrue(index.add("b"))
+        index.close()
+
+
+def suite():
+    """The suite for test_dedupe
+    """
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestDedupeIndex))
+
+    return mysuite
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the encoder.py module
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from mpop.imageo.image import Image
+from PIL import Image as Pil
+
+from trollduction.encoder import (EncoderPool, load_image, make_thumbnail,
+                                  share_image)
+
+
+def make_image():
+    """Make a small RGB image with masked pixels."""
+    data = np.ma.array(np.linspace(0, 1, 40 * 60).reshape((40, 60)),
+                       mask=np.zeros((40, 60), dtype=bool))
+    data.mask[:5, :] = True
+    return Image((data, data[::-1], 1 - data), mode="RGB",
+                 fill_value=(0, 0, 0))
+
+
+class TestEncoder(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_share_image(self):
+        img = make_image()
+        shared_dir, shared = share_image(img, self.tmp_dir)
+        copy = load_image(shared)
+        self.assertEqual(copy.mode, "RGB")
+        self.assertEqual(len(copy.channels), 3)
+        for chn, orig in zip(copy.channels, img.channels):
+            np.testing.assert_array_equal(chn.data, orig.data)
+            np.testing.assert_array_equal(chn.mask, orig.mask)
+        self.assertTrue(os.path.dirname(shared_dir) == self.tmp_dir)
+        self.assertTrue(share_image("not an image", self.tmp_dir) is None)
+
+    def test_encode(self):
+        img = make_image()
+        filename = os.path.join(self.tmp_dir, "img.png")
+        thname = os.path.join(self.tmp_dir, "thumb.png")
+        reference = os.path.join(self.tmp_dir, "reference.png")
+        img.save(reference)
+        pool = EncoderPool(2, self.tmp_dir)
+        try:
+            self.assertTrue(pool.encode(img, filename, "png",
+                                        thumbnail=(thname, (30, 30))))
+        finally:
+            pool.close()
+        self.assertEqual(list(Pil.open(filename).getdata()),
+                         list(Pil.open(reference).getdata()))
+        self.assertEqual(Pil.open(thname).size, (30, 20))
+        # the shared channels are removed
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)),
+                         ["img.png", "reference.png", "thumb.png"])
+
+    def test_make_thumbnail(self):
+        thname = os.path.join(self.tmp_dir, "thumb.png")
+        make_thumbnail(make_image(), thname, (15, 15), "png")
+        self.assertEqual(Pil.open(thname).size, (15, 10))
+
+
+def suite():
+    """The suite for test_encoder
+    """
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestEncoder))
+
+    return mysuite
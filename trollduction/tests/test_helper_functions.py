@@ -24,8 +24,12 @@
 """
 
 import unittest
-from trollduction.helper_functions import overlapping_timeinterval
+from trollduction.helper_functions import (overlapping_timeinterval,
+                                           get_lonlats_at,
+                                           get_area_boundaries)
 from datetime import datetime, timedelta
+import numpy as np
+from pyresample.geometry import AreaDefinition, SwathDefinition
 
 
 class TestTimeUtilities(unittest.TestCase):
@@ -74,12 +78,87 @@ class TestTimeUtilities(unittest.TestCase):
         pass
 
 
+class TestAreaUtilities(unittest.TestCase):
+
+    def setUp(self):
+        self.area = AreaDefinition("mali_area", "mali_area", "merc",
+                                   {"proj": "merc",
+                                    "ellps": "WGS84",
+                                    "lon_0": "-1.0",
+                                    "lat_0": "19.0"},
+                                   1024, 1024,
+                                   (-1224514.3987260093, 1111475.1028522244,
+                                    1224514.3987260093, 3228918.5790461157))
+        self.ll_area = AreaDefinition("europe_ll", "europe_ll", "europe_ll",
+                                      {"proj": "latlong",
+                                       "ellps": "WGS84"},
+                                      100, 100, (0, 40, 30, 70))
+        self.global_area = AreaDefinition("global", "global", "global",
+                                          {"proj": "latlong",
+                                           "ellps": "WGS84"},
+                                          360, 170, (-180, -85, 180, 85))
+
+    def test_get_lonlats_at(self):
+        rows = [0, 10, 1023, 512]
+        cols = [0, 1023, 5, 512]
+        lons, lats = get_lonlats_at(self.area, rows, cols)
+        for i in range(len(rows)):
+            lon, lat = self.area.get_lonlat(rows[i], cols[i])
+            self.assertAlmostEqual(lons[i], lon)
+            self.assertAlmostEqual(lats[i], lat)
+
+        swath_lons, swath_lats = np.meshgrid(np.arange(10.),
+                                             np.arange(20., 25.))
+        swath = SwathDefinition(swath_lons, swath_lats)
+        lons, lats = get_lonlats_at(swath, [1, 4], [2, 9])
+        np.testing.assert_array_equal(lons, [2., 9.])
+        np.testing.assert_array_equal(lats, [21., 24.])
+
+    def test_get_lonlats_at_latlong(self):
+        rows = [0, 50, 99, 10]
+        cols = [0, 50, 3, 99]
+        lons, lats = get_lonlats_at(self.ll_area, rows, cols)
+        for i in range(len(rows)):
+            lon, lat = self.ll_area.get_lonlat(rows[i], cols[i])
+            self.assertAlmostEqual(lons[i], lon)
+            self.assertAlmostEqual(lats[i], lat)
+        self.assertAlmostEqual(lons[1], 15.15)
+        self.assertAlmostEqual(lats[1], 54.85)
+
+    def check_area_boundaries(self, area, step):
+        """Check the boundaries of *area* against the coordinates of its
+        pixels, every *step* pixel.
+        """
+        lons, lats = get_area_boundaries(area)
+        x_size, y_size = area.x_size, area.y_size
+        sides = {"side1": [(0, i) for i in range(x_size)],
+                 "side2": [(i, x_size - 1) for i in range(y_size)],
+                 "side3": [(y_size - 1, i) for i in range(x_size)],
+                 "side4": [(i, 0) for i in range(y_size)]}
+        for side, positions in sides.items():
+            self.assertEqual(len(getattr(lons, side)), len(positions))
+            for i in range(0, len(positions), step):
+                lon, lat = area.get_lonlat(*positions[i])
+                self.assertAlmostEqual(getattr(lons, side)[i], lon)
+                self.assertAlmostEqual(getattr(lats, side)[i], lat)
+
+    def test_get_area_boundaries(self):
+        self.check_area_boundaries(self.area, 100)
+
+    def test_get_area_boundaries_latlong(self):
+        self.check_area_boundaries(self.ll_area, 7)
+        self.check_area_boundaries(self.global_area, 10)
+        lons, lats = get_area_boundaries(self.global_area)
+        self.assertTrue(np.all(np.abs(lats.side1) <= 85))
+
+
 def suite():
     """The suite for test_trollduction
     """
     loader = unittest.TestLoader()
     mysuite = unittest.TestSuite()
     mysuite.addTest(loader.loadTestsFromTestCase(TestTimeUtilities))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestAreaUtilities))
 
     return mysuite
 
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the manifest.py module
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime
+
+from mock import patch
+
+from trollduction.manifest import OutputManifest, get_scene_id
+
+
+class TestOutputManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp_dir, "image.png")
+        with open(self.filename, "w") as fd_:
+            fd_.write("data")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_get_scene_id(self):
+        mda = {"platform_name": "NOAA 19", "orbit_number": 12345,
+               "start_time": datetime(2016, 1, 1, 12, 0)}
+        scene_id = get_scene_id(mda)
+        self.assertTrue(scene_id.startswith(
+            "NOAA 19|12345|2016-01-01 12:00:00|None|"))
+        del mda["start_time"]
+        self.assertTrue(get_scene_id(mda) is None)
+        mda["time"] = datetime(2016, 1, 1, 12, 0)
+        self.assertEqual(get_scene_id(mda), scene_id)
+        self.assertTrue(get_scene_id({}) is None)
+
+    def test_get_scene_id_resent(self):
+        mda = {"platform_name": "NOAA 19", "orbit_number": 12345,
+               "start_time": datetime(2016, 1, 1, 12, 0),
+               "end_time": datetime(2016, 1, 1, 12, 5),
+               "dataset": [{"uri": "/data/a"}, {"uri": "/data/b"}]}
+        scene_id = get_scene_id(mda)
+        reordered = dict(mda, dataset=[{"uri": "/data/b"},
+                                       {"uri": "/data/a"}])
+        self.assertEqual(get_scene_id(reordered), scene_id)
+        # the same pass with more data
+        longer = dict(mda, dataset=mda["dataset"] + [{"uri": "/data/c"}])
+        self.assertNotEqual(get_scene_id(longer), scene_id)
+        longer = dict(mda, end_time=datetime(2016, 1, 1, 12, 10))
+        self.assertNotEqual(get_scene_id(longer), scene_id)
+        collection = {"platform_name": "NOAA 19", "orbit_number": 12345,
+                      "start_time": datetime(2016, 1, 1, 12, 0),
+                      "end_time": datetime(2016, 1, 1, 12, 5),
+                      "collection": [{"dataset": [{"uri": "/data/a"}]},
+                                     {"dataset": [{"uri": "/data/b"}]}]}
+        self.assertEqual(get_scene_id(collection), scene_id)
+
+    def test_is_complete(self):
+        manifest = OutputManifest()
+        self.assertFalse(manifest.is_complete(self.filename, "scene1"))
+        manifest.record(self.filename, "scene1")
+        self.assertTrue(manifest.is_complete(self.filename, "scene1"))
+        self.assertFalse(manifest.is_complete(self.filename, "scene2"))
+        self.assertFalse(manifest.is_complete(self.filename, None))
+
+        # modified since recorded
+        with open(self.filename, "a") as fd_:
+            fd_.write("more data")
+        self.assertFalse(manifest.is_complete(self.filename, "scene1"))
+
+        # removed since recorded
+        manifest.record(self.filename, "scene1")
+        os.remove(self.filename)
+        self.assertFalse(manifest.is_complete(self.filename, "scene1"))
+        self.assertFalse(self.filename in manifest)
+
+        manifest.record(self.filename, "scene1")
+        self.assertEqual(len(manifest), 0)
+
+    def test_persistent(self):
+        manifest_file = os.path.join(self.tmp_dir, "manifest")
+        manifest = OutputManifest(manifest_file)
+        manifest.record(self.filename, "scene1")
+        manifest.record(unicode(self.filename + "2"), "scene1")
+        manifest.close()
+        self.assertFalse(manifest.is_complete(self.filename, "scene1"))
+
+        manifest = OutputManifest(manifest_file)
+        self.assertTrue(manifest.is_complete(self.filename, "scene1"))
+        self.assertEqual(len(manifest), 1)
+        manifest.remove(self.filename)
+        self.assertFalse(manifest.is_complete(self.filename, "scene1"))
+        manifest.close()
+
+    def test_batched_commits(self):
+        manifest_file = os.path.join(self.tmp_dir, "manifest")
+        manifest = OutputManifest(manifest_file, commit_records=2,
+                                  commit_interval=3600)
+        other = OutputManifest(manifest_file)
+        manifest.record(self.filename, "scene1")
+        self.assertFalse(self.filename in other)
+        manifest.record(self.filename, "scene2")
+        self.assertTrue(other.is_complete(self.filename, "scene2"))
+        manifest.remove(self.filename)
+        self.assertTrue(self.filename in other)
+        manifest.close()
+        self.assertFalse(self.filename in other)
+        other.close()
+
+    def test_expire(self):
+        manifest_file = os.path.join(self.tmp_dir, "manifest")
+        manifest = OutputManifest(manifest_file, expiry=3600)
+        now = time.time()
+        manifest.record(self.filename, "scene1")
+        with patch("trollduction.manifest.time.time") as time_mock:
+            time_mock.return_value = now + 1800
+            manifest.expire()
+            self.assertTrue(manifest.is_complete(self.filename, "scene1"))
+            time_mock.return_value = now + 7200
+            manifest.expire()
+            self.assertFalse(self.filename in manifest)
+        manifest.close()
+
+        manifest = OutputManifest(manifest_file)
+        self.assertEqual(len(manifest), 0)
+        manifest.close()
+
+
+def suite():
+    """The suite for test_manifest
+    """
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestOutputManifest))
+
+    return mysuite
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the pipeline.py module
+"""
+
+import Queue
+import time
+import unittest
+from threading import Event
+
+from trollduction.pipeline import Stage
+
+
+class TestStage(unittest.TestCase):
+
+    def test_pipeline(self):
+        queues = [Queue.Queue(1) for _ in range(2)]
+        done = []
+        first = Stage("double", lambda item: item * 2, queues[0], queues[1])
+        second = Stage("collect", done.append, queues[1])
+        first.start()
+        second.start()
+        try:
+            for item in range(5):
+                queues[0].put(item)
+            queues[0].join()
+            queues[1].join()
+        finally:
+            first.stop()
+            second.stop()
+            first.join()
+            second.join()
+        self.assertEqual(done, [0, 2, 4, 6, 8])
+        self.assertEqual(first.get_stats()["items"], 5)
+        self.assertEqual(second.get_stats()["items"], 5)
+
+    def test_reject(self):
+        """The items which can't be passed on when stopping are rejected."""
+        queues = [Queue.Queue(1) for _ in range(2)]
+        queues[1].put("waiting")
+        rejected = []
+        stage = Stage("first", lambda item: item, queues[0], queues[1],
+                      on_reject=rejected.append)
+        stage.start()
+        try:
+            queues[0].put("item")
+            time.sleep(0.2)
+            self.assertEqual(rejected, [])
+        finally:
+            stage.stop()
+            stage.join()
+        self.assertEqual(rejected, ["item"])
+        self.assertEqual(queues[1].get(), "waiting")
+
+    def test_overlap(self):
+        """The first stage goes on with the next item while the second one
+        is busy."""
+        queues = [Queue.Queue(1) for _ in range(2)]
+        release = Event()
+        first = Stage("first", lambda item: item, queues[0], queues[1])
+        second = Stage("second", lambda item: release.wait(), queues[1])
+        first.start()
+        second.start()
+        try:
+            for item in range(3):
+                queues[0].put(item)
+            # one item in the second stage, one waiting for it, one in
+            # the first stage waiting for room
+            time.sleep(0.2)
+            self.assertEqual(first.get_stats()["items"], 3)
+            self.assertTrue(first.get_stats()["occupancy"] < 0.5)
+            release.set()
+            queues[0].join()
+            queues[1].join()
+        finally:
+            release.set()
+            first.stop()
+            second.stop()
+            first.join()
+            second.join()
+        stats = second.get_stats()
+        self.assertEqual(stats["items"], 3)
+        self.assertTrue(first.get_stats()["blocked_time"] > 0)
+
+
+def suite():
+    """The suite for test_pipeline
+    """
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestStage))
+
+    return mysuite
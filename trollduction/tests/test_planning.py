@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the planning.py module
+"""
+
+import unittest
+
+from trollduction.planning import ChannelLoadPlan
+
+
+class TestChannelLoadPlan(unittest.TestCase):
+
+    def test_plan(self):
+        groups = [("a", set(["1", "2"]), False),
+                  ("b", set(["4"]), False),
+                  ("c", set(["2", "3"]), False)]
+        plan = ChannelLoadPlan(groups)
+        self.assertTrue(plan.planned)
+        self.assertEqual([key for key, _, _ in plan.steps], ["a", "c", "b"])
+        self.assertEqual([unload for _, _, unload in plan.steps],
+                         [set(["1"]), set(["2", "3"]), set(["4"])])
+        self.assertEqual(plan.get_peak(), 2)
+        self.assertEqual(plan.get_peak({"1": 10, "2": 10, "3": 10, "4": 5}),
+                         20)
+        self.assertEqual(plan.channels, set(["1", "2", "3", "4"]))
+
+    def test_keep_order(self):
+        groups = [("a", set(["1", "2"]), False),
+                  ("b", set(["4"]), False),
+                  ("c", set(["2", "3"]), False)]
+        plan = ChannelLoadPlan(groups, reorder=False)
+        self.assertTrue(plan.planned)
+        self.assertEqual([key for key, _, _ in plan.steps], ["a", "b", "c"])
+        self.assertEqual([unload for _, _, unload in plan.steps],
+                         [set(["1"]), set(["4"]), set(["2", "3"])])
+        self.assertEqual(plan.get_peak(), 2)
+
+    def test_unload_groups(self):
+        groups = [("a", set(["1", "2"]), True),
+                  ("b", set(["2", "3"]), False),
+                  ("c", set(["3"]), False)]
+        plan = ChannelLoadPlan(groups)
+        self.assertEqual([key for key, _, _ in plan.steps], ["a", "b", "c"])
+        self.assertEqual(plan.get_peak(), 2)
+
+    def test_all_channels(self):
+        groups = [("a", set(["1", "2"]), False),
+                  ("b", None, False),
+                  ("c", set(["1"]), False)]
+        plan = ChannelLoadPlan(groups)
+        self.assertFalse(plan.planned)
+        self.assertEqual([key for key, _, _ in plan.steps], ["a", "b", "c"])
+        self.assertEqual([unload for _, _, unload in plan.steps],
+                         [set(), set(), set()])
+        plan = ChannelLoadPlan(groups[::2], planned=False)
+        self.assertFalse(plan.planned)
+
+
+def suite():
+    """The suite for test_planning
+    """
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestChannelLoadPlan))
+
+    return mysuite
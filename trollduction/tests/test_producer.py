@@ -25,11 +25,28 @@
 
 
 from trollduction.producer import coverage, get_polygons_positions
-from trollduction.producer import check_uri
+from trollduction.producer import check_uri, DataProcessor, CoverageEngine
+from trollduction.producer import DataWriter, SpilledProduct, crop_scene
+from trollduction.producer import MemoryBudget, estimate_memory
+from trollduction.producer import TimeBudget, TimeBudgetExceeded
+from trollduction.producer import Trollduction
+from trollduction.manifest import OutputManifest, get_scene_id
 import numpy as np
 import unittest
-from mock import MagicMock
-from pyresample.geometry import AreaDefinition
+import xml.etree.ElementTree as ET
+from datetime import datetime
+import time
+import os
+import shutil
+import tempfile
+from threading import Thread
+from threading import Lock
+from mock import MagicMock, patch
+from pyresample.geometry import AreaDefinition, SwathDefinition
+from pyresample.kd_tree import resample_nearest
+from trollsched.boundary import AreaDefBoundary
+from trollduction.area_geometry import AREA_CACHE
+from mpop.channel import Channel
 
 
 class TestPolygonCoverage(unittest.TestCase):
@@ -65,6 +82,12 @@ class TestPolygonCoverage(unittest.TestCase):
         self.assertEquals(get_polygons_positions((data, ), frequency=25),
                           [])
 
+        data = np.ma.array(np.arange(12).reshape(3, 4))
+
+        self.assertEquals(get_polygons_positions((data, )),
+                          [[(2, 0), (1, 0), (0, 0),
+                            (0, 3), (1, 3), (2, 3)]])
+
     def test_coverage(self):
 
         chn = MagicMock()
@@ -130,6 +153,114 @@ class TestPolygonCoverage(unittest.TestCase):
         self.assertEquals(0.44009280754700542, coverage(scene, mali))
 
 
+class TestCoverageEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.mali = AreaDefinition("mali", "mali", "merc",
+                                   {"proj": "merc", "ellps": "WGS84",
+                                    "lon_0": "-1.0", "lat_0": "19.0"},
+                                   1024, 1024,
+                                   (-1224514.3987260093, 1111475.1028522244,
+                                    1224514.3987260093, 3228918.5790461157))
+        self.west = AreaDefinition("west", "west", "merc",
+                                   {"proj": "merc", "ellps": "WGS84",
+                                    "lon_0": "-1.0", "lat_0": "19.0"},
+                                   1024, 1024,
+                                   (-1224514.3987260093, 1111475.1028522244,
+                                    0, 3228918.5790461157))
+        swath_area = AreaDefinition("swath", "swath", "merc",
+                                    {"proj": "merc", "ellps": "WGS84",
+                                     "lon_0": "-1.0", "lat_0": "19.0"},
+                                    100, 100,
+                                    (-3000000, 1000000, 0, 3500000))
+        self.swath_poly = AreaDefBoundary(swath_area,
+                                          frequency=10).contour_poly
+        self.items = []
+        for area_id in ["mali", "west"]:
+            area_item = MagicMock()
+            area_item.attrib = {'id': area_id, 'name': area_id,
+                                'min_coverage': '60'}
+            self.items.append(area_item)
+        AREA_CACHE.invalidate()
+
+    def tearDown(self):
+        AREA_CACHE.invalidate()
+
+    @patch('trollduction.area_geometry.projector.get_area_def')
+    def test_overpass(self, get_area_def):
+        get_area_def.side_effect = lambda area_id: getattr(self, area_id)
+        scene = MagicMock()
+        scene.overpass.boundary.contour_poly = self.swath_poly
+
+        engine = CoverageEngine()
+        coverages = engine.get_coverages(scene, self.items)
+        self.assertAlmostEqual(coverages['west'], 1, 1)
+        self.assertAlmostEqual(coverages['mali'], 0.5, 1)
+        self.assertTrue(engine.covers(scene, self.items[1]))
+        self.assertFalse(engine.covers(scene, self.items[0]))
+
+        scene.overpass = None
+        self.assertTrue(engine.covers(scene, self.items[0]))
+
+    @patch('trollduction.producer.get_swath_polys')
+    @patch('trollduction.area_geometry.projector.get_area_def')
+    def test_generic(self, get_area_def, get_swath_polys):
+        get_area_def.side_effect = lambda area_id: getattr(self, area_id)
+        get_swath_polys.return_value = [[self.swath_poly]]
+        scene = MagicMock()
+        scene.channels = []
+
+        engine = CoverageEngine()
+        self.assertFalse(engine.covers(scene, self.items[0], generic=True))
+        self.assertTrue(engine.covers(scene, self.items[1], generic=True))
+        self.assertFalse(engine.covers(scene, self.items[0], generic=True))
+        self.assertEqual(get_swath_polys.call_count, 1)
+
+        # new scene
+        engine.covers(MagicMock(), self.items[0], generic=True)
+        self.assertEqual(get_swath_polys.call_count, 2)
+
+
+class TestCropScene(unittest.TestCase):
+
+    def setUp(self):
+        lons, lats = np.meshgrid(np.linspace(-10, 30, 200),
+                                 np.linspace(80, 30, 1000))
+        self.swath = SwathDefinition(lons, lats)
+        self.chn = Channel(name="1", resolution=1000,
+                           wavelength_range=(0.5, 0.6, 0.7),
+                           data=np.ma.array(np.arange(200000.).reshape(1000,
+                                                                       200)))
+        self.chn.area = self.swath
+        self.scene = MagicMock()
+        self.scene.channels = [self.chn]
+        self.area = AreaDefinition("small", "small", "merc",
+                                   {"proj": "merc", "ellps": "WGS84",
+                                    "lon_0": "10.0"},
+                                   100, 100,
+                                   (-200000, 7000000, 200000, 7400000))
+
+    def test_crop_scene(self):
+        res = crop_scene(self.scene, [self.area], radius=50000)
+        cropped = res.channels[0]
+        self.assertTrue(cropped.shape[0] < 100)
+        self.assertTrue(cropped.shape[1] < 100)
+        self.assertEqual(cropped.area.lons.shape, cropped.shape)
+        self.assertEqual(self.chn.shape, (1000, 200))
+        full = resample_nearest(self.swath, self.chn.data, self.area, 50000)
+        local = resample_nearest(cropped.area, cropped.data, self.area,
+                                 50000)
+        np.testing.assert_array_equal(full, local)
+
+    def test_no_overlap(self):
+        area = AreaDefinition("south", "south", "merc",
+                              {"proj": "merc", "ellps": "WGS84",
+                               "lon_0": "10.0"},
+                              100, 100,
+                              (-200000, -2000000, 200000, -1600000))
+        self.assertTrue(crop_scene(self.scene, [area]) is None)
+
+
 class TestCheckUri(unittest.TestCase):
 
     def test_check_uri(self):
@@ -144,12 +275,421 @@ class TestCheckUri(unittest.TestCase):
             retv, "/san1/pps/import/PPS_data/source/metop01_20151016_1007_15964/hrpt_metop01_20151016_1007_15964.l1b")
 
 
+class TestDataProcessor(unittest.TestCase):
+
+    @patch('trollduction.producer.DataWriter')
+    def test_process_areas_in_parallel(self, writer):
+        dproc = DataProcessor()
+        dproc.global_data = MagicMock()
+        lock = Lock()
+        running = [0]
+        max_running = [0]
+        drawn = []
+        projected = []
+
+        def draw_images(area_item, local_data):
+            with lock:
+                running[0] += 1
+                max_running[0] = max(max_running[0], running[0])
+            time.sleep(.05)
+            with lock:
+                running[0] -= 1
+                drawn.append(area_item.attrib['id'])
+
+        def project(*args, **kwargs):
+            with lock:
+                projected.append(args[0])
+            return MagicMock()
+
+        dproc.draw_images = draw_images
+        dproc.global_data.project = project
+        areas = []
+        for i in range(6):
+            area_item = MagicMock()
+            area_item.attrib = {'id': 'area%d' % i, 'name': 'area%d' % i}
+            areas.append(area_item)
+
+        dproc.process_areas_in_parallel(areas, 4, 2, mode="nearest")
+        self.assertEqual(sorted(drawn), ['area%d' % i for i in range(6)])
+        self.assertEqual(max_running[0], 2)
+        self.assertEqual(len(projected), 6)
+
+
+class TestPipelineStep(unittest.TestCase):
+
+    def setUp(self):
+        self.trollduction = Trollduction.__new__(Trollduction)
+        self.trollduction.data_processors = [MagicMock()]
+        self.trollduction.worker_status = [{"state": "busy"}]
+        self.trollduction._status_lock = Lock()
+        self.trollduction.stages = []
+        self.trollduction._release = MagicMock()
+        self.trollduction._forget_pass = MagicMock()
+        self.trollduction._processed = MagicMock()
+        self.job = {"num": 0, "product_config": None, "msg": MagicMock(),
+                    "pass_key": "key", "size": 10, "attempt": 1}
+
+    def test_step(self):
+        self.assertTrue(self.trollduction._pipeline_step("load", self.job)
+                        is self.job)
+        self.assertFalse(self.trollduction._release.called)
+        self.assertTrue(self.trollduction._pipeline_step("write",
+                                                         self.job) is None)
+        self.trollduction._release.assert_called_once_with(0, 10)
+        self.trollduction._processed.assert_called_once_with("key", 1)
+
+    def test_release_on_failure(self):
+        # failing before the processing
+        self.trollduction.worker_status = []
+        self.assertTrue(self.trollduction._pipeline_step("load",
+                                                         self.job) is None)
+        self.trollduction._release.assert_called_once_with(0, 10)
+        self.trollduction._forget_pass.assert_called_once_with("key")
+
+    def test_rejected(self):
+        self.trollduction._pipeline_rejected(self.job)
+        self.trollduction._release.assert_called_once_with(0, 10)
+        self.trollduction._forget_pass.assert_called_once_with("key")
+
+
+class TestTimeBudget(unittest.TestCase):
+
+    def test_check(self):
+        budget = TimeBudget("overview")
+        time.sleep(.01)
+        self.assertFalse(budget.exceeded())
+        budget.check()
+        budget = TimeBudget("overview", .01)
+        self.assertFalse(budget.exceeded())
+        time.sleep(.02)
+        self.assertTrue(budget.exceeded())
+        self.assertRaises(TimeBudgetExceeded, budget.check)
+
+    @patch('trollduction.producer.DataWriter')
+    def test_cancel_products(self, writer):
+        dproc = DataProcessor()
+        dproc.product_config = MagicMock()
+        dproc.product_config.attrib = {"product_time_budget": "0.05"}
+        dproc.product_config.aliases = {}
+        dproc.global_data = MagicMock()
+        dproc.global_data.info = {}
+        area = ET.fromstring('<area id="euron1" name="euron1">'
+                             '<product id="slow" name="slow"/>'
+                             '<product id="fast" name="fast"/>'
+                             '<product id="long" name="long" '
+                             'time_budget="1"/></area>')
+
+        def slow():
+            time.sleep(.1)
+            return MagicMock()
+
+        local_data = MagicMock()
+        local_data.image.slow = slow
+        local_data.image.long = slow
+        # the finished composites are saved
+        dproc.draw_images(area, local_data)
+        written = [call[0][1].attrib['id']
+                   for call in dproc.writer.write.call_args_list]
+        self.assertEqual(written, ["slow", "fast", "long"])
+        self.assertEqual(dproc._cancelled, 0)
+        self.assertEqual(sorted(prod for _, _, prod in dproc._product_times),
+                         ["fast", "long", "slow"])
+
+        # the area budget cancels the products left
+        dproc.writer.write.reset_mock()
+        area.attrib["time_budget"] = "0.05"
+        dproc.draw_images(area, local_data)
+        written = [call[0][1].attrib['id']
+                   for call in dproc.writer.write.call_args_list]
+        self.assertEqual(written, ["slow"])
+        self.assertEqual(dproc._cancelled, 2)
+        dproc.log_product_times()
+        self.assertEqual(dproc._product_times, [])
+
+    @patch('trollduction.producer.DataWriter')
+    def test_cancel_before_composite(self, writer):
+        dproc = DataProcessor()
+        dproc.product_config = MagicMock()
+        dproc.product_config.attrib = {}
+        dproc.product_config.aliases = {}
+        dproc.global_data = MagicMock()
+        dproc.global_data.info = {}
+        area = ET.fromstring('<area id="euron1" name="euron1"/>')
+        product = ET.fromstring('<product id="slow" name="slow"/>')
+        local_data = MagicMock()
+        intermediates = MagicMock()
+        budget = TimeBudget("slow", .01)
+        time.sleep(.02)
+        self.assertRaises(TimeBudgetExceeded, dproc._draw_image, area,
+                          product, {}, local_data, intermediates, set(),
+                          budget)
+        self.assertFalse(local_data.image.slow.called)
+        self.assertFalse(intermediates.provide.called)
+        self.assertFalse(dproc.writer.write.called)
+
+
+class TestPlanArea(unittest.TestCase):
+
+    area = """<area id="euron1" name="euron1">
+                <product id="overview" name="overview"
+                         sunzen_day_maximum="90" sunzen_lonlat="25, 60" />
+                <product id="night_fog" name="night_fog"
+                         sunzen_night_minimum="90" sunzen_xy_loc="10, 10" />
+                <product id="cloudtop" name="cloudtop"
+                         valid_satellite="noaa19" />
+              </area>"""
+
+    @patch('trollduction.producer.DataWriter')
+    def setUp(self, writer):
+        self.dproc = DataProcessor()
+        self.dproc.global_data = MagicMock()
+        self.dproc.global_data.info = {'platform_name': 'noaa18'}
+        self.area_def = AreaDefinition("euron1", "euron1", "stere",
+                                       {"proj": "stere", "lat_0": "90",
+                                        "lon_0": "15", "lat_ts": "60",
+                                        "ellps": "WGS84"},
+                                       100, 100,
+                                       (-1000000, -4500000,
+                                        1000000, -2500000))
+        self.ll_area_def = AreaDefinition("europe_ll", "europe_ll",
+                                          "europe_ll",
+                                          {"proj": "latlong",
+                                           "ellps": "WGS84"},
+                                          100, 100, (0, 40, 30, 70))
+
+    @patch('trollduction.producer.area_geometry.get_area_def')
+    def test_plan_area(self, get_area_def):
+        get_area_def.return_value = self.area_def
+        area_item = ET.fromstring(self.area)
+
+        # night in northern Europe
+        self.dproc.global_data.time_slot = datetime(2016, 1, 1, 0, 0)
+        self.assertTrue(self.dproc.plan_area(area_item))
+        # day time
+        self.dproc.global_data.time_slot = datetime(2016, 6, 1, 12, 0)
+        self.assertTrue(self.dproc.plan_area(area_item))
+        # night time, without the night product
+        self.dproc.global_data.time_slot = datetime(2016, 1, 1, 0, 0)
+        area_item.remove(area_item[1])
+        self.assertFalse(self.dproc.plan_area(area_item))
+        self.dproc.global_data.info['platform_name'] = 'noaa19'
+        self.assertTrue(self.dproc.plan_area(area_item))
+
+    @patch('trollduction.producer.area_geometry.get_area_def')
+    def test_plan_latlong_area(self, get_area_def):
+        get_area_def.return_value = self.ll_area_def
+        area_item = ET.fromstring(self.area)
+        area_item.remove(area_item[1])
+        area_item.remove(area_item[1])
+
+        # day time, the day product is kept
+        self.dproc.global_data.time_slot = datetime(2016, 6, 1, 12, 0)
+        self.assertTrue(self.dproc.plan_area(area_item))
+        area_item[0].attrib.pop('sunzen_lonlat')
+        self.assertTrue(self.dproc.plan_area(area_item))
+        # night time
+        self.dproc.global_data.time_slot = datetime(2016, 1, 1, 0, 0)
+        self.assertFalse(self.dproc.plan_area(area_item))
+
+    def test_check_sunzen_before_projection(self):
+        self.dproc.global_data.time_slot = datetime(2016, 6, 1, 12, 0)
+        check = self.dproc.check_sunzen_before_projection
+        self.assertTrue(check({'sunzen_day_maximum': '90'}, self.area_def))
+        self.assertFalse(check({'sunzen_night_minimum': '90'},
+                               self.area_def))
+        self.assertFalse(check({'sunzen_night_minimum': '90'},
+                               self.area_def, lonlat=(15, 60)))
+        # outside the area, the closest pixel is used
+        self.assertFalse(check({'sunzen_night_minimum': '90'},
+                               self.area_def, lonlat=(-100, 0)))
+        self.dproc.global_data.time_slot = datetime(2016, 1, 1, 0, 0)
+        self.assertTrue(check({'sunzen_night_minimum': '90'},
+                              self.area_def, xy_loc=(10, 10)))
+
+    def test_check_sunzen_latlong(self):
+        data = MagicMock()
+        data.time_slot = datetime(2016, 6, 1, 12, 0)
+        config = {'sunzen_day_maximum': '90'}
+        self.assertTrue(self.dproc.check_sunzen(config,
+                                                area_def=self.ll_area_def,
+                                                data=data))
+        self.assertTrue(self.dproc.check_sunzen(config,
+                                                area_def=self.ll_area_def,
+                                                lonlat=(15, 55), data=data))
+        self.assertFalse(self.dproc.check_sunzen(
+            {'sunzen_night_minimum': '90'}, area_def=self.ll_area_def,
+            lonlat=(15, 55), data=data))
+        data.time_slot = datetime(2016, 1, 1, 0, 0)
+        self.assertFalse(self.dproc.check_sunzen(config,
+                                                 area_def=self.ll_area_def,
+                                                 data=data))
+
+
+class TestDataWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.spill_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.spill_dir)
+
+    def test_spill(self):
+        writer = DataWriter(queue_size=1, queue_policy="spill",
+                            spill_dir=self.spill_dir)
+        writer.write("obj1", [], {"a": 1})
+        writer.write("obj2", [], {"b": 2}, job=2)
+        self.assertEqual(writer.prod_queue.get(),
+                         ("obj1", [], {"a": 1}, None))
+        spilled = writer.prod_queue.get()
+        self.assertTrue(isinstance(spilled, SpilledProduct))
+        self.assertEqual(spilled.job, 2)
+        self.assertEqual(spilled.load(), ("obj2", [], {"b": 2}, 2))
+        self.assertEqual(writer.spilled, 1)
+
+    def test_workers(self):
+        writer = DataWriter(workers=2, queue_size=1, queue_policy="spill",
+                            spill_dir=self.spill_dir)
+        saved = []
+        writer.save = lambda pub, obj, *args: saved.append(obj)
+        for i in range(5):
+            writer.write("obj%d" % i, [], {})
+        workers = [Thread(target=writer._work, args=(None, stats))
+                   for stats in writer.stats]
+        for worker in workers:
+            worker.start()
+        writer.prod_queue.join()
+        writer.stop()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(sorted(saved), ["obj%d" % i for i in range(5)])
+        self.assertEqual(writer.spilled, 4)
+
+    def test_encode(self):
+        encoder = MagicMock()
+        writer = DataWriter(encoder=encoder)
+        img = MagicMock()
+        encoder.encode.return_value = True
+        self.assertTrue(writer.encode(img, "a.png", "png", 6,
+                                      ("a_thumb.png", (64, 64))))
+        self.assertFalse(img.save.called)
+        # images which can't be shared are saved in the writer
+        encoder.encode.return_value = False
+        self.assertFalse(writer.encode(img, "a.png", "png", 6))
+        img.save.assert_called_once_with("a.png", fformat="png",
+                                         compression=6)
+
+    def test_wait_job(self):
+        writer = DataWriter()
+        saved = []
+        writer.save = lambda pub, obj, *args: saved.append(obj)
+        writer.write("obj1", [], {}, job=1)
+        writer.write("obj2", [], {}, job=2)
+        worker = Thread(target=writer._work, args=(None, writer.stats[0]))
+        worker.start()
+        writer.wait(1)
+        self.assertTrue("obj1" in saved)
+        writer.wait(2)
+        writer.stop()
+        worker.join()
+        self.assertEqual(saved, ["obj1", "obj2"])
+        self.assertEqual(writer._jobs, {})
+
+    def test_skip_complete(self):
+        manifest = OutputManifest()
+        writer = DataWriter(manifest=manifest)
+        product = ET.fromstring('<product id="overview">'
+                                '<file>{platform_name}_{areaname}.png</file>'
+                                '<file output_dir="{orbit_number}">'
+                                'copy.png</file></product>')
+        params = {"platform_name": "noaa19", "orbit_number": 12345,
+                  "start_time": datetime(2016, 1, 1, 12, 0),
+                  "end_time": datetime(2016, 1, 1, 12, 5),
+                  "dataset": [{"uri": "/data/a"}, {"uri": "/data/b"}],
+                  "areaname": "euron1", "output_dir": self.spill_dir,
+                  "aliases": {"platform_name": {"noaa19": "NOAA-19"}}}
+        filenames = writer.get_filenames(product, params)
+        self.assertEqual(filenames,
+                         [os.path.join(self.spill_dir, "NOAA-19_euron1.png"),
+                          os.path.join("12345", "copy.png")])
+        filenames[1] = os.path.join(self.spill_dir, "copy.png")
+        product[1].attrib["output_dir"] = self.spill_dir
+        for filename in filenames:
+            with open(filename, "w") as fd_:
+                fd_.write("data")
+
+        self.assertFalse(writer.is_complete(product, params))
+        manifest.record(filenames[0], get_scene_id(params))
+        self.assertFalse(writer.is_complete(product, params))
+        manifest.record(filenames[1], get_scene_id(params))
+        self.assertTrue(writer.is_complete(product, params))
+
+        writer.write("obj1", product, params)
+        self.assertTrue(writer.prod_queue.empty())
+        self.assertEqual(writer.skipped, 1)
+        # the same pass sent again with more data is rewritten
+        longer = dict(params,
+                      end_time=datetime(2016, 1, 1, 12, 10),
+                      dataset=params["dataset"] + [{"uri": "/data/c"}])
+        self.assertFalse(writer.is_complete(product, longer))
+        writer.write("obj2", product, longer)
+        self.assertEqual(writer.prod_queue.get()[0], "obj2")
+        params["orbit_number"] = 12346
+        writer.write("obj3", product, params)
+        self.assertEqual(writer.prod_queue.get()[0], "obj3")
+
+
+class TestMemoryBudget(unittest.TestCase):
+
+    def test_estimate_memory(self):
+        msg = MagicMock()
+        msg.data = {"sensor": ["avhrr/3"],
+                    "start_time": datetime(2016, 1, 1, 12, 0),
+                    "end_time": datetime(2016, 1, 1, 12, 1)}
+        self.assertEqual(estimate_memory(msg), 360 * 2048 * 6 * 5)
+
+        fd_, filename = tempfile.mkstemp()
+        try:
+            with open(filename, "wb") as out:
+                out.write("\0" * 1000)
+            msg.type = "file"
+            msg.data = {"sensor": "unknown", "uri": "file://" + filename}
+            self.assertEqual(estimate_memory(msg), 2500)
+        finally:
+            os.close(fd_)
+            os.remove(filename)
+
+    def test_admission(self):
+        budget = MemoryBudget(100)
+        budget.acquire(60)
+        admitted = []
+        thr = Thread(target=lambda: admitted.append(budget.acquire(60)))
+        thr.start()
+        time.sleep(0.1)
+        self.assertEqual(admitted, [])
+        budget.release(60)
+        thr.join()
+        self.assertEqual(admitted, [None])
+        self.assertEqual(budget.in_use, 60)
+        budget.release(60)
+        # too large for the budget, but nothing else is running
+        budget.acquire(200)
+        self.assertEqual(budget.in_use, 200)
+
+
 def suite():
     """The suite for test_xml_read
     """
     loader = unittest.TestLoader()
     mysuite = unittest.TestSuite()
     mysuite.addTest(loader.loadTestsFromTestCase(TestPolygonCoverage))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestCoverageEngine))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestCropScene))
     mysuite.addTest(loader.loadTestsFromTestCase(TestCheckUri))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestDataProcessor))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestPlanArea))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestDataWriter))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestMemoryBudget))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestTimeBudget))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestPipelineStep))
 
     return mysuite
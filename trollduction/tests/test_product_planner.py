@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the product_planner.py module
+"""
+
+import unittest
+import xml.etree.ElementTree as ET
+
+import numpy as np
+from mock import MagicMock
+from mpop.instruments.visir import VisirCompositer
+from pyresample.geometry import AreaDefinition
+
+from trollduction.product_planner import (SharedIntermediates,
+                                          get_composite_requirements,
+                                          plan_products)
+
+
+def plain(self):
+    """Composite without intermediates."""
+    return self[10.8].data
+
+plain.prerequisites = set([10.8])
+
+
+def sun_corrected(self):
+    """Composite using the lon/lat grids."""
+    lonlats = self[10.8].area.get_lonlats()
+    return self[0.6].sunzen_corr(self.time_slot, lonlats).data
+
+sun_corrected.prerequisites = set([0.6, 10.8])
+sun_corrected.intermediates = set(["lonlats"])
+
+
+def undeclared(self):
+    """Composite using the lon/lat grids without declaring it."""
+    return self[0.6].sunzen_corr(self.time_slot).data
+
+undeclared.prerequisites = set([0.6])
+
+
+class TestProductPlanner(unittest.TestCase):
+
+    def test_requirements(self):
+        self.assertEqual(get_composite_requirements(plain),
+                         (set([10.8]), set()))
+        self.assertEqual(get_composite_requirements(sun_corrected),
+                         (set([0.6, 10.8]), set(["lonlats"])))
+        # found from the code
+        self.assertEqual(get_composite_requirements(undeclared),
+                         (set([0.6]), set(["lonlats"])))
+        self.assertEqual(get_composite_requirements(len), (set(), set()))
+
+    def test_mpop_requirements(self):
+        self.assertEqual(
+            get_composite_requirements(VisirCompositer.overview_sun)[1],
+            set(["lonlats"]))
+        self.assertEqual(
+            get_composite_requirements(VisirCompositer.overview)[1], set())
+
+    def test_plan_products(self):
+        funcs = {"a": sun_corrected, "b": plain, "c": sun_corrected,
+                 "d": None}
+        steps = plan_products(["a", "b", "c", "d"], funcs.get)
+        # the configured order is kept
+        self.assertEqual([item for item, _, _ in steps],
+                         ["a", "b", "c", "d"])
+        self.assertEqual([free_after for _, _, free_after in steps],
+                         [set(), set(), set(["lonlats"]), set()])
+
+    def test_plan_declared_products(self):
+        items = [ET.fromstring('<product id="a"/>'),
+                 ET.fromstring('<product id="b" intermediates="lonlats"/>'),
+                 ET.fromstring('<product id="c" '
+                               'intermediates="lonlats, unknown"/>')]
+        steps = plan_products(items, lambda item: plain)
+        self.assertEqual([(item.attrib["id"], needed)
+                          for item, needed, _ in steps],
+                         [("a", set()), ("b", set(["lonlats"])),
+                          ("c", set(["lonlats"]))])
+
+    def test_shared_lonlats(self):
+        area_def = AreaDefinition("test", "test", "test",
+                                  {"proj": "stere", "lat_0": "60",
+                                   "lon_0": "10", "ellps": "WGS84"},
+                                  20, 10, (-1e5, -1e5, 1e5, 1e5))
+        channels = [MagicMock(), MagicMock()]
+        for chn in channels:
+            chn.area = area_def
+        scene = MagicMock()
+        scene.loaded_channels.return_value = channels
+        intermediates = SharedIntermediates(scene)
+        intermediates.provide(["lonlats"])
+        area_copy = channels[0].area
+        self.assertTrue(channels[1].area is area_copy)
+        self.assertFalse(area_copy is area_def)
+        lons, lats = area_copy.get_lonlats()
+        self.assertTrue(lons is area_copy.lons)
+        np.testing.assert_allclose(lons, area_def.get_lonlats()[0])
+        self.assertTrue(area_def.lons is None)
+
+        intermediates.free_all()
+        self.assertTrue(channels[0].area is area_def)
+        self.assertTrue(area_copy.lons is None)
+        self.assertEqual(intermediates.computed, set())
+
+
+def suite():
+    """The suite for test_product_planner
+    """
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestProductPlanner))
+
+    return mysuite
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the resample_cache.py module
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from mock import patch
+from pyresample.geometry import AreaDefinition, SwathDefinition
+
+from trollduction.resample_cache import (ResampleCache, CachedProjector,
+                                         get_geometry_hash)
+
+
+def get_area(area_id, size):
+    """Get a test area definition.
+    """
+    return AreaDefinition(area_id, area_id, area_id,
+                          {"proj": "merc", "ellps": "WGS84"},
+                          size, size, (-1e6, -1e6, 1e6, 1e6))
+
+
+class TestResampleCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.in_area = get_area("in", 100)
+        self.out_area = get_area("out", 50)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_geometry_hash(self):
+        self.assertEqual(get_geometry_hash(self.in_area),
+                         get_geometry_hash(get_area("other", 100)))
+        self.assertNotEqual(get_geometry_hash(self.in_area),
+                            get_geometry_hash(self.out_area))
+
+    def test_store_load(self):
+        cache = ResampleCache(self.cache_dir)
+        key = cache.get_key("avhrr/3", 1000, self.in_area, self.out_area,
+                            "nearest", 5000)
+        self.assertTrue(cache.load(key) is None)
+        cache.store(key, {"index_array": np.arange(10)})
+        np.testing.assert_array_equal(cache.load(key)["index_array"],
+                                      np.arange(10))
+        other_key = cache.get_key("avhrr/3", 1000, self.in_area,
+                                  self.out_area, "nearest", 10000)
+        self.assertNotEqual(key, other_key)
+
+    @patch('trollduction.resample_cache.Projector')
+    def test_get_projector(self, projector):
+        projector.return_value._cache = {"row_idx": np.arange(3),
+                                         "col_idx": np.arange(3)}
+        cache = ResampleCache(self.cache_dir)
+        proj = cache.get_projector(self.in_area, self.out_area, None, 5000)
+        self.assertTrue(proj is projector.return_value)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+        proj = cache.get_projector(self.in_area, self.out_area, None, 5000)
+        self.assertTrue(isinstance(proj, CachedProjector))
+        self.assertEqual(proj.mode, "quick")
+        np.testing.assert_array_equal(proj._cache["row_idx"], np.arange(3))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(projector.call_count, 1)
+
+    @patch('trollduction.resample_cache.Projector')
+    def test_swath_not_cached(self, projector):
+        lons, lats = np.meshgrid(np.arange(10.), np.arange(5.))
+        swath = SwathDefinition(lons, lats)
+        cache = ResampleCache(self.cache_dir)
+        for _ in range(2):
+            proj = cache.get_projector(swath, self.out_area, None, 5000)
+            self.assertTrue(proj is projector.return_value)
+        self.assertEqual(projector.call_args[1]["mode"], "nearest")
+        self.assertEqual(projector.call_count, 2)
+        self.assertEqual((cache.hits, cache.misses, cache.uncached),
+                         (0, 0, 2))
+        self.assertEqual(cache.get_size(), 0)
+
+    def test_evict(self):
+        cache = ResampleCache(self.cache_dir)
+        keys = [str(i) * 40 for i in range(3)]
+        for i, key in enumerate(keys):
+            cache.store(key, {"data": np.zeros(1000)})
+            filename = cache._get_filename(key)
+            os.utime(filename, (i, i))
+        size = os.stat(cache._get_filename(keys[0])).st_size
+
+        # a hit makes the first entry the most recently used one
+        cache.load(keys[0])
+        cache.max_size = 2 * size
+        cache.evict()
+        self.assertTrue(cache.load(keys[1]) is None)
+        self.assertTrue(cache.load(keys[0]) is not None)
+        self.assertTrue(cache.load(keys[2]) is not None)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.get_size(), 2 * size)
+
+
+def suite():
+    """The suite for test_resample_cache
+    """
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestResampleCache))
+
+    return mysuite
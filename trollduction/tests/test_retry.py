@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the retry.py module
+"""
+
+import unittest
+
+from mock import patch
+
+from trollduction.retry import RetryQueue
+
+
+class TestRetryQueue(unittest.TestCase):
+
+    def test_backoff(self):
+        retries = RetryQueue(max_attempts=5, delay=2, backoff=2, max_delay=5)
+        self.assertEqual([retries.get_delay(attempt)
+                          for attempt in range(1, 5)], [2, 4, 5, 5])
+
+    @patch("trollduction.retry.time.time")
+    def test_schedule(self, time_):
+        time_.return_value = 100.
+        retries = RetryQueue(max_attempts=3, delay=2)
+        self.assertTrue(retries.schedule("a", 1))
+        self.assertTrue(retries.schedule("b", 2))
+        self.assertEqual(retries.next_due(), 2)
+        self.assertEqual(retries.pop_due(), [])
+        time_.return_value = 102.
+        self.assertEqual(retries.pop_due(), [("a", 2)])
+        self.assertEqual(retries.next_due(), 2)
+        time_.return_value = 110.
+        self.assertEqual(retries.pop_due(), [("b", 3)])
+        self.assertTrue(retries.next_due() is None)
+        self.assertFalse(retries.schedule("b", 3))
+        retries.recovered()
+        self.assertEqual(retries.counters,
+                         {"retried": 2, "recovered": 1, "abandoned": 1})
+        self.assertEqual(len(retries), 0)
+
+
+def suite():
+    """The suite for test_retry
+    """
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestRetryQueue))
+
+    return mysuite
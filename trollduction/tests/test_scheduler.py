@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the scheduler.py module
+"""
+
+import Queue
+import unittest
+from datetime import datetime, timedelta
+
+from mock import MagicMock
+
+from trollduction.scheduler import MessageScheduler, parse_priorities
+
+
+def make_message(platform_name, age):
+    """Make a message about data *age* minutes old."""
+    msg = MagicMock()
+    msg.data = {"platform_name": platform_name,
+                "start_time": datetime.utcnow() - timedelta(minutes=age)}
+    return msg
+
+
+class TestMessageScheduler(unittest.TestCase):
+
+    def test_parse_priorities(self):
+        self.assertEqual(parse_priorities("NOAA 19:5, Suomi-NPP:-1.5"),
+                         {"NOAA 19": 5.0, "Suomi-NPP": -1.5})
+        self.assertEqual(parse_priorities(None), {})
+
+    def test_fifo(self):
+        sched = MessageScheduler()
+        msgs = [make_message("NOAA 19", age) for age in (10, 200, 30)]
+        for msg in msgs:
+            sched.put(msg)
+        self.assertEqual([sched.get() for _ in msgs], msgs)
+        self.assertRaises(Queue.Empty, sched.get, True, 0.01)
+
+    def test_priorities(self):
+        sched = MessageScheduler()
+        sched.configure({"scheduler_platform_priorities": "Metop-B:2",
+                         "scheduler_age_priority": "-1"})
+        old = make_message("NOAA 19", 180)
+        new = make_message("NOAA 19", 10)
+        metop = make_message("Metop-B", 150)
+        for msg in (old, new, metop):
+            sched.put(msg)
+        self.assertEqual(sched.get(), new)
+        self.assertEqual(sched.get(), metop)
+        self.assertEqual(sched.get(), old)
+
+    def test_priorities_over_time(self):
+        sched = MessageScheduler(age_priority=-1)
+        msg = make_message("NOAA 19", 60)
+        now = datetime.utcnow()
+        self.assertEqual(sched.get_priority(msg, now),
+                         sched.get_priority(msg, now + timedelta(hours=5)))
+        # a pass received later, newer, comes out first
+        old = make_message("NOAA 19", 60)
+        new = make_message("NOAA 19", 30)
+        priority = sched.get_priority(old, now)
+        self.assertTrue(sched.get_priority(new, now + timedelta(hours=1)) >
+                        priority)
+        self.assertAlmostEqual(sched.get_priority(new) - priority, 0.5,
+                               places=3)
+
+    def test_max_age(self):
+        sched = MessageScheduler(max_age=timedelta(hours=1))
+        old = make_message("NOAA 19", 90)
+        new = make_message("NOAA 19", 10)
+        sched.put(old)
+        sched.put(new)
+        self.assertEqual(sched.get(), new)
+        self.assertRaises(Queue.Empty, sched.get, False)
+        self.assertEqual(sched.counters["expired"], 1)
+        self.assertEqual(sched.counters["dispatched"], 1)
+
+    def test_threshold(self):
+        sched = MessageScheduler(age_priority=-1, threshold=2)
+        msgs = [make_message("NOAA 19", age) for age in (300, 10, 200, 20)]
+        for msg in msgs:
+            sched.put(msg)
+        self.assertEqual(sched.counters["demoted"], 2)
+        self.assertEqual(sched.qsize(), 4)
+        self.assertEqual([sched.get() for _ in msgs],
+                         [msgs[1], msgs[3], msgs[2], msgs[0]])
+
+        sched = MessageScheduler(age_priority=-1, threshold=2,
+                                 stale_policy="drop")
+        for msg in msgs:
+            sched.put(msg)
+        self.assertEqual(sched.counters["dropped"], 2)
+        self.assertEqual([sched.get(), sched.get()], [msgs[1], msgs[3]])
+        self.assertTrue(sched.empty())
+
+    def test_threshold_max_age(self):
+        """The messages too old are dropped before demoting others."""
+        sched = MessageScheduler(age_priority=1, threshold=2,
+                                 max_age=timedelta(hours=2))
+        msgs = [make_message("NOAA 19", age) for age in (300, 10, 20)]
+        for msg in msgs:
+            sched.put(msg)
+        self.assertEqual(sched.counters["expired"], 1)
+        self.assertEqual(sched.counters["demoted"], 0)
+        self.assertEqual([sched.get(), sched.get()], [msgs[2], msgs[1]])
+        self.assertTrue(sched.empty())
+
+
+def suite():
+    """The suite for test_scheduler
+    """
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestMessageScheduler))
+
+    return mysuite
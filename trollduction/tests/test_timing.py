@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the timing.py module
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from trollduction.timing import RollingHistogram, Timings
+
+
+class Message(object):
+
+    """Stand-in for a posttroll message."""
+    pass
+
+
+class TestRollingHistogram(unittest.TestCase):
+
+    def test_summary(self):
+        histogram = RollingHistogram(window=60, slots=6)
+        self.assertTrue(histogram.get_summary(1000) is None)
+        for i in range(100):
+            histogram.add(0.01 * (i + 1), 1000 + i * 0.1)
+        summary = histogram.get_summary(1010)
+        self.assertEqual(summary["count"], 100)
+        self.assertAlmostEqual(summary["mean"], 0.505)
+        self.assertAlmostEqual(summary["max"], 1.0)
+        # the percentiles are bucket bounds, within a factor sqrt(2)
+        self.assertTrue(0.5 <= summary["p50"] < 0.5 * 2 ** .5)
+        self.assertTrue(0.9 <= summary["p90"] < 0.9 * 2 ** .5)
+        self.assertTrue(0.99 <= summary["p99"] <= 1.0)
+
+    def test_rolling(self):
+        histogram = RollingHistogram(window=60, slots=6)
+        histogram.add(5, 1000)
+        histogram.add(1, 1030)
+        self.assertEqual(histogram.get_summary(1031)["count"], 2)
+        # the first slot has expired
+        summary = histogram.get_summary(1061)
+        self.assertEqual(summary["count"], 1)
+        self.assertEqual(summary["max"], 1)
+        histogram.add(2, 1062)
+        self.assertEqual(len(histogram._slots), 2)
+        self.assertTrue(histogram.get_summary(1200) is None)
+
+
+class TestTimings(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_record(self):
+        timings = Timings()
+        timings.record("project", 2.0, "euron1")
+        timings.record("project", 4.0, "euron1")
+        with timings.timer("composite", "euron1", "overview"):
+            time.sleep(.01)
+        summaries = timings.get_summaries()
+        self.assertEqual([(summary["stage"], summary["area"],
+                           summary["product"], summary["count"])
+                          for summary in summaries],
+                         [("composite", "euron1", "overview", 1),
+                          ("project", "euron1", None, 2)])
+        self.assertTrue(summaries[0]["max"] >= .01)
+        self.assertEqual(summaries[1]["mean"], 3.0)
+
+    def test_received(self):
+        timings = Timings()
+        msg = Message()
+        timings.record_start(msg)
+        self.assertEqual(timings.get_summaries(), [])
+        timings.mark_received(msg)
+        timings.record_start(msg)
+        # only the first start is recorded
+        timings.record_start(msg)
+        summaries = timings.get_summaries()
+        self.assertEqual(len(summaries), 1)
+        self.assertEqual(summaries[0]["stage"], "receive_to_start")
+        self.assertEqual(summaries[0]["count"], 1)
+
+    def test_dump(self):
+        filename = os.path.join(self.tmp_dir, "timings.json")
+        timings = Timings(interval=0.05, filename=filename)
+        timings.record("load", 1.0)
+        self.assertFalse(os.path.exists(filename))
+        time.sleep(.06)
+        timings.record("load", 3.0)
+        with open(filename) as fd_:
+            lines = fd_.readlines()
+        self.assertEqual(len(lines), 1)
+        dump = json.loads(lines[0])
+        self.assertEqual(dump["timings"][0]["stage"], "load")
+        self.assertEqual(dump["timings"][0]["count"], 2)
+
+        # to the log without a file
+        timings.configure(interval=0)
+        timings.dump()
+        self.assertEqual(len(timings.get_summaries()), 1)
+
+
+def suite():
+    """The suite for test_timing
+    """
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestRollingHistogram))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestTimings))
+
+    return mysuite
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the transfer.py module
+"""
+
+import errno
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from mock import patch
+
+from trollduction import transfer
+from trollduction.transfer import fan_out, get_stats
+
+
+def make_file(filename, data="some data" * 1000):
+    """Write *data* to *filename*."""
+    with open(filename, "wb") as fd_:
+        fd_.write(data)
+
+
+def read_file(filename):
+    """Read the data of *filename*."""
+    with open(filename, "rb") as fd_:
+        return fd_.read()
+
+
+class TestTransfer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmp_dir, "src")
+        make_file(self.src)
+        os.chmod(self.src, 0o640)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_link(self):
+        dst = os.path.join(self.tmp_dir, "dst")
+        self.assertEqual(transfer.transfer(self.src, dst), "link")
+        self.assertTrue(os.path.samefile(self.src, dst))
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)), ["dst", "src"])
+
+    def test_link_again(self):
+        dst = os.path.join(self.tmp_dir, "dst")
+        transfer.transfer(self.src, dst)
+        self.assertEqual(transfer.transfer(self.src, dst), "link")
+        self.assertTrue(os.path.samefile(self.src, dst))
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)), ["dst", "src"])
+
+    def test_no_link(self):
+        dst = os.path.join(self.tmp_dir, "dst")
+        strategy = transfer.transfer(self.src, dst, link=False)
+        self.assertNotEqual(strategy, "link")
+        self.assertFalse(os.path.samefile(self.src, dst))
+        self.assertEqual(read_file(dst), read_file(self.src))
+        self.assertEqual(stat.S_IMODE(os.stat(dst).st_mode), 0o640)
+
+    def test_overwrite(self):
+        dst = os.path.join(self.tmp_dir, "dst")
+        make_file(dst, "old data")
+        transfer.transfer(self.src, dst, link=False)
+        self.assertEqual(read_file(dst), read_file(self.src))
+        transfer.transfer(self.src, dst)
+        self.assertTrue(os.path.samefile(self.src, dst))
+
+    def test_tmpdst(self):
+        dst = os.path.join(self.tmp_dir, "dst")
+        tmpdst = os.path.join(self.tmp_dir, "tmp")
+        make_file(tmpdst, "")
+        transfer.transfer(self.src, dst, tmpdst)
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)), ["dst", "src"])
+
+    def test_strategies(self):
+        for name, func in transfer.STRATEGIES:
+            dst = os.path.join(self.tmp_dir, name)
+            try:
+                func(self.src, dst)
+            except (IOError, OSError) as err:
+                # not supported here
+                self.assertNotEqual(name, "copy")
+                self.assertIn(err.errno, transfer.UNSUPPORTED_ERRORS)
+                continue
+            self.assertEqual(read_file(dst), read_file(self.src))
+
+    def test_fallback(self):
+        calls = []
+
+        def _unsupported(src, dst):
+            calls.append(src)
+            raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+        strategies = (("link", _unsupported),
+                      ("copy", transfer._buffered_copy))
+        with patch.object(transfer, "STRATEGIES", strategies), \
+                patch.object(transfer, "_unsupported", set()):
+            dst = os.path.join(self.tmp_dir, "dst")
+            self.assertEqual(transfer.transfer(self.src, dst), "copy")
+            self.assertEqual(read_file(dst), read_file(self.src))
+            # not tried again between the same filesystems
+            transfer.transfer(self.src, dst)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)), ["dst", "src"])
+
+    def test_failure(self):
+        dst = os.path.join(self.tmp_dir, "dst")
+        self.assertRaises(OSError, transfer.transfer,
+                          os.path.join(self.tmp_dir, "missing"), dst)
+        self.assertEqual(os.listdir(self.tmp_dir), ["src"])
+
+    def test_fan_out(self):
+        dsts = [os.path.join(self.tmp_dir, "dst%d" % i) for i in range(5)]
+        before = sum(values["files"] for values in get_stats().values())
+        self.assertEqual(fan_out(self.src, dsts, link=False), [])
+        for dst in dsts:
+            self.assertEqual(read_file(dst), read_file(self.src))
+        after = sum(values["files"] for values in get_stats().values())
+        self.assertEqual(after - before, len(dsts))
+
+        missing = os.path.join(self.tmp_dir, "missing", "dst")
+        failed = fan_out(self.src, [dsts[0], missing])
+        self.assertEqual(len(failed), 1)
+        self.assertEqual(failed[0][:2], (self.src, missing))
+
+
+def suite():
+    """The suite for test_transfer
+    """
+    loader = unittest.TestLoader()
+    mysuite = unittest.TestSuite()
+    mysuite.addTest(loader.loadTestsFromTestCase(TestTransfer))
+
+    return mysuite
@@ -90,8 +90,25 @@ xmlstuff = """<?xml version="1.0" encoding='utf-8'?>
 </product_config>
 """
 
-from trollduction.xml_read import ProductList
+simple_xml = """<?xml version="1.0" encoding='utf-8'?>
+<product_config>
+  <common>
+    <output_dir>/tmp</output_dir>
+  </common>
+  <product_list>
+    <area id="eurol" name="Europe_large">
+      <product id="overview" name="overview">
+        <file>{time:%Y%m%d_%H%M}_{platform}{satnumber}_{areaname}.png</file>
+      </product>
+    </area>
+  </product_list>
+</product_config>
+"""
+
+from trollduction.xml_read import ProductList, ProductListCache
 from StringIO import StringIO
+import os
+import tempfile
 
 
 class TestProductList(unittest.TestCase):
@@ -109,11 +126,46 @@ class TestProductList(unittest.TestCase):
     pass
 
 
+class TestProductListCache(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.fname = tempfile.mkstemp(suffix=".xml")
+        os.write(fd, simple_xml)
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.fname)
+
+    def test_get(self):
+        cache = ProductListCache()
+        pconfig = cache.get(self.fname)
+        self.assertEqual(pconfig.attrib, {"output_dir": "/tmp"})
+        self.assertTrue(cache.get(self.fname) is pconfig)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # Modification time changed
+        stat = os.stat(self.fname)
+        os.utime(self.fname, (stat.st_atime, stat.st_mtime + 10))
+        self.assertFalse(cache.get(self.fname) is pconfig)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_invalidate(self):
+        cache = ProductListCache()
+        pconfig = cache.get(self.fname)
+        cache.invalidate(self.fname)
+        pconfig2 = cache.get(self.fname)
+        self.assertFalse(pconfig2 is pconfig)
+        cache.invalidate()
+        self.assertFalse(cache.get(self.fname) is pconfig2)
+        self.assertEqual((cache.hits, cache.misses), (0, 3))
+
+
 def suite():
     """The suite for test_xml_read
     """
     loader = unittest.TestLoader()
     mysuite = unittest.TestSuite()
     mysuite.addTest(loader.loadTestsFromTestCase(TestProductList))
+    mysuite.addTest(loader.loadTestsFromTestCase(TestProductListCache))
 
     return mysuite
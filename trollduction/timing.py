@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Timing of the processing stages.
+
+The durations of the stages (receiving to processing a message, coverage
+check, channel loading, projections, composites, saving, copies and
+publishing) are recorded per stage, area and product in histograms over a
+rolling time window, and dumped periodically as a log line or to a file.
+
+The histogram buckets grow geometrically, so that recording a duration is
+a binary search and an increment.
+"""
+
+import bisect
+import json
+import logging
+import time
+import weakref
+from contextlib import contextmanager
+from datetime import datetime
+from threading import Lock
+
+LOGGER = logging.getLogger(__name__)
+
+# upper bounds of the histogram buckets, in seconds, from 1 ms to 4.6 h
+BUCKETS = [0.001 * 2 ** (i / 2.) for i in range(45)]
+
+
+def format_summary(summary):
+    """Format the histogram *summary* for the log."""
+    keys = [str(key) for key in (summary["area"], summary["product"])
+            if key is not None]
+    name = summary["stage"]
+    if keys:
+        name += "[" + "/".join(keys) + "]"
+    return ("%s n=%d mean=%.3f p50=%.3f p90=%.3f p99=%.3f max=%.3f" %
+            (name, summary["count"], summary["mean"], summary["p50"],
+             summary["p90"], summary["p99"], summary["max"]))
+
+
+class RollingHistogram(object):
+
+    """Histogram of the durations recorded in the last *window* seconds,
+    kept in *slots* sub-windows which expire in turn.
+    """
+
+    def __init__(self, window=3600, slots=6):
+        self.window = window
+        self.width = float(window) / slots
+        self._slots = []
+
+    def _get_slot(self, now):
+        """Get the current slot, after dropping the expired ones."""
+        while self._slots and self._slots[0]["start"] <= now - self.window:
+            self._slots.pop(0)
+        if not self._slots or now >= self._slots[-1]["start"] + self.width:
+            self._slots.append({"start": now,
+                                "counts": [0] * (len(BUCKETS) + 1),
+                                "count": 0,
+                                "total": 0.0,
+                                "max": 0.0})
+        return self._slots[-1]
+
+    def add(self, value, now=None):
+        """Add the duration *value*, in seconds."""
+        if now is None:
+            now = time.time()
+        slot = self._get_slot(now)
+        slot["counts"][bisect.bisect_left(BUCKETS, value)] += 1
+        slot["count"] += 1
+        slot["total"] += value
+        slot["max"] = max(slot["max"], value)
+
+    def get_summary(self, now=None):
+        """Get the number, mean, median, 90th and 99th percentiles and
+        maximum of the durations of the window. The percentiles are the
+        upper bounds of their buckets.
+        """
+        if now is None:
+            now = time.time()
+        slots = [slot for slot in self._slots
+                 if slot["start"] > now - self.window]
+        count = sum(slot["count"] for slot in slots)
+        if not count:
+            return None
+        counts = [sum(values) for values
+                  in zip(*[slot["counts"] for slot in slots])]
+        maximum = max(slot["max"] for slot in slots)
+        summary = {"count": count,
+                   "mean": sum(slot["total"] for slot in slots) / count,
+                   "max": maximum}
+        for name, fraction in (("p50", .5), ("p90", .9), ("p99", .99)):
+            rank = fraction * count
+            seen = 0
+            for idx, num in enumerate(counts):
+                seen += num
+                if seen >= rank:
+                    break
+            if idx < len(BUCKETS):
+                summary[name] = min(BUCKETS[idx], maximum)
+            else:
+                summary[name] = maximum
+        return summary
+
+
+class Timings(object):
+
+    """Rolling histograms of the durations of the stages, per stage, area
+    and product, over *window* seconds. If *interval* is positive, the
+    histograms are dumped every *interval* seconds, to *filename* as json
+    lines if given, otherwise to the log.
+    """
+
+    def __init__(self, window=3600, interval=0, filename=None):
+        self.window = window
+        self.interval = interval
+        self.filename = filename
+        self._histograms = {}
+        self._received = weakref.WeakKeyDictionary()
+        self._lock = Lock()
+        self._last_dump = time.time()
+
+    def configure(self, window=3600, interval=0, filename=None):
+        """Set the window, dump interval and file, forgetting the recorded
+        durations if the window changes.
+        """
+        with self._lock:
+            if window != self.window:
+                self._histograms = {}
+            self.window = window
+            self.interval = interval
+            self.filename = filename
+
+    def record(self, stage, seconds, area=None, product=None):
+        """Record the duration *seconds* of *stage* for *area* and
+        *product*, and dump the histograms if it is time to.
+        """
+        key = (stage, area, product)
+        now = time.time()
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = RollingHistogram(self.window)
+                self._histograms[key] = histogram
+            histogram.add(seconds, now)
+            dump = (self.interval > 0 and
+                    now - self._last_dump >= self.interval)
+            if dump:
+                self._last_dump = now
+        if dump:
+            self.dump()
+
+    @contextmanager
+    def timer(self, stage, area=None, product=None):
+        """Record the duration of the enclosed code as *stage* for *area*
+        and *product*.
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record(stage, time.time() - start, area, product)
+
+    def mark_received(self, msg):
+        """Remember when *msg* was received."""
+        try:
+            with self._lock:
+                self._received[msg] = time.time()
+        except TypeError:
+            pass
+
+    def record_start(self, msg):
+        """Record the time since *msg* was received, as the processing of
+        it starts. Only the first start after the reception is recorded.
+        """
+        try:
+            with self._lock:
+                received = self._received.pop(msg, None)
+        except TypeError:
+            return
+        if received is not None:
+            self.record("receive_to_start", time.time() - received)
+
+    def get_summaries(self):
+        """Get the summaries of the histograms, as a list of dictionaries
+        with the stage, area and product, sorted by stage.
+        """
+        now = time.time()
+        with self._lock:
+            items = sorted(self._histograms.items())
+            summaries = []
+            for (stage, area, product), histogram in items:
+                summary = histogram.get_summary(now)
+                if summary is None:
+                    continue
+                summary.update({"stage": stage,
+                                "area": area,
+                                "product": product})
+                summaries.append(summary)
+        return summaries
+
+    def dump(self):
+        """Dump the summaries of the histograms to the file, or to the log
+        if there is no file.
+        """
+        summaries = self.get_summaries()
+        if not summaries:
+            return
+        if self.filename is not None:
+            try:
+                with open(self.filename, "a") as fd_:
+                    fd_.write(json.dumps(
+                        {"time": datetime.utcnow().isoformat(),
+                         "window": self.window,
+                         "timings": summaries}) + "\n")
+                return
+            except IOError:
+                LOGGER.exception("Could not write the timings to %s",
+                                 self.filename)
+        LOGGER.info("Timings over %d s: %s", self.window,
+                    "; ".join(format_summary(summary)
+                              for summary in summaries))
+
+
+# the timings of the process
+TIMINGS = Timings()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016
+
+# Author(s):
+
+#   Martin Raspaud <martin.raspaud@smhi.se>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Transfer of files to their destinations.
+
+A file is hardlinked to its destination if possible. Otherwise its data is
+shared with a reflink, or copied in the kernel with copy_file_range or
+sendfile, and as a last resort copied through a buffer. The destination is
+written under a temporary name and renamed when complete.
+
+The strategies known not to work between two filesystems are skipped for
+the next transfers between them. The number of files, bytes and time of
+the transfers are recorded per strategy.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import fcntl
+import logging
+import os
+import shutil
+import tempfile
+import time
+from multiprocessing.pool import ThreadPool
+from threading import Lock
+
+LOGGER = logging.getLogger(__name__)
+
+# ioctl request to share the data of a file, from linux/fs.h
+FICLONE = 0x40049409
+
+# size of the chunks copied by the kernel and through a buffer
+KERNEL_CHUNK_SIZE = 2 ** 30
+BUFFER_SIZE = 2 ** 20
+
+# number of concurrent transfers by default
+WORKERS = 4
+
+# errors meaning the strategy doesn't work between the filesystems
+UNSUPPORTED_ERRORS = set([errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP,
+                          errno.ENOTTY, errno.EINVAL])
+
+
+def _get_libc_function(name, restype, argtypes):
+    """Get the function *name* of the C library, or None if not available.
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        func = getattr(libc, name)
+    except (OSError, AttributeError):
+        return None
+    func.restype = restype
+    func.argtypes = argtypes
+    return func
+
+_COPY_FILE_RANGE = _get_libc_function(
+    "copy_file_range", ctypes.c_ssize_t,
+    [ctypes.c_int, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p,
+     ctypes.c_size_t, ctypes.c_uint])
+_SENDFILE = _get_libc_function(
+    "sendfile", ctypes.c_ssize_t,
+    [ctypes.c_int, ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t])
+
+
+def _link(src, dst):
+    """Hardlink *src* to *dst*."""
+    if os.path.lexists(dst):
+        os.remove(dst)
+    os.link(src, dst)
+
+
+def _reflink(src, dst):
+    """Share the data of *src* with *dst*."""
+    with open(src, "rb") as in_, open(dst, "wb") as out:
+        fcntl.ioctl(out.fileno(), FICLONE, in_.fileno())
+
+
+def _kernel_copy(func, src, dst, *args):
+    """Copy *src* to *dst* with the kernel function *func*, called with the
+    input and output file descriptors placed in *args*.
+    """
+    if func is None:
+        raise OSError(errno.ENOSYS, os.strerror(errno.ENOSYS))
+    with open(src, "rb") as in_, open(dst, "wb") as out:
+        fds = {"in": in_.fileno(), "out": out.fileno()}
+        args = [fds.get(arg, arg) for arg in args]
+        while True:
+            res = func(*args)
+            if res < 0:
+                err = ctypes.get_errno()
+                raise OSError(err, os.strerror(err))
+            if res == 0:
+                break
+
+
+def _copy_file_range(src, dst):
+    """Copy *src* to *dst* with copy_file_range."""
+    _kernel_copy(_COPY_FILE_RANGE, src, dst,
+                 "in", None, "out", None, KERNEL_CHUNK_SIZE, 0)
+
+
+def _sendfile(src, dst):
+    """Copy *src* to *dst* with sendfile."""
+    _kernel_copy(_SENDFILE, src, dst, "out", "in", None, KERNEL_CHUNK_SIZE)
+
+
+def _buffered_copy(src, dst):
+    """Copy *src* to *dst* through a buffer."""
+    with open(src, "rb") as in_, open(dst, "wb") as out:
+        shutil.copyfileobj(in_, out, BUFFER_SIZE)
+
+
+STRATEGIES = (("link", _link),
+              ("reflink", _reflink),
+              ("copy_file_range", _copy_file_range),
+              ("sendfile", _sendfile),
+              ("copy", _buffered_copy))
+
+_unsupported = set()
+_stats = {}
+_lock = Lock()
+
+
+def _record(strategy, size, elapsed):
+    """Record the transfer of *size* bytes with *strategy*."""
+    with _lock:
+        stats = _stats.setdefault(strategy,
+                                  {"files": 0, "bytes": 0, "time": 0.0})
+        stats["files"] += 1
+        stats["bytes"] += size
+        stats["time"] += elapsed
+
+
+def transfer(src, dst, tmpdst=None, link=True):
+    """Transfer *src* to *dst*, through the temporary file *tmpdst* if
+    given. The destination is not hardlinked if *link* is False, eg. if it
+    is going to be modified. Returns the name of the strategy used.
+    """
+    src_stat = os.stat(src)
+    dst_dir = os.path.dirname(os.path.abspath(dst))
+    devices = (src_stat.st_dev, os.stat(dst_dir).st_dev)
+    if tmpdst is None:
+        tempfd, tmpdst = tempfile.mkstemp(
+            dir=dst_dir, prefix="." + os.path.basename(dst) + ".")
+        os.close(tempfd)
+
+    try:
+        for name, func in STRATEGIES:
+            if not link and name == "link":
+                continue
+            if (name, devices) in _unsupported and name != "copy":
+                continue
+            start = time.time()
+            try:
+                func(src, tmpdst)
+            except (IOError, OSError) as err:
+                if name == "copy":
+                    raise
+                LOGGER.debug("Could not %s %s to %s: %s",
+                             name, src, dst, str(err))
+                if err.errno in UNSUPPORTED_ERRORS:
+                    with _lock:
+                        _unsupported.add((name, devices))
+                continue
+            if name != "link":
+                shutil.copymode(src, tmpdst)
+            os.rename(tmpdst, dst)
+            if os.path.lexists(tmpdst):
+                # renaming a hardlink over the same file does nothing
+                os.remove(tmpdst)
+            elapsed = time.time() - start
+            _record(name, src_stat.st_size, elapsed)
+            LOGGER.debug("Transferred %s to %s with %s in %.3f s",
+                         src, dst, name, elapsed)
+            return name
+    except Exception:
+        try:
+            os.remove(tmpdst)
+        except OSError:
+            pass
+        raise
+
+
+def transfer_many(transfers, workers=WORKERS, link=True):
+    """Transfer concurrently the files of *transfers*, a list of (src, dst)
+    or (src, dst, tmpdst) tuples. Returns the list of the failed
+    transfers, as (src, dst, error message) tuples.
+    """
+    def _transfer(args):
+        """Transfer one file and catch the errors."""
+        try:
+            transfer(*args[:3], link=link)
+        except (IOError, OSError) as err:
+            LOGGER.error("Could not transfer %s to %s: %s",
+                         args[0], args[1], str(err))
+            return (args[0], args[1], str(err))
+
+    transfers = list(transfers)
+    if len(transfers) <= 1 or workers <= 1:
+        results = [_transfer(args) for args in transfers]
+    else:
+        pool = ThreadPool(min(workers, len(transfers)))
+        try:
+            results = pool.map(_transfer, transfers)
+        finally:
+            pool.close()
+            pool.join()
+    return [res for res in results if res is not None]
+
+
+def fan_out(src, dsts, workers=WORKERS, link=True):
+    """Transfer *src* concurrently to each of *dsts*, given as filenames
+    or (dst, tmpdst) tuples. Returns the failed transfers, as for
+    :func:`transfer_many`.
+    """
+    transfers = []
+    for dst in dsts:
+        if isinstance(dst, tuple):
+            transfers.append((src, ) + dst)
+        else:
+            transfers.append((src, dst))
+    return transfer_many(transfers, workers, link)
+
+
+def get_stats():
+    """Get the statistics of the transfers per strategy, with the
+    throughput in bytes per second.
+    """
+    with _lock:
+        stats = dict((name, values.copy())
+                     for name, values in _stats.items())
+    for values in stats.values():
+        if values["time"]:
+            values["throughput"] = values["bytes"] / values["time"]
+        else:
+            values["throughput"] = 0.0
+    return stats
+
+
+def log_stats():
+    """Log the statistics of the transfers."""
+    for name, values in sorted(get_stats().items()):
+        LOGGER.info("Transfers with %s: %d files, %.1f MB in %.1f s, "
+                    "%.1f MB/s", name, values["files"],
+                    values["bytes"] / 1024. ** 2, values["time"],
+                    values["throughput"] / 1024. ** 2)
@@ -27,6 +27,7 @@
 import xml.etree.ElementTree as etree
 import os
 import logging
+from threading import Lock
 
 LOGGER = logging.getLogger(__name__)
 
@@ -166,6 +167,57 @@ class ProductList(object):
         self.check_groups()
 
 
+class ProductListCache(object):
+    """Cache of parsed product lists.
+
+    A product list is parsed again only if the file's inode, modification
+    time or size has changed since the last parsing, or if it has been
+    explicitly invalidated.
+    """
+    def __init__(self):
+        self._cache = {}
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, fname):
+        """Get the product list from *fname*, parsing it only if needed.
+        """
+        stat = os.stat(fname)
+        signature = (stat.st_dev, stat.st_ino, stat.st_mtime, stat.st_size)
+        with self._lock:
+            try:
+                cached_signature, product_list = self._cache[fname]
+            except KeyError:
+                cached_signature, product_list = None, None
+            if cached_signature == signature:
+                self.hits += 1
+                LOGGER.debug("Product list cache hit for %s "
+                             "(%d hits, %d misses)",
+                             fname, self.hits, self.misses)
+                return product_list
+
+            self.misses += 1
+            product_list = ProductList(fname)
+            self._cache[fname] = (signature, product_list)
+            LOGGER.debug("Product list cache miss for %s "
+                         "(%d hits, %d misses)",
+                         fname, self.hits, self.misses)
+            return product_list
+
+    def invalidate(self, fname=None):
+        """Drop the cached product list for *fname*, or all of them if
+        *fname* is None.
+        """
+        with self._lock:
+            if fname is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(fname, None)
+        LOGGER.debug("Product list cache invalidated for %s",
+                     fname or "all files")
+
+
 def get_root(fname):
     '''Read XML file and return the root tree.
     '''